@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Aliased GraphQL batching for paginated AniList `Page { media(...) }` queries.
+
+Several (query, page) work items are packed into one GraphQL document, each
+under its own alias, so many pages cost a single round trip. Once page 1 of a
+query reports `pageInfo.total`, its remaining pages are planned up front and
+can be fetched by a bounded thread pool under the shared rate limiter.
+Queries that run out of pages drop out of later batches. fetch_media_by_ids
+builds on the same machinery to look up arbitrary sets of ids.
+"""
+import math
+import queue
+import re
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from api_client import anilist_request
+import response_cache
+
+VARIABLE_PATTERN = re.compile(r'\$([A-Za-z_][A-Za-z0-9_]*)')
+# AniList caps perPage at 50, so id_in lists larger than that would need paging
+ID_BATCH_SIZE = 50
+# Media objects a MediaStream buffers before the fetch thread waits for the consumer
+STREAM_BUFFER_SIZE = 500
+# How often a producer blocked on a full MediaStream buffer checks for cancellation
+STREAM_CANCEL_POLL_SECONDS = 0.1
+
+
+class PagedQuery:
+    """
+    One logical paginated media query that can share a batch with others.
+
+    `cache_family` names the response_cache.FAMILY_TTLS entry its responses
+    are cached under.
+    """
+
+    def __init__(self, name, media_args, variables=None, variable_types=None, label=None,
+                 cache_family=response_cache.DEFAULT_FAMILY):
+        if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', name):
+            raise ValueError(f"Query name must be a valid GraphQL alias: {name!r}")
+        self.name = name
+        self.media_args = media_args
+        self.variables = variables or {}
+        self.variable_types = variable_types or {}
+        self.label = label or name
+        self.cache_family = cache_family
+
+    def _prefixed(self, variable):
+        return f"{self.name}_{variable}"
+
+    def alias(self, page):
+        return f"{self.name}_p{page}"
+
+    def declarations(self):
+        """Variable declarations for the batch query header."""
+        return [
+            f"${self._prefixed(variable)}: {self.variable_types[variable]}"
+            for variable in self.variables
+        ]
+
+    def bound_variables(self):
+        return {self._prefixed(variable): value for variable, value in self.variables.items()}
+
+    def selection(self, fields, per_page, page):
+        """Render this query's aliased Page selection for one page."""
+        media_args = VARIABLE_PATTERN.sub(lambda m: f"${self._prefixed(m.group(1))}", self.media_args)
+        field_block = fields.strip('\n')
+        return (
+            f"{self.alias(page)}: Page(page: {page}, perPage: {per_page}) {{\n"
+            f"    pageInfo {{ hasNextPage currentPage total }}\n"
+            f"    media({media_args}) {{\n{field_block}\n    }}\n"
+            f"}}"
+        )
+
+
+class MediaStore:
+    """
+    Id-keyed media collected across several queries.
+
+    Overlapping queries return the same title more than once; the store keeps
+    one merged object per id, in first-seen order, and remembers which queries
+    returned it, so downstream processing sees every title exactly once. With
+    `keep_media=False` only ids and sources are kept, for streaming consumers
+    that process each title as it arrives: the first copy is the one they
+    process, and the fields of later copies are dropped rather than merged.
+    That is only safe when every query feeding the store selects the same
+    fields, as the query families in fetch_anime_data do.
+    """
+
+    def __init__(self, keep_media=True):
+        self.keep_media = keep_media
+        self._media = {}
+        self._sources = {}
+        self.results = 0
+
+    def add(self, media, source):
+        """
+        Merge one media object returned by query `source`; True if its id is new.
+
+        Without keep_media a repeated id only records its source.
+        """
+        self.results += 1
+        media_id = media['id']
+        if media_id not in self._sources:
+            self._media[media_id] = dict(media) if self.keep_media else None
+            self._sources[media_id] = [source]
+            return True
+        if self.keep_media:
+            self._media[media_id].update(media)
+        if source not in self._sources[media_id]:
+            self._sources[media_id].append(source)
+        return False
+
+    def add_all(self, media_list, source):
+        for media in media_list:
+            self.add(media, source)
+
+    def get(self, media_id):
+        return self._media.get(media_id)
+
+    def sources(self, media_id):
+        """Names of the queries that returned `media_id`, in the order they did."""
+        return list(self._sources.get(media_id, []))
+
+    def media(self):
+        return [media for media in self._media.values() if media is not None]
+
+    def duplicates(self):
+        """How many query results were repeats of a title already stored."""
+        return self.results - len(self._sources)
+
+    def __len__(self):
+        return len(self._sources)
+
+    def __contains__(self, media_id):
+        return media_id in self._sources
+
+
+class StreamCancelled(Exception):
+    """Raised inside a MediaStream's fetch thread once its consumer has gone away."""
+
+
+class MediaStream:
+    """
+    Iterate (media, source) pairs while the fetch producing them still runs.
+
+    `fetch(on_media)` is started on a background thread and must call
+    on_media(media, source) for every object it receives; iterating the stream
+    yields them in arrival order, so processing overlaps with network waits.
+    At most `buffer_size` objects are held between the two sides. Once the
+    iteration ends, `result` holds fetch's return value (its exception, if
+    any, is re-raised to the consumer). If the consumer stops early or raises,
+    the stream is cancelled: the next on_media call raises StreamCancelled in
+    the fetch thread instead of waiting forever for room in the buffer.
+    """
+
+    _DONE = object()
+
+    def __init__(self, fetch, buffer_size=STREAM_BUFFER_SIZE):
+        self._queue = queue.Queue(maxsize=buffer_size)
+        self._cancelled = threading.Event()
+        self._error = None
+        self.result = None
+        self._thread = threading.Thread(target=self._run, args=(fetch,), daemon=True)
+        self._thread.start()
+
+    def _run(self, fetch):
+        try:
+            self.result = fetch(self._put)
+        except StreamCancelled:
+            pass
+        except Exception as e:
+            self._error = e
+        finally:
+            try:
+                self._offer(self._DONE)
+            except StreamCancelled:
+                pass
+
+    def _offer(self, item):
+        while True:
+            if self._cancelled.is_set():
+                raise StreamCancelled()
+            try:
+                self._queue.put(item, timeout=STREAM_CANCEL_POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    def _put(self, media, source):
+        self._offer((media, source))
+
+    def cancel(self):
+        """Stop the fetch thread at its next on_media call."""
+        self._cancelled.set()
+
+    def __iter__(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is self._DONE:
+                    break
+                yield item
+        finally:
+            # Reached on normal completion too, where it is a no-op
+            self.cancel()
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+
+def id_batch_queries(ids, batch_size=ID_BATCH_SIZE, name_prefix='ids'):
+    """Split ids into id_in queries of at most batch_size ids each."""
+    return [
+        PagedQuery(
+            f"{name_prefix}_{index}",
+            'id_in: $ids, type: ANIME',
+            variables={'ids': ids[start:start + batch_size]},
+            variable_types={'ids': '[Int]'},
+            label=f"{name_prefix} batch {index + 1}",
+            cache_family='ids'
+        )
+        for index, start in enumerate(range(0, len(ids), batch_size))
+    ]
+
+
+def build_batch_query(items, fields, per_page):
+    """Build one GraphQL document and variables covering every (query, page) item."""
+    queries = []
+    for query, _ in items:
+        if query not in queries:
+            queries.append(query)
+
+    declarations = [decl for query in queries for decl in query.declarations()]
+    header = f"query ({', '.join(declarations)})" if declarations else "query"
+    body = "\n".join(query.selection(fields, per_page, page) for query, page in items)
+
+    variables = {}
+    for query in queries:
+        variables.update(query.bound_variables())
+    return f"{header} {{\n{body}\n}}", variables
+
+
+def fetch_batch(items, fields, per_page, request=anilist_request):
+    """Send one batch; returns the raw response payload (or None on failure)."""
+    query_text, variables = build_batch_query(items, fields, per_page)
+    with response_cache.request_families(query.cache_family for query, _ in items):
+        return request(query_text, variables)
+
+
+def last_page_from_total(page_info, per_page):
+    """Number of pages implied by pageInfo.total, or None if AniList omitted it."""
+    total = page_info.get('total')
+    if not total:
+        return None
+    return max(1, math.ceil(total / per_page))
+
+
+def fetch_batched_pages(queries, fields, per_page=50, max_aliases=4, request=anilist_request,
+                        max_workers=1, stop_event=None, on_page=None, max_requests=None):
+    """
+    Page through every query, packing up to `max_aliases` pages per request.
+
+    With `max_workers` > 1 the batches of each round are sent concurrently and
+    handled as they complete. If `stop_event` is set (by this or another fetch
+    running alongside it) the remaining work is abandoned and the result is
+    flagged service_unavailable. When `on_page(query, page, media)` is given,
+    each page is handed to it on arrival instead of being kept in the result.
+    `max_requests` caps the round trips actually sent, split-retries and
+    follow-up pages included; work beyond it is dropped.
+
+    Returns a dict with the media per query name (in page order), whether any
+    request succeeded, whether AniList reported itself unavailable, and how many
+    round trips it took.
+    """
+    result = {
+        'media': {query.name: [] for query in queries},
+        'succeeded': False,
+        'service_unavailable': False,
+        'requests': 0,
+    }
+    pages = {query.name: {} for query in queries}
+    planned_until = {query.name: 1 for query in queries}
+    pending = [(query, 1) for query in queries]
+    split_retry = set()
+    executor = ThreadPoolExecutor(max_workers=max_workers) if max_workers > 1 else None
+
+    try:
+        while pending:
+            if stop_event is not None and stop_event.is_set():
+                result['service_unavailable'] = True
+                return result
+
+            # Items that already failed as part of a larger batch are retried alone
+            packed = [item for item in pending if item not in split_retry]
+            batches = [packed[i:i + max_aliases] for i in range(0, len(packed), max_aliases)]
+            batches.extend([item] for item in pending if item in split_retry)
+            if max_requests is not None and len(batches) > max_requests - result['requests']:
+                dropped = sum(len(batch) for batch in batches[max_requests - result['requests']:])
+                print(f"Request budget of {max_requests} reached; skipping {dropped} pages")
+                batches = batches[:max_requests - result['requests']]
+                if not batches:
+                    break
+            if executor is not None:
+                responses = executor.map(lambda batch: fetch_batch(batch, fields, per_page, request), batches)
+            else:
+                responses = (fetch_batch(batch, fields, per_page, request) for batch in batches)
+            result['requests'] += len(batches)
+            pending = []
+
+            for batch, data in zip(batches, responses):
+                if data and data.get('service_unavailable'):
+                    result['service_unavailable'] = True
+                    if stop_event is not None:
+                        stop_event.set()
+                    return result
+
+                if not data or not data.get('data'):
+                    # A large batch may fail where single pages succeed (e.g. query
+                    # complexity limits), so give each item one more chance alone.
+                    retry_items = [item for item in batch if len(batch) > 1 and item not in split_retry]
+                    split_retry.update(retry_items)
+                    pending.extend(retry_items)
+                    print(f"Batch request failed for: {', '.join(f'{q.label} p{p}' for q, p in batch)}")
+                    continue
+
+                result['succeeded'] = True
+                for query, page in batch:
+                    page_data = data['data'].get(query.alias(page))
+                    if not page_data:
+                        continue
+
+                    media = page_data.get('media') or []
+                    if on_page is not None:
+                        on_page(query, page, media)
+                    else:
+                        pages[query.name][page] = media
+                    print(f"Fetched page {page} of {query.label}, added {len(media)} anime")
+
+                    if not page_data['pageInfo']['hasNextPage'] or not media:
+                        continue
+                    if page < planned_until[query.name]:
+                        continue
+
+                    last_page = last_page_from_total(page_data['pageInfo'], per_page) if page == 1 else None
+                    if last_page and last_page > page:
+                        pending.extend((query, next_page) for next_page in range(page + 1, last_page + 1))
+                        planned_until[query.name] = last_page
+                    else:
+                        # Total was missing or underestimated; continue one page at a time.
+                        pending.append((query, page + 1))
+                        planned_until[query.name] = page + 1
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    for query in queries:
+        for page in sorted(pages[query.name]):
+            result['media'][query.name].extend(pages[query.name][page])
+    return result
+
+
+def fetch_media_by_ids(ids, fields, max_aliases=4, request=anilist_request, max_workers=2,
+                       stop_event=None, name_prefix='ids', max_requests=None):
+    """
+    Fetch an arbitrary set of AniList ids in as few requests as possible.
+
+    Ids are de-duplicated and split into id_in chunks of ID_BATCH_SIZE, which are
+    packed `max_aliases` to a request, paged and sent concurrently under the
+    shared rate limiter, at most `max_requests` of them. Returns {id: media};
+    ids AniList does not know (or that did not fit the budget) are absent.
+    Returns None when AniList is unavailable or no request succeeded.
+    """
+    unique_ids = sorted(set(ids))
+    if not unique_ids:
+        return {}
+
+    result = fetch_batched_pages(
+        id_batch_queries(unique_ids, name_prefix=name_prefix),
+        fields,
+        per_page=ID_BATCH_SIZE,
+        max_aliases=max_aliases,
+        request=request,
+        max_workers=max_workers,
+        stop_event=stop_event,
+        max_requests=max_requests
+    )
+    if result['service_unavailable'] or not result['succeeded']:
+        return None
+
+    media_by_id = {}
+    for media_list in result['media'].values():
+        for media in media_list:
+            media_by_id[media['id']] = media
+    print(f"Fetched {len(media_by_id)} of {len(unique_ids)} requested ids in {result['requests']} requests")
+    return media_by_id
@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the AniList GraphQL API, for load and throughput testing.
+
+Implements the subset of the schema the fetch scripts use: aliased or plain
+`Page(page, perPage) { pageInfo {...} media(...) {...} }` selections with
+pagination, `pageInfo.total`, the type/format/status/season/date/popularity/
+isAdult/search/updatedAt/id_in filters and the sorts we request. Requests are
+metered per minute like AniList (X-RateLimit-* headers, 429 + Retry-After), and
+500s, latency and the 403 maintenance response can be injected.
+
+Usage:
+  python scripts/anilist_mock_server.py --size 30000 --port 5005
+  ANILIST_API_URL=http://127.0.0.1:5005 python scripts/fetch_all_anime.py --full
+
+The dataset is synthetic (seeded, so runs are repeatable) unless --dataset
+points at a JSON list of AniList media objects or a change-probe snapshot.
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+
+from datetime import date, timedelta
+
+from flask import Flask, jsonify, request
+
+DEFAULT_PORT = 5005
+DEFAULT_SIZE = 30000
+DEFAULT_REQUESTS_PER_MINUTE = 90
+MAX_PER_PAGE = 50
+FORMATS = ['TV', 'TV', 'TV', 'ONA', 'TV_SHORT', 'MOVIE', 'OVA', 'SPECIAL']
+GENRES = ['Action', 'Adventure', 'Comedy', 'Drama', 'Fantasy', 'Romance', 'Sci-Fi', 'Slice of Life', 'Sports']
+SEASONS = ['WINTER', 'WINTER', 'WINTER', 'SPRING', 'SPRING', 'SPRING',
+           'SUMMER', 'SUMMER', 'SUMMER', 'FALL', 'FALL', 'FALL']
+
+TOKEN_PATTERN = re.compile(r'''
+    (?P<skip>[\s,]+|\#[^\n]*)
+  | (?P<punct>[{}()\[\]:!$=])
+  | (?P<number>-?\d+(?:\.\d+)?)
+  | (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+''', re.VERBOSE)
+
+
+class QueryError(Exception):
+    """A query the stand-in cannot parse or does not support."""
+
+
+# --- GraphQL subset parser ---------------------------------------------------
+
+class Parser:
+    """Recursive-descent parser for the query documents our scripts send."""
+
+    def __init__(self, text):
+        self.tokens = []
+        position = 0
+        while position < len(text):
+            match = TOKEN_PATTERN.match(text, position)
+            if not match:
+                raise QueryError(f"Syntax Error: unexpected character {text[position]!r}")
+            position = match.end()
+            if match.lastgroup != 'skip':
+                self.tokens.append((match.lastgroup, match.group()))
+        self.index = 0
+
+    def peek(self, value=None):
+        if self.index >= len(self.tokens):
+            return None
+        token = self.tokens[self.index]
+        if value is not None and token[1] != value:
+            return None
+        return token
+
+    def take(self, value=None):
+        token = self.peek()
+        if token is None or (value is not None and token[1] != value):
+            expected = value or 'a token'
+            raise QueryError(f"Syntax Error: expected {expected}, found {token[1] if token else 'end of query'}")
+        self.index += 1
+        return token
+
+    def take_name(self):
+        kind, value = self.take()
+        if kind != 'name':
+            raise QueryError(f"Syntax Error: expected a name, found {value}")
+        return value
+
+    def document(self):
+        if self.peek('query'):
+            self.take('query')
+            if self.peek() and self.peek()[0] == 'name':
+                self.take_name()
+            if self.peek('('):
+                self.variable_definitions()
+        selections = self.selection_set()
+        if self.peek() is not None:
+            raise QueryError(f"Syntax Error: unexpected {self.peek()[1]}")
+        return selections
+
+    def variable_definitions(self):
+        self.take('(')
+        while not self.peek(')'):
+            self.take('$')
+            self.take_name()
+            self.take(':')
+            self.type_reference()
+            if self.peek('='):
+                self.take('=')
+                self.value()
+        self.take(')')
+
+    def type_reference(self):
+        if self.peek('['):
+            self.take('[')
+            self.type_reference()
+            self.take(']')
+        else:
+            self.take_name()
+        if self.peek('!'):
+            self.take('!')
+
+    def selection_set(self):
+        self.take('{')
+        fields = []
+        while not self.peek('}'):
+            fields.append(self.field())
+        self.take('}')
+        return fields
+
+    def field(self):
+        alias = name = self.take_name()
+        if self.peek(':'):
+            self.take(':')
+            name = self.take_name()
+        arguments = {}
+        if self.peek('('):
+            self.take('(')
+            while not self.peek(')'):
+                argument = self.take_name()
+                self.take(':')
+                arguments[argument] = self.value()
+            self.take(')')
+        selections = self.selection_set() if self.peek('{') else None
+        return {'alias': alias, 'name': name, 'arguments': arguments, 'selections': selections}
+
+    def value(self):
+        kind, token = self.take()
+        if token == '$':
+            return ('variable', self.take_name())
+        if token == '[':
+            items = []
+            while not self.peek(']'):
+                items.append(self.value())
+            self.take(']')
+            return ('list', items)
+        if kind == 'number':
+            return ('literal', float(token) if '.' in token else int(token))
+        if kind == 'string':
+            return ('literal', json.loads(token))
+        if kind == 'name':
+            return ('literal', {'true': True, 'false': False, 'null': None}.get(token, token))
+        raise QueryError(f"Syntax Error: unexpected {token}")
+
+
+def resolve(value, variables):
+    kind, payload = value
+    if kind == 'variable':
+        return variables.get(payload)
+    if kind == 'list':
+        return [resolve(item, variables) for item in payload]
+    return payload
+
+
+# --- Dataset -----------------------------------------------------------------
+
+def fuzzy_int(fuzzy):
+    """AniList FuzzyDateInt for a {year, month, day} dict (None without a year)."""
+    if not fuzzy or not fuzzy.get('year'):
+        return None
+    return fuzzy['year'] * 10000 + (fuzzy.get('month') or 0) * 100 + (fuzzy.get('day') or 0)
+
+
+def synthetic_media(size, seed, today=None):
+    """Build `size` AniList-shaped media objects spread over 1990..next year."""
+    rng = random.Random(seed)
+    today = today or date.today()
+    first_day = date(1990, 1, 1)
+    span_days = (today - first_day).days + 365
+    now = int(time.time())
+    media = []
+
+    for media_id in range(1, size + 1):
+        start = first_day + timedelta(days=int(span_days * (rng.random() ** 0.6)))
+        episodes = rng.choice([1, 12, 12, 13, 24, 25, 50, None])
+        precision = rng.random()
+        start_date = {'year': start.year, 'month': start.month, 'day': start.day}
+        if precision < 0.03:
+            start_date = {'year': start.year, 'month': None, 'day': None}
+        elif precision < 0.06:
+            start_date['day'] = None
+
+        if start > today:
+            status, end_date = 'NOT_YET_RELEASED', {'year': None, 'month': None, 'day': None}
+        elif (today - start).days < 7 * (episodes or 26):
+            status, end_date = 'RELEASING', {'year': None, 'month': None, 'day': None}
+        else:
+            end = start + timedelta(days=7 * (episodes or 12))
+            status, end_date = 'FINISHED', {'year': end.year, 'month': end.month, 'day': end.day}
+        if rng.random() < 0.01:
+            status = rng.choice(['HIATUS', 'CANCELLED'])
+
+        popularity = int(math.exp(rng.gauss(7, 2)))
+        title = f"Synthetic Anime {media_id}"
+        media.append({
+            'id': media_id,
+            'idMal': media_id + 100000 if rng.random() < 0.9 else None,
+            'type': 'ANIME',
+            'title': {'romaji': title, 'english': title if rng.random() < 0.6 else None, 'native': None},
+            'format': rng.choice(FORMATS),
+            'status': status,
+            'season': SEASONS[start.month - 1],
+            'seasonYear': start.year,
+            'startDate': start_date,
+            'endDate': end_date,
+            'episodes': episodes,
+            'duration': rng.choice([3, 12, 24, 24, 24, None]),
+            'averageScore': rng.randint(40, 90) if status != 'NOT_YET_RELEASED' else None,
+            'popularity': popularity,
+            'favourites': popularity // 20,
+            'isAdult': rng.random() < 0.02,
+            'genres': rng.sample(GENRES, 2),
+            'updatedAt': now - rng.randint(0, 2 * 365 * 86400),
+            'siteUrl': f"https://anilist.co/anime/{media_id}",
+            'coverImage': {
+                'extraLarge': f"https://img.example/{media_id}/xl.jpg",
+                'large': f"https://img.example/{media_id}/l.jpg",
+                'medium': f"https://img.example/{media_id}/m.jpg",
+            },
+            'trailer': None,
+            'externalLinks': [],
+            'studios': {'nodes': [{'name': f"Studio {media_id % 97}"}]},
+            'nextAiringEpisode': (
+                {'episode': rng.randint(1, episodes or 24), 'airingAt': now + rng.randint(0, 7 * 86400)}
+                if status == 'RELEASING' else None
+            ),
+        })
+    return media
+
+
+def load_dataset(path):
+    """Load a JSON list of media, or a change-probe snapshot ({'media': {id: media}})."""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = list(data.get('media', {}).values())
+    for media in data:
+        media.setdefault('type', 'ANIME')
+    return data
+
+
+# --- media() filtering -------------------------------------------------------
+
+def date_filter(field, compare):
+    def check(media, value):
+        fuzzy = fuzzy_int(media.get(field))
+        return fuzzy is not None and compare(fuzzy, value)
+    return check
+
+
+MEDIA_FILTERS = {
+    'id': lambda media, value: media['id'] == value,
+    'id_in': lambda media, value: media['id'] in value,
+    'type': lambda media, value: media.get('type') == value,
+    'format': lambda media, value: media.get('format') == value,
+    'format_in': lambda media, value: media.get('format') in value,
+    'status': lambda media, value: media.get('status') == value,
+    'status_in': lambda media, value: media.get('status') in value,
+    'status_not': lambda media, value: media.get('status') != value,
+    'season': lambda media, value: media.get('season') == value,
+    'seasonYear': lambda media, value: media.get('seasonYear') == value,
+    'isAdult': lambda media, value: media.get('isAdult') == value,
+    'popularity_greater': lambda media, value: (media.get('popularity') or 0) > value,
+    'popularity_lesser': lambda media, value: (media.get('popularity') or 0) < value,
+    'updatedAt_greater': lambda media, value: (media.get('updatedAt') or 0) > value,
+    'startDate_greater': date_filter('startDate', lambda fuzzy, value: fuzzy > value),
+    'startDate_lesser': date_filter('startDate', lambda fuzzy, value: fuzzy < value),
+    'endDate_greater': date_filter('endDate', lambda fuzzy, value: fuzzy > value),
+    'endDate_lesser': date_filter('endDate', lambda fuzzy, value: fuzzy < value),
+    'search': lambda media, value: any(
+        value.lower() in (title or '').lower() for title in (media.get('title') or {}).values()
+    ),
+}
+
+SORT_KEYS = {
+    'ID': lambda media: media['id'],
+    'POPULARITY': lambda media: media.get('popularity') or 0,
+    'SCORE': lambda media: media.get('averageScore') or 0,
+    'START_DATE': lambda media: fuzzy_int(media.get('startDate')) or 0,
+    'UPDATED_AT': lambda media: media.get('updatedAt') or 0,
+}
+
+
+def filter_media(dataset, arguments):
+    """Apply media() arguments; unset (null) filters are ignored like AniList does."""
+    checks = []
+    for argument, value in arguments.items():
+        if argument == 'sort' or value is None:
+            continue
+        if argument not in MEDIA_FILTERS:
+            raise QueryError(f'Unknown argument "{argument}" on field "media" of type "Page".')
+        checks.append((MEDIA_FILTERS[argument], value))
+    matches = [media for media in dataset if all(check(media, value) for check, value in checks)]
+
+    sorts = arguments.get('sort') or ['ID']
+    if not isinstance(sorts, list):
+        sorts = [sorts]
+    # Stable sorts applied last-key-first give a multi-key ordering.
+    for sort in reversed(sorts):
+        descending = sort.endswith('_DESC')
+        key = SORT_KEYS.get(sort[:-5] if descending else sort)
+        if key is None:
+            raise QueryError(f'Value "{sort}" does not exist in "MediaSort" enum.')
+        matches.sort(key=key, reverse=descending)
+    return matches
+
+
+def project(value, selections):
+    """Keep only the selected fields (recursively) of a media value."""
+    if selections is None or value is None:
+        return value
+    if isinstance(value, list):
+        return [project(item, selections) for item in value]
+    return {field['alias']: project(value.get(field['name']), field['selections']) for field in selections}
+
+
+def resolve_page(dataset, field, variables):
+    arguments = {name: resolve(value, variables) for name, value in field['arguments'].items()}
+    page = max(1, arguments.get('page') or 1)
+    per_page = min(MAX_PER_PAGE, max(1, arguments.get('perPage') or MAX_PER_PAGE))
+
+    result = {}
+    media_field = None
+    for selection in field['selections'] or []:
+        if selection['name'] == 'media':
+            media_field = selection
+    matches = []
+    if media_field is not None:
+        media_arguments = {name: resolve(value, variables) for name, value in media_field['arguments'].items()}
+        matches = filter_media(dataset, media_arguments)
+
+    total = len(matches)
+    last_page = max(1, math.ceil(total / per_page))
+    page_info = {
+        'total': total,
+        'perPage': per_page,
+        'currentPage': page,
+        'lastPage': last_page,
+        'hasNextPage': page < last_page,
+    }
+    window = matches[(page - 1) * per_page:page * per_page]
+
+    for selection in field['selections'] or []:
+        if selection['name'] == 'pageInfo':
+            result[selection['alias']] = project(page_info, selection['selections'])
+        elif selection['name'] == 'media':
+            result[selection['alias']] = project(window, selection['selections'])
+        else:
+            raise QueryError(f'Cannot query field "{selection["name"]}" on type "Page".')
+    return result
+
+
+def execute(dataset, query, variables):
+    data = {}
+    for field in Parser(query).document():
+        if field['name'] != 'Page':
+            raise QueryError(f'Cannot query field "{field["name"]}" on type "Query".')
+        data[field['alias']] = resolve_page(dataset, field, variables or {})
+    return data
+
+
+# --- Rate limiting and fault injection --------------------------------------
+
+class MinuteWindow:
+    """AniList-style fixed per-minute request budget."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._window_start = time.time()
+        self._used = 0
+
+    def take(self):
+        """Count a request; returns (allowed, remaining, reset_at)."""
+        with self._lock:
+            now = time.time()
+            if now - self._window_start >= 60:
+                self._window_start = now
+                self._used = 0
+            reset_at = int(self._window_start + 60)
+            if self._used >= self.limit:
+                return False, 0, reset_at
+            self._used += 1
+            return True, self.limit - self._used, reset_at
+
+
+def create_app(dataset, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, error_rate=0.0,
+               latency_ms=0, maintenance=False, seed=0):
+    app = Flask(__name__)
+    window = MinuteWindow(requests_per_minute)
+    faults = random.Random(seed)
+    faults_lock = threading.Lock()
+
+    @app.post('/')
+    def graphql():
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+
+        if maintenance:
+            return jsonify({'errors': [{
+                'message': 'The AniList API has been temporarily disabled due to severe stability issues.',
+                'status': 403,
+            }]}), 403
+
+        allowed, remaining, reset_at = window.take()
+        headers = {'X-RateLimit-Limit': str(window.limit), 'X-RateLimit-Remaining': str(remaining)}
+        if not allowed:
+            headers['Retry-After'] = str(max(1, reset_at - int(time.time())))
+            headers['X-RateLimit-Reset'] = str(reset_at)
+            return jsonify({'errors': [{'message': 'Too Many Requests.', 'status': 429}]}), 429, headers
+
+        with faults_lock:
+            fail = faults.random() < error_rate
+        if fail:
+            return jsonify({'errors': [{'message': 'Internal Server Error', 'status': 500}]}), 500, headers
+
+        payload = request.get_json(silent=True) or {}
+        try:
+            data = execute(dataset, payload.get('query') or '', payload.get('variables'))
+        except QueryError as e:
+            return jsonify({'errors': [{'message': str(e), 'status': 400}], 'data': None}), 400, headers
+        return jsonify({'data': data}), 200, headers
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local AniList GraphQL stand-in for load testing')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--dataset', help='JSON list of AniList media (or a change-probe snapshot) to serve')
+    parser.add_argument('--size', type=int, default=DEFAULT_SIZE, help='Synthetic titles to generate')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the synthetic data and injected errors')
+    parser.add_argument('--rate-limit', type=int, default=DEFAULT_REQUESTS_PER_MINUTE,
+                        help='Requests per minute before answering 429')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with a 500')
+    parser.add_argument('--latency-ms', type=int, default=0, help='Delay added to every response')
+    parser.add_argument('--maintenance', action='store_true',
+                        help="Answer every request with AniList's 403 'temporarily disabled' error")
+    args = parser.parse_args()
+
+    dataset = load_dataset(args.dataset) if args.dataset else synthetic_media(args.size, args.seed)
+    print(f"Serving {len(dataset)} media at http://{args.host}:{args.port} "
+          f"({args.rate_limit} req/min, {args.error_rate:.0%} errors, {args.latency_ms}ms latency)")
+    app = create_app(
+        dataset,
+        requests_per_minute=args.rate_limit,
+        error_rate=args.error_rate,
+        latency_ms=args.latency_ms,
+        maintenance=args.maintenance,
+        seed=args.seed
+    )
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
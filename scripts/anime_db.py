@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Optional SQLite store for the pipeline's data files.
+
+When ANIME_DB names a database file (e.g. `ANIME_DB=data/anime.db`), the fetch
+scripts upsert everything they save into it and the page generators read from
+it with indexed queries, so the data/*.json files become export artifacts.
+Without ANIME_DB nothing changes: the JSON files stay the working format.
+
+  python scripts/anime_db.py import   # load the existing data/*.json files
+  python scripts/anime_db.py export   # rewrite data/*.json from the database
+
+Lists (anime_data, calendar_history, ...) are stored row per entry in list
+order; the catalog is keyed on AniList id so it can be upserted in place;
+metadata is stored whole as a document. Hand-edited inputs (manual_anime.json,
+custom_links.json and the streaming/9anime link maps) stay JSON only.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+
+# Ordered lists, replaced as a whole whenever the fetch script saves them
+LIST_FILES = {
+    'anime_data': 'data/anime_data.json',
+    'other_anime_sorted': 'data/other_anime_sorted.json',
+    'recently_finished_anime': 'data/recently_finished_anime.json',
+    'upcoming_seasonal_anime': 'data/upcoming_seasonal_anime.json',
+    'calendar_history': 'data/calendar_history.json',
+}
+DOCUMENT_FILES = {
+    'metadata': 'data/metadata.json',
+}
+CATALOG_FILE = "data/all_anime_catalog.json"
+# Document holding the digest of the catalog snapshot the catalog table matches
+CATALOG_SYNC_DOCUMENT = 'catalog_sync'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS lists (
+    collection TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    id INTEGER,
+    mal_id INTEGER,
+    release_date TEXT,
+    end_date TEXT,
+    season TEXT,
+    season_year INTEGER,
+    popularity INTEGER,
+    anilist_score INTEGER,
+    data TEXT NOT NULL,
+    PRIMARY KEY (collection, position)
+);
+CREATE INDEX IF NOT EXISTS lists_id ON lists (id);
+CREATE INDEX IF NOT EXISTS lists_mal_id ON lists (mal_id);
+CREATE INDEX IF NOT EXISTS lists_release_date ON lists (collection, release_date);
+CREATE INDEX IF NOT EXISTS lists_end_date ON lists (collection, end_date);
+CREATE INDEX IF NOT EXISTS lists_season ON lists (collection, season_year, season);
+CREATE INDEX IF NOT EXISTS lists_popularity ON lists (collection, popularity);
+
+CREATE TABLE IF NOT EXISTS catalog (
+    id INTEGER PRIMARY KEY,
+    mal_id INTEGER,
+    start_date TEXT,
+    season TEXT,
+    season_year INTEGER,
+    status TEXT,
+    popularity INTEGER,
+    anilist_score INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS catalog_mal_id ON catalog (mal_id);
+CREATE INDEX IF NOT EXISTS catalog_start_date ON catalog (start_date);
+CREATE INDEX IF NOT EXISTS catalog_season ON catalog (season_year, season);
+CREATE INDEX IF NOT EXISTS catalog_popularity ON catalog (popularity);
+
+CREATE TABLE IF NOT EXISTS documents (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+'''
+
+
+def encode(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+class AnimeDB:
+    """One connection to the SQLite store; use as a context manager to commit and close."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._conn.commit()
+        self.close()
+
+    def close(self):
+        self._conn.close()
+
+    def replace_list(self, name, items):
+        """Replace every row of list `name` with `items`, keeping their order."""
+        self._conn.execute('DELETE FROM lists WHERE collection = ?', (name,))
+        self._conn.executemany(
+            'INSERT INTO lists VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [
+                (
+                    name, position, anime.get('id'), anime.get('mal_id'),
+                    anime.get('release_date'), anime.get('end_date'),
+                    anime.get('season'), anime.get('season_year'),
+                    anime.get('popularity'), anime.get('anilist_score'),
+                    encode(anime),
+                )
+                for position, anime in enumerate(items)
+            ]
+        )
+
+    def load_list(self, name):
+        rows = self._conn.execute(
+            'SELECT data FROM lists WHERE collection = ? ORDER BY position', (name,)
+        )
+        return [json.loads(data) for data, in rows]
+
+    def releases_on(self, name, day):
+        """Entries of list `name` releasing or finishing on `day` (YYYY-MM-DD), in list order."""
+        rows = self._conn.execute(
+            'SELECT data FROM lists WHERE collection = ? AND (release_date = ? OR end_date = ?) '
+            'ORDER BY position',
+            (name, day, day)
+        )
+        return [json.loads(data) for data, in rows]
+
+    def put_document(self, name, value):
+        self._conn.execute(
+            'INSERT OR REPLACE INTO documents (name, data) VALUES (?, ?)', (name, encode(value))
+        )
+
+    def get_document(self, name, default=None):
+        row = self._conn.execute('SELECT data FROM documents WHERE name = ?', (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def upsert_catalog(self, entries):
+        """Insert or replace catalog entries by id; returns how many were written."""
+        rows = [
+            (
+                anime['id'], anime.get('mal_id'), anime.get('start_date'),
+                anime.get('season'), anime.get('season_year'), anime.get('status'),
+                anime.get('popularity'), anime.get('anilist_score'), encode(anime),
+            )
+            for anime in entries
+        ]
+        self._conn.executemany('INSERT OR REPLACE INTO catalog VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        return len(rows)
+
+    def catalog_count(self):
+        return self._conn.execute('SELECT COUNT(*) FROM catalog').fetchone()[0]
+
+    def catalog_synced_with(self):
+        """Digest of the catalog snapshot this table was last synced with, or None."""
+        return self.get_document(CATALOG_SYNC_DOCUMENT, {}).get('sha256')
+
+    def mark_catalog_synced(self, digest):
+        self.put_document(CATALOG_SYNC_DOCUMENT, {'sha256': digest})
+
+    def catalog_by_popularity(self):
+        rows = self._conn.execute('SELECT data FROM catalog ORDER BY popularity DESC, id DESC')
+        return [json.loads(data) for data, in rows]
+
+
+def from_environment():
+    """Open the database named by ANIME_DB, or return None when unset."""
+    path = os.environ.get('ANIME_DB')
+    if not path:
+        return None
+    return AnimeDB(path)
+
+
+def mirror_list_file(path, items):
+    """Replace the stored copy of the list saved at data file `path`, when ANIME_DB is set."""
+    name = next((name for name, list_path in LIST_FILES.items() if list_path == path), None)
+    db = from_environment() if name else None
+    if db is None:
+        return
+    with db:
+        db.replace_list(name, items)
+
+
+def file_digest(path):
+    """sha256 of the file at `path`, or None when it does not exist."""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_json(path, value):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(value, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def import_json_files(db):
+    """Load every data/*.json file the store knows about into `db`."""
+    for name, path in LIST_FILES.items():
+        if os.path.exists(path):
+            items = load_json(path, [])
+            db.replace_list(name, items)
+            print(f"Imported {len(items)} entries from {path}")
+    for name, path in DOCUMENT_FILES.items():
+        if os.path.exists(path):
+            db.put_document(name, load_json(path, {}))
+            print(f"Imported {path}")
+    if os.path.exists(CATALOG_FILE):
+        print(f"Imported {db.upsert_catalog(load_json(CATALOG_FILE, []))} catalog entries from {CATALOG_FILE}")
+        db.mark_catalog_synced(file_digest(CATALOG_FILE))
+
+
+def export_json_files(db):
+    """Rewrite the data/*.json files from `db`."""
+    for name, path in LIST_FILES.items():
+        items = db.load_list(name)
+        write_json(path, items)
+        print(f"Exported {len(items)} entries to {path}")
+    for name, path in DOCUMENT_FILES.items():
+        value = db.get_document(name)
+        if value is not None:
+            write_json(path, value)
+            print(f"Exported {path}")
+    if db.catalog_count():
+        catalog = db.catalog_by_popularity()
+        write_json(CATALOG_FILE, catalog)
+        db.mark_catalog_synced(file_digest(CATALOG_FILE))
+        print(f"Exported {len(catalog)} catalog entries to {CATALOG_FILE}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync the optional SQLite store with the data/*.json files')
+    parser.add_argument('command', choices=('import', 'export'))
+    parser.add_argument(
+        '--db',
+        default=os.environ.get('ANIME_DB', 'data/anime.db'),
+        help='Database file (defaults to $ANIME_DB, then data/anime.db)'
+    )
+    args = parser.parse_args()
+
+    with AnimeDB(args.db) as db:
+        if args.command == 'import':
+            import_json_files(db)
+        else:
+            export_json_files(db)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP client for the AniList and Jikan APIs.
+
+All fetch scripts send their requests through this module so they reuse one
+keep-alive connection pool and follow the same retry/backoff policy. Setting
+ANIME_CASSETTE records or replays every request (see cassette.py).
+"""
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import cassette
+import response_cache
+from rate_limiter import RateLimiter
+
+# Override to point the scripts at a stand-in such as anilist_mock_server.py
+ANILIST_API_URL = os.environ.get('ANILIST_API_URL', "https://graphql.anilist.co")
+JIKAN_API_URL = "https://api.jikan.moe/v4"
+ANILIST_REQUESTS_PER_MINUTE = 90
+# Jikan allows 3 requests/second and 60/minute; the burst covers the former
+JIKAN_REQUESTS_PER_MINUTE = 60
+JIKAN_BURST = 3
+
+POOL_SIZE = 10
+MAX_BACKOFF_SECONDS = 60
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+
+# Shared by every thread in the process; re-seeded from AniList's headers.
+anilist_limiter = RateLimiter('AniList', ANILIST_REQUESTS_PER_MINUTE)
+jikan_limiter = RateLimiter('Jikan', JIKAN_REQUESTS_PER_MINUTE, burst=JIKAN_BURST)
+
+# Record/replay cassette selected through the environment, if any.
+active_cassette = cassette.from_environment()
+
+
+def get_session():
+    """Return the process-wide keep-alive session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({'Accept': 'application/json'})
+            _session = session
+    return _session
+
+
+def pace(seconds):
+    """Sleep between requests; skipped when replaying a cassette at zero latency."""
+    if active_cassette is not None:
+        active_cassette.sleep(seconds)
+    else:
+        time.sleep(seconds)
+
+
+def header_int(headers, name):
+    """Read an integer header, returning None when missing or malformed."""
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def seconds_until_reset(headers):
+    """Seconds until X-RateLimit-Reset (a unix timestamp), or None if not sent."""
+    reset_at = header_int(headers, 'X-RateLimit-Reset')
+    if reset_at is None:
+        return None
+    return max(0.0, reset_at - time.time())
+
+
+def retry_delay(response, attempt):
+    """Seconds to wait before the next attempt, preferring the server's hints."""
+    if response is not None:
+        retry_after = header_int(response.headers, 'Retry-After')
+        if retry_after is not None:
+            return min(retry_after + 1, MAX_BACKOFF_SECONDS)
+        if response.status_code == 429:
+            reset_wait = seconds_until_reset(response.headers)
+            if reset_wait is not None:
+                return min(reset_wait + 1, MAX_BACKOFF_SECONDS)
+    return min(2 ** attempt, MAX_BACKOFF_SECONDS)
+
+
+def observe_rate_limit(limiter, response):
+    """Feed the server's X-RateLimit-* view of the window back into the limiter."""
+    limiter.update_from_headers(
+        header_int(response.headers, 'X-RateLimit-Limit'),
+        header_int(response.headers, 'X-RateLimit-Remaining'),
+        seconds_until_reset(response.headers)
+    )
+
+
+def send_request(method, url, retry_count=3, timeout=15, limiter=None, **kwargs):
+    """
+    Send a request through the shared session.
+
+    When a limiter is given every attempt waits for a token first, and 429
+    responses pause the limiter so concurrent callers back off together.
+    Retries rate-limit responses, server errors and network failures. Returns the
+    final response (which may still be an error status) or None if every attempt
+    failed at the network level.
+    """
+    session = get_session()
+    response = None
+    # Zero-latency replay has no server to protect, and its recorded headers are stale.
+    if active_cassette is not None and active_cassette.zero_latency:
+        limiter = None
+
+    for attempt in range(retry_count):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            if active_cassette is not None:
+                response = active_cassette.request(session, method, url, timeout=timeout, **kwargs)
+            else:
+                response = session.request(method, url, timeout=timeout, **kwargs)
+        except cassette.CassetteMiss:
+            # Retrying cannot help, and carrying on would replay a different run
+            raise
+        except requests.RequestException as e:
+            response = None
+            if attempt == retry_count - 1:
+                print(f"Request Error: {e}. Giving up.")
+                break
+            wait = retry_delay(None, attempt)
+            print(f"Request Error: {e}. Retrying in {wait:.0f}s...")
+            pace(wait)
+            continue
+
+        if limiter is not None:
+            observe_rate_limit(limiter, response)
+
+        if response.status_code not in RETRYABLE_STATUS_CODES:
+            return response
+
+        if attempt == retry_count - 1:
+            break
+        wait = retry_delay(response, attempt)
+        print(f"API Error ({response.status_code}). Retrying in {wait:.0f}s...")
+        if limiter is not None and response.status_code == 429:
+            limiter.pause(wait, reason='retry_after')
+        else:
+            pace(wait)
+
+    return response
+
+
+def service_unavailable_errors(response):
+    """Detect AniList's 403 'temporarily disabled' maintenance response."""
+    if response is None or response.status_code != 403:
+        return None
+
+    try:
+        error_payload = response.json()
+    except ValueError:
+        error_payload = {'errors': [{'message': response.text}]}
+
+    errors = error_payload.get('errors') or []
+    if any('temporarily disabled' in (err.get('message') or '').lower() for err in errors):
+        return errors
+    return None
+
+
+def anilist_request(query, variables, retry_count=3, timeout=15):
+    """
+    Run an AniList GraphQL query.
+
+    Returns the decoded JSON payload, {'service_unavailable': True, 'errors': [...]}
+    when AniList is in maintenance mode, or None on failure. Successful payloads
+    go through the response cache when it is enabled.
+    """
+    cached = response_cache.lookup(ANILIST_API_URL, query, variables)
+    if cached is not None:
+        return cached
+
+    response = send_request(
+        'POST',
+        ANILIST_API_URL,
+        retry_count=retry_count,
+        timeout=timeout,
+        limiter=anilist_limiter,
+        json={'query': query, 'variables': variables}
+    )
+    if response is None:
+        print(f"Failed to fetch from AniList after {retry_count} attempts.")
+        return None
+
+    unavailable_errors = service_unavailable_errors(response)
+    if unavailable_errors is not None:
+        print("AniList API is temporarily unavailable. Preserving the existing dataset.")
+        return {'service_unavailable': True, 'errors': unavailable_errors}
+
+    if response.status_code != 200:
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            print(f"Failed to fetch from AniList after {retry_count} attempts.")
+        else:
+            print(f"HTTP Error {response.status_code}: {response.text[:200]}")
+        return None
+
+    try:
+        payload = response.json()
+    except ValueError:
+        print("AniList returned a response that is not valid JSON.")
+        return None
+
+    response_cache.store(ANILIST_API_URL, query, variables, payload)
+    return payload
+
+
+def jikan_request(path, retry_count=3, timeout=10):
+    """GET a Jikan v4 endpoint, returning decoded JSON or None."""
+    response = send_request(
+        'GET',
+        f"{JIKAN_API_URL}/{path.lstrip('/')}",
+        retry_count=retry_count,
+        timeout=timeout,
+        limiter=jikan_limiter
+    )
+    if response is None or response.status_code != 200:
+        status = response.status_code if response is not None else 'no response'
+        print(f"Error fetching Jikan {path}: {status}")
+        return None
+
+    try:
+        return response.json()
+    except ValueError:
+        return None
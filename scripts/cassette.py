@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Record/replay cassettes for the shared HTTP layer.
+
+Every request sent through api_client.send_request can be captured, with its
+status, headers, body and elapsed time, into an NDJSON cassette file, and later
+served back without touching the network. Configured through the environment so
+any fetch script can run against a cassette unchanged:
+
+  ANIME_CASSETTE=path/to/run.ndjson
+  ANIME_CASSETTE_MODE=record|replay
+  ANIME_CASSETTE_LATENCY=recorded|zero   (replay only, default zero)
+
+Replay matches requests on method, URL and body. Repeated identical requests
+(retries, re-runs of the same page) are served in the order they were recorded;
+a request with no recorded response left raises CassetteMiss rather than
+falling through to the network.
+With `recorded` latency each response is delayed by its recorded elapsed time
+and backoff/rate-limit waits still happen; with `zero` latency they are skipped.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from collections import defaultdict, deque
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+CASSETTE_MODES = ('record', 'replay')
+LATENCY_MODES = ('recorded', 'zero')
+
+
+class CassetteMiss(requests.RequestException):
+    """Replay found no recorded interaction left for a request."""
+
+
+def request_fingerprint(method, url, kwargs):
+    """Stable key for a request: method, URL and its JSON body or query params."""
+    body = kwargs.get('json', kwargs.get('data'))
+    payload = json.dumps(
+        {'method': method.upper(), 'url': url, 'params': kwargs.get('params'), 'body': body},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def build_response(interaction, url):
+    """Turn a recorded interaction back into a requests.Response."""
+    response = requests.Response()
+    response.status_code = interaction['status']
+    response.headers = CaseInsensitiveDict(interaction['headers'])
+    response._content = interaction['body'].encode('utf-8')
+    response.encoding = 'utf-8'
+    response.url = url
+    return response
+
+
+class Cassette:
+    """One cassette file opened for recording or replaying."""
+
+    def __init__(self, path, mode, latency='zero'):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}; expected one of {', '.join(CASSETTE_MODES)}")
+        if latency not in LATENCY_MODES:
+            raise ValueError(f"Unknown cassette latency {latency!r}; expected one of {', '.join(LATENCY_MODES)}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._interactions = defaultdict(deque)
+        self._served = 0
+        self._misses = 0
+        self._recorded = 0
+
+        if mode == 'record':
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Start a fresh cassette; lines are appended as responses arrive.
+            open(path, 'w', encoding='utf-8').close()
+        else:
+            self._load()
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                interaction = json.loads(line)
+                self._interactions[interaction['key']].append(interaction)
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    @property
+    def zero_latency(self):
+        return self.replaying and self.latency == 'zero'
+
+    def sleep(self, seconds):
+        """time.sleep, skipped entirely during zero-latency replay."""
+        if not self.zero_latency:
+            time.sleep(seconds)
+
+    def request(self, session, method, url, **kwargs):
+        """Send (record) or look up (replay) one request."""
+        key = request_fingerprint(method, url, kwargs)
+        if self.replaying:
+            return self._replay(key, method, url)
+        return self._record(key, session, method, url, **kwargs)
+
+    def _replay(self, key, method, url):
+        with self._lock:
+            queue = self._interactions.get(key)
+            interaction = queue.popleft() if queue else None
+            if interaction is None:
+                self._misses += 1
+            else:
+                self._served += 1
+        if interaction is None:
+            raise CassetteMiss(f"No recorded response left for {method.upper()} {url}")
+        if self.latency == 'recorded':
+            time.sleep(interaction['elapsed'])
+        if interaction.get('error'):
+            raise requests.ConnectionError(interaction['error'])
+        return build_response(interaction, url)
+
+    def _record(self, key, session, method, url, **kwargs):
+        started = time.monotonic()
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.RequestException as e:
+            self._write({
+                'key': key,
+                'method': method.upper(),
+                'url': url,
+                'elapsed': round(time.monotonic() - started, 4),
+                'recorded_at': time.time(),
+                'error': str(e),
+            })
+            raise
+
+        self._write({
+            'key': key,
+            'method': method.upper(),
+            'url': url,
+            'status': response.status_code,
+            'headers': dict(response.headers),
+            'body': response.text,
+            'elapsed': round(time.monotonic() - started, 4),
+            'recorded_at': time.time(),
+        })
+        return response
+
+    def _write(self, interaction):
+        line = json.dumps(interaction, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+            self._recorded += 1
+
+    def summary(self):
+        """One-line description of cassette activity for script logs."""
+        with self._lock:
+            if self.replaying:
+                left = sum(len(queue) for queue in self._interactions.values())
+                return (
+                    f"Cassette {self.path} (replay, {self.latency} latency): {self._served} served, "
+                    f"{self._misses} missing, {left} unused"
+                )
+            return f"Cassette {self.path} (record): {self._recorded} interactions recorded"
+
+
+def from_environment():
+    """Open the cassette named by ANIME_CASSETTE, or return None when unset."""
+    path = os.environ.get('ANIME_CASSETTE')
+    if not path:
+        return None
+    mode = os.environ.get('ANIME_CASSETTE_MODE', 'replay')
+    latency = os.environ.get('ANIME_CASSETTE_LATENCY', 'zero')
+    return Cassette(path, mode, latency)
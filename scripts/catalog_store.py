@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+In-memory catalog of processed AniList entries, indexed by id.
+
+fetch_all_anime.py loads the catalog into a CatalogStore once per run and
+upserts fetched batches into it in place, so a merge costs time proportional to
+the batch rather than to the catalog. The store tracks which ids changed since
+it was loaded (or last saved) and caches sorted orders between changes.
+"""
+
+# Fields that change on every fetch without the title itself changing
+VOLATILE_FIELDS = ('fetched_at',)
+
+
+def popularity_key(anime):
+    # Ties broken by id so the JSON file and the SQLite store (ORDER BY popularity
+    # DESC, id DESC) list the catalog in the same order. Catalogs saved before the
+    # tie-break had ties in fetch order; their first save reorders those once.
+    return (anime.get('popularity') or 0, anime['id'])
+
+
+def same_content(old, new):
+    """True when two entries differ at most in VOLATILE_FIELDS."""
+    keys = (set(old) | set(new)) - set(VOLATILE_FIELDS)
+    return all(old.get(key) == new.get(key) for key in keys)
+
+
+class CatalogStore:
+    """Catalog entries keyed on AniList id, updated in place."""
+
+    def __init__(self, entries=()):
+        self._by_id = {}
+        for anime in entries:
+            self._by_id[anime['id']] = anime
+        self.dirty = set()
+        self._version = 0
+        self._sorted = {}
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, anime_id):
+        return anime_id in self._by_id
+
+    def __iter__(self):
+        return iter(self._by_id.values())
+
+    def get(self, anime_id, default=None):
+        return self._by_id.get(anime_id, default)
+
+    def upsert_many(self, entries):
+        """
+        Insert or replace entries by id; returns {'added', 'updated', 'unchanged'}.
+
+        An entry that differs only in VOLATILE_FIELDS counts as unchanged, but is
+        still stored (and marked dirty) so its fetched_at moves forward.
+        """
+        counts = {'added': 0, 'updated': 0, 'unchanged': 0}
+        changed = False
+        for anime in entries:
+            existing = self._by_id.get(anime['id'])
+            if existing is None:
+                counts['added'] += 1
+            elif same_content(existing, anime):
+                counts['unchanged'] += 1
+                if existing == anime:
+                    continue
+            else:
+                counts['updated'] += 1
+            self._by_id[anime['id']] = anime
+            self.dirty.add(anime['id'])
+            changed = True
+        if changed:
+            self._version += 1
+        return counts
+
+    def mark_clean(self):
+        """Forget the dirty ids, e.g. after the store was written to disk."""
+        self.dirty.clear()
+
+    def iter_sorted(self, key=popularity_key, reverse=False):
+        """
+        Yield entries ordered by `key`.
+
+        The id order is cached per (key, reverse) and re-sorted only after the
+        store changed; the previous order is the starting point, which Python's
+        sort handles in near-linear time when few entries moved.
+        """
+        cached_version, ids = self._sorted.get((key, reverse), (None, None))
+        if cached_version != self._version:
+            if ids is None:
+                ids = list(self._by_id)
+            else:
+                known = set(ids)
+                ids = ids + [anime_id for anime_id in self._by_id if anime_id not in known]
+            ids.sort(key=lambda anime_id: key(self._by_id[anime_id]), reverse=reverse)
+            self._sorted[(key, reverse)] = (self._version, ids)
+        for anime_id in ids:
+            yield self._by_id[anime_id]
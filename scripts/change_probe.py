@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Two-phase AniList fetches driven by `updatedAt`.
+
+Phase one pages through the usual queries selecting only ids, `updatedAt` and
+a few volatile fields (popularity, next airing episode, ...). Ids that are new
+or whose `updatedAt` moved since the last run are then fetched in full via
+`id_in` batches; everything else is rebuilt from the local snapshot of the
+previous run with the fresh volatile fields laid on top.
+"""
+import hashlib
+import json
+import os
+
+from anilist_batch import fetch_batched_pages, id_batch_queries
+
+SNAPSHOT_DIR = ".cache"
+# Probe pages are tiny, so more of them fit into one request
+PROBE_ALIASES_PER_REQUEST = 10
+
+
+def snapshot_path(name):
+    return os.path.join(SNAPSHOT_DIR, f"media_snapshot_{name}.json")
+
+
+def fields_fingerprint(fields):
+    """Hash of a field selection, so a snapshot taken with other fields is ignored."""
+    return hashlib.sha1(' '.join(fields.split()).encode('utf-8')).hexdigest()
+
+
+def load_snapshot(name, fields):
+    """Return {id: media} from the previous run, or {} if missing/incompatible."""
+    path = snapshot_path(name)
+    if not os.path.exists(path):
+        return {}
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Warning: Failed to load {path}: {e}")
+        return {}
+
+    if data.get('fields') != fields_fingerprint(fields):
+        print(f"Snapshot {path} was taken with different fields, ignoring it.")
+        return {}
+    return {int(media_id): media for media_id, media in data.get('media', {}).items()}
+
+
+class SnapshotWriter:
+    """
+    Write a snapshot entry by entry as titles complete.
+
+    Entries go to a temporary file that replaces the snapshot on commit(), so an
+    interrupted run never corrupts it and the merged media need not be kept.
+    """
+
+    def __init__(self, name, fields):
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        self.path = snapshot_path(name)
+        self._tmp_path = f"{self.path}.tmp"
+        self._file = open(self._tmp_path, 'w', encoding='utf-8')
+        self._file.write(f'{{"fields": {json.dumps(fields_fingerprint(fields))}, "media": {{')
+        self.count = 0
+
+    def add(self, media_id, media):
+        separator = ', ' if self.count else ''
+        self._file.write(f"{separator}{json.dumps(str(media_id))}: {json.dumps(media, ensure_ascii=False)}")
+        self.count += 1
+
+    def commit(self):
+        self._file.write('}}')
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def discard(self):
+        self._file.close()
+        os.remove(self._tmp_path)
+
+
+def fetch_with_change_probe(queries, full_fields, volatile_fields, snapshot_name,
+                            max_workers=1, stop_event=None, on_media=None):
+    """
+    Run `queries` as a cheap probe and fetch full media only for changed ids.
+
+    Returns the same shape as fetch_batched_pages, with every media object
+    carrying `full_fields` plus the freshly probed volatile fields. When
+    `on_media(media, query_name)` is given it is called as soon as each object
+    is complete: right after the probe for titles rebuilt from the snapshot, and
+    page by page for the changed titles fetched in full. In that mode the media
+    are not returned, and each one is written to the new snapshot on arrival
+    rather than kept; only the probed fields stay in memory, and the previous
+    snapshot is released before the changed titles are fetched.
+    """
+    probe_fields = f"id updatedAt {volatile_fields}"
+    probe = fetch_batched_pages(
+        queries,
+        probe_fields,
+        max_aliases=PROBE_ALIASES_PER_REQUEST,
+        max_workers=max_workers,
+        stop_event=stop_event
+    )
+    if probe['service_unavailable'] or not probe['succeeded']:
+        return probe
+
+    snapshot = load_snapshot(snapshot_name, full_fields)
+    probed_by_id = {}
+    probe_sources = {}
+    for name, media_list in probe['media'].items():
+        for media in media_list:
+            probed_by_id[media['id']] = media
+            probe_sources.setdefault(media['id'], []).append(name)
+
+    merged_ids = set()
+    merged_by_id = {} if on_media is None else None
+    writer = SnapshotWriter(snapshot_name, full_fields)
+
+    def merge(media_id, base):
+        merged = dict(base)
+        merged.update(probed_by_id[media_id])
+        merged_ids.add(media_id)
+        writer.add(media_id, merged)
+        if merged_by_id is not None:
+            merged_by_id[media_id] = merged
+        else:
+            for name in probe_sources[media_id]:
+                on_media(merged, name)
+
+    changed_ids = sorted(
+        media_id for media_id, media in probed_by_id.items()
+        if media_id not in snapshot or snapshot[media_id].get('updatedAt') != media.get('updatedAt')
+    )
+    print(f"Change probe: {len(probed_by_id)} titles, {len(changed_ids)} new or changed "
+          f"({probe['requests']} probe requests)")
+
+    try:
+        changed = set(changed_ids)
+        for media_id in probed_by_id:
+            if media_id not in changed:
+                merge(media_id, snapshot[media_id])
+        del snapshot
+
+        requests_used = probe['requests']
+        if changed_ids:
+            def on_page(query, page, media_list):
+                for media in media_list:
+                    if media['id'] in probed_by_id and media['id'] not in merged_ids:
+                        merge(media['id'], media)
+
+            full = fetch_batched_pages(
+                id_batch_queries(changed_ids, name_prefix='changed'),
+                full_fields,
+                max_workers=max_workers,
+                stop_event=stop_event,
+                on_page=on_page
+            )
+            requests_used += full['requests']
+            if full['service_unavailable']:
+                writer.discard()
+                return full
+    except BaseException:
+        writer.discard()
+        raise
+
+    missing = len(probed_by_id) - len(merged_ids)
+    if missing:
+        print(f"Warning: {missing} changed titles could not be fetched in full this run")
+
+    writer.commit()
+
+    return {
+        'media': {} if merged_by_id is None else {
+            name: [merged_by_id[media['id']] for media in media_list if media['id'] in merged_by_id]
+            for name, media_list in probe['media'].items()
+        },
+        'succeeded': True,
+        'service_unavailable': False,
+        'requests': requests_used,
+    }
@@ -3,34 +3,61 @@
 Fetch all anime catalog from AniList API.
 
 Modes:
-  --full      Full historical scan from 1990 to today (run locally once to build initial catalog)
-  (default)   Incremental mode: fetch previous + current month only, merge into existing catalog
+  --full      Full historical scan from 1990 to today in adaptive date windows (run locally once to build initial catalog)
+  --delta     Upsert every title AniList edited since the last --delta run
+  (default)   Incremental mode: fetch previous + current month, refresh the stalest volatile
+              entries within --refresh-budget requests, merge into existing catalog
 
 Uses AniList `id` as deduplication key — safe to run multiple times.
 """
+import hashlib
 import json
-import requests
-import time
 import argparse
+import math
 import os
+import sys
+from bisect import bisect_right
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta, date
 from calendar import monthrange
 
-ANILIST_API_URL = "https://graphql.anilist.co"
-CATALOG_FILE = "data/all_anime_catalog.json"
+from anilist_batch import (
+    ID_BATCH_SIZE,
+    PagedQuery,
+    fetch_batch,
+    fetch_media_by_ids,
+)
+import anime_db
+from api_client import active_cassette, anilist_limiter, anilist_request
+from catalog_store import CatalogStore, popularity_key
+import response_cache
 
-QUERY_BY_DATE = '''
-query ($page: Int, $perPage: Int, $startDate: FuzzyDateInt, $endDate: FuzzyDateInt) {
-    Page(page: $page, perPage: $perPage) {
-        pageInfo { hasNextPage currentPage total }
-        media(
-            type: ANIME,
-            format_in: [TV, ONA, TV_SHORT],
-            sort: [START_DATE],
-            startDate_greater: $startDate,
-            startDate_lesser: $endDate,
-            isAdult: false
-        ) {
+CATALOG_FILE = "data/all_anime_catalog.json"
+# Append-only NDJSON of processed records not yet folded into CATALOG_FILE
+CATALOG_LOG_FILE = "data/all_anime_catalog.log.ndjson"
+# Fold the log into the snapshot once it grows past this size
+CATALOG_LOG_COMPACT_BYTES = 16 * 1024 * 1024
+SYNC_STATE_FILE = "data/catalog_sync_state.json"
+# Progress of an unfinished --full scan: planned windows, finished windows and
+# the pages fetched so far of windows that are not merged yet
+SCAN_STATE_FILE = "data/full_scan_state.json"
+# Per-window fingerprints from the last complete fetch, used to skip windows
+# that have not changed since
+SCAN_MANIFEST_FILE = "data/full_scan_manifest.json"
+
+# Media filter shared by the single-page and batched date-range queries
+DATE_RANGE_ARGS = (
+    'type: ANIME, format_in: [TV, ONA, TV_SHORT], sort: [START_DATE], '
+    'startDate_greater: $startDate, startDate_lesser: $endDate, isAdult: false'
+)
+DATE_RANGE_VARIABLE_TYPES = {'startDate': 'FuzzyDateInt', 'endDate': 'FuzzyDateInt'}
+# Same window, most recently edited title first (window fingerprint probes)
+WINDOW_PROBE_ARGS = (
+    'type: ANIME, format_in: [TV, ONA, TV_SHORT], sort: [UPDATED_AT_DESC], '
+    'startDate_greater: $startDate, startDate_lesser: $endDate, isAdult: false'
+)
+
+CATALOG_FIELDS = '''
             id idMal
             title { romaji english }
             averageScore popularity genres episodes format status
@@ -39,48 +66,84 @@ query ($page: Int, $perPage: Int, $startDate: FuzzyDateInt, $endDate: FuzzyDateI
             trailer { id site thumbnail }
             siteUrl
             startDate { year month day }
-        }
-    }
-}
 '''
 
+QUERY_BY_DATE = f'''
+query ($page: Int, $perPage: Int, $startDate: FuzzyDateInt, $endDate: FuzzyDateInt) {{
+    Page(page: $page, perPage: $perPage) {{
+        pageInfo {{ hasNextPage currentPage total }}
+        media({DATE_RANGE_ARGS}) {{
+{CATALOG_FIELDS}
+        }}
+    }}
+}}
+'''
+
+# First year covered by the full scan (and therefore by delta syncs)
+FULL_SCAN_FIRST_YEAR = 1990
+
+# Same date scope as the full scan (exclusive bounds), newest edits first
+DELTA_ARGS = (
+    'type: ANIME, format_in: [TV, ONA, TV_SHORT], sort: [UPDATED_AT_DESC], '
+    'startDate_greater: $startDate, startDate_lesser: $endDate, isAdult: false'
+)
+
+QUERY_BY_UPDATED = f'''
+query ($page: Int, $perPage: Int, $startDate: FuzzyDateInt, $endDate: FuzzyDateInt) {{
+    Page(page: $page, perPage: $perPage) {{
+        pageInfo {{ hasNextPage currentPage }}
+        media({DELTA_ARGS}) {{
+            updatedAt
+{CATALOG_FIELDS}
+        }}
+    }}
+}}
+'''
+
+# Default number of AniList requests each incremental run may spend refreshing
+# the stalest, most volatile catalog entries (0 disables the refresh)
+REFRESH_BUDGET = 10
+# How much a title's status makes its popularity/score likely to move
+STATUS_VOLATILITY = {
+    'RELEASING': 1.0,
+    'NOT_YET_RELEASED': 0.6,
+    'HIATUS': 0.3,
+    'FINISHED': 0.05,
+    'CANCELLED': 0.01,
+}
+# Staleness assumed for entries fetched before fetched_at was recorded
+UNKNOWN_STALENESS_DAYS = 365
+
+# How far back the first --delta run looks when no high-water mark exists yet
+DELTA_DEFAULT_LOOKBACK_DAYS = 31
+
+PER_PAGE = 50
+MAX_PAGES_PER_WINDOW = 50
+SCAN_WORKERS = 4
+# Exit status of an interrupted --full run (the shell's convention for SIGINT)
+EXIT_INTERRUPTED = 130
+ALIASES_PER_REQUEST = 4
+# Probes select only `id`, so far more of them fit into one request
+PROBES_PER_REQUEST = 20
+# Merge adjacent sparse ranges only up to this share of the page cap, leaving
+# room for titles added between the probe and the fetch
+MERGE_FILL_RATIO = 0.9
+# An interrupted scan older than this is planned again instead of resumed
+SCAN_STATE_MAX_AGE_DAYS = 7
+# Unchanged windows are still re-fetched after this long to pick up score drift
+WINDOW_REFRESH_DAYS = 90
+
+
+class ScanAborted(Exception):
+    """Raised to stop a full scan early while keeping completed windows."""
 
 
 def make_request(query, variables, retry_count=5):
     """Make AniList API request with retries and rate-limit handling."""
-    for attempt in range(retry_count):
-        try:
-            response = requests.post(
-                ANILIST_API_URL,
-                json={'query': query, 'variables': variables},
-                timeout=20
-            )
-            # Check rate limit headers
-            remaining = int(response.headers.get('X-RateLimit-Remaining', 10))
-            if remaining <= 2:
-                # Proactively slow down before hitting the limit
-                print(f"  Rate limit low ({remaining} remaining), pausing 15s...")
-                time.sleep(15)
-
-            if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 429:
-                retry_after = int(response.headers.get('Retry-After', 60))
-                print(f"  Rate limited. Waiting {retry_after}s...")
-                time.sleep(retry_after + 2)
-            elif response.status_code >= 500:
-                wait = 5 * (attempt + 1)
-                print(f"  Server error {response.status_code}. Retrying in {wait}s...")
-                time.sleep(wait)
-            else:
-                print(f"  HTTP error {response.status_code}: {response.text[:200]}")
-                return None
-        except requests.RequestException as e:
-            wait = 5 * (attempt + 1)
-            print(f"  Request error: {e}. Retrying in {wait}s...")
-            time.sleep(wait)
-    print("  Failed after all retries.")
-    return None
+    data = anilist_request(query, variables, retry_count=retry_count, timeout=20)
+    if data and data.get('service_unavailable'):
+        return None
+    return data
 
 
 def fuzzy_date(year, month, day=1):
@@ -137,6 +200,7 @@ def process_anime(raw):
         'episodes': raw.get('episodes'),
         'status': raw.get('status'),
         'start_date': start_date,
+        'fetched_at': date.today().isoformat(),
     }
 
 
@@ -166,7 +230,6 @@ def fetch_by_date_range(start_fuzzy, end_fuzzy, label=""):
             break
 
         page += 1
-        time.sleep(1)
 
     if label and results:
         print(f"  {label}: fetched {len(results)} anime")
@@ -176,109 +239,590 @@ def fetch_by_date_range(start_fuzzy, end_fuzzy, label=""):
 
 
 def merge_into_catalog(catalog, new_anime):
-    """Merge new_anime into catalog using id as dedup key (upsert)."""
-    catalog_dict = {a['id']: a for a in catalog}
-    updated = 0
-    added = 0
-
-    for anime in new_anime:
-        if anime['id'] in catalog_dict:
-            updated += 1
-        else:
-            added += 1
-        catalog_dict[anime['id']] = anime
+    """Upsert new_anime into the CatalogStore by id and report the counts."""
+    counts = catalog.upsert_many(new_anime)
+    print(f"  Merged: {counts['added']} new, {counts['updated']} updated, "
+          f"{counts['unchanged']} unchanged, total {len(catalog)}")
+    return counts
+
+
+def append_to_catalog_log(records):
+    """Append processed records to the ingestion log and fsync it."""
+    os.makedirs(os.path.dirname(CATALOG_LOG_FILE), exist_ok=True)
+    with open(CATALOG_LOG_FILE, 'a', encoding='utf-8') as f:
+        f.write(''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_catalog_log():
+    """Records in the ingestion log, in append order."""
+    if not os.path.exists(CATALOG_LOG_FILE):
+        return []
+    records = []
+    with open(CATALOG_LOG_FILE, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A crash mid-append leaves a partial last line; its page is re-fetched
+                print(f"Warning: {CATALOG_LOG_FILE} ends with a partial record; ignoring it")
+                break
+    return records
+
 
-    print(f"  Merged: {added} new, {updated} updated, total {len(catalog_dict)}")
-    return list(catalog_dict.values())
+def catalog_log_size():
+    return os.path.getsize(CATALOG_LOG_FILE) if os.path.exists(CATALOG_LOG_FILE) else 0
 
 
 def load_catalog():
-    """Load existing catalog or return empty list."""
+    """Load the catalog snapshot plus any records still in the ingestion log into a CatalogStore."""
+    catalog = CatalogStore()
     if os.path.exists(CATALOG_FILE):
         with open(CATALOG_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            print(f"Loaded existing catalog: {len(data)} anime")
-            return data
-    print("No existing catalog found, starting fresh.")
-    return []
+            catalog = CatalogStore(json.load(f))
+        print(f"Loaded existing catalog: {len(catalog)} anime")
+    else:
+        print("No existing catalog found, starting fresh.")
+
+    logged = read_catalog_log()
+    if logged:
+        print(f"Replaying {len(logged)} records from {CATALOG_LOG_FILE}")
+        merge_into_catalog(catalog, logged)
+    return catalog
+
+
+def catalog_needs_save(catalog):
+    """True when the catalog holds changes the snapshot lacks, or a log is waiting to be compacted."""
+    return bool(catalog.dirty) or os.path.exists(CATALOG_LOG_FILE)
 
 
 def save_catalog(catalog):
-    """Save catalog sorted by popularity descending."""
-    catalog.sort(key=lambda x: x.get('popularity', 0), reverse=True)
+    """
+    Atomically save the catalog sorted by popularity descending.
+
+    The catalog passed in already contains everything in the ingestion log
+    (load_catalog replays it), so the log is compacted away afterwards.
+    """
     os.makedirs('data', exist_ok=True)
-    with open(CATALOG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(catalog, f, ensure_ascii=False, indent=2)
+    db = anime_db.from_environment()
+    # The catalog table is in step with the snapshot on disk only if the last
+    # save that touched it wrote this very file; runs without ANIME_DB break that
+    previous_digest = anime_db.file_digest(CATALOG_FILE) if db is not None else None
+    tmp_path = f"{CATALOG_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(list(catalog.iter_sorted(popularity_key, reverse=True)), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, CATALOG_FILE)
+    if os.path.exists(CATALOG_LOG_FILE):
+        os.remove(CATALOG_LOG_FILE)
+
+    if db is not None:
+        with db:
+            if previous_digest is not None and db.catalog_synced_with() == previous_digest:
+                written = db.upsert_catalog(catalog.get(anime_id) for anime_id in catalog.dirty)
+            else:
+                written = db.upsert_catalog(catalog)
+            db.mark_catalog_synced(anime_db.file_digest(CATALOG_FILE))
+        print(f"Upserted {written} catalog entries into {db.path}")
+    catalog.mark_clean()
     print(f"Saved catalog: {len(catalog)} anime to {CATALOG_FILE}")
 
 
-def run_full_scan():
+def fuzzy_to_date(value):
+    """Convert a FuzzyDateInt to a real date, treating unknown month/day as 1."""
+    year = value // 10000
+    month = min(max((value // 100) % 100, 1), 12)
+    day = min(max(value % 100, 1), monthrange(year, month)[1])
+    return date(year, month, day)
+
+
+def describe_range(start, end):
+    """Human readable label for an inclusive FuzzyDateInt range."""
+    start_year, end_year = start // 10000, end // 10000
+    if start % 10000 == 0 and end % 10000 == 1231:
+        return f"{start_year}" if start_year == end_year else f"{start_year}-{end_year}"
+    return f"{fuzzy_to_date(start).isoformat()}..{fuzzy_to_date(end).isoformat()}"
+
+
+def date_range_query(start, end, name_prefix='w', media_args=DATE_RANGE_ARGS, cache_family='window'):
     """
-    Full historical scan from 1990 to today (for local initial build).
-    Uses 2-year windows with 1s between pages and 2s between windows.
-    Checkpoints to disk after each window so progress is never lost.
+    Build a PagedQuery covering the inclusive FuzzyDateInt range [start, end].
+
+    AniList's startDate_greater/_lesser are exclusive, so the bounds are widened
+    by one; ranges built from adjacent ints therefore never leave gaps, and
+    year-only (YYYY0000) or month-only (YYYYMM00) start dates are covered too.
     """
-    print("=== FULL HISTORICAL SCAN ===")
-    print("Fetches all TV/ONA anime from 1990 to present in 2-year windows.")
-    print("Progress is saved after each window — safe to re-run if interrupted.\n")
+    return PagedQuery(
+        f"{name_prefix}{start}_{end}",
+        media_args,
+        variables={'startDate': start - 1, 'endDate': end + 1},
+        variable_types=DATE_RANGE_VARIABLE_TYPES,
+        label=describe_range(start, end),
+        cache_family=cache_family
+    )
 
-    catalog = load_catalog()
-    existing_ids = {a['id'] for a in catalog}
-    today = date.today()
 
-    year = 1990
-    while year <= today.year:
-        year_end = min(year + 1, today.year)
-        start_fuzzy = fuzzy_date(year, 1, 1)
-        end_fuzzy = fuzzy_date(year_end, 12, 31)
-        label = f"{year}" if year == year_end else f"{year}-{year_end}"
-
-        print(f"\n[{label}]")
-        page = 1
-        window_results = []
-
-        while True:
-            variables = {
-                'page': page,
-                'perPage': 50,
-                'startDate': start_fuzzy,
-                'endDate': end_fuzzy,
-            }
-            data = make_request(QUERY_BY_DATE, variables)
-
-            if not data or 'data' not in data:
-                print(f"  Request failed on page {page}, saving and continuing...")
-                break
+def probe_range_totals(ranges, request):
+    """
+    Look up pageInfo.total for each (start, end) range with one-item probes.
 
-            page_data = data['data']['Page']
-            media = page_data['media']
-            if not media:
-                break
+    Probes only select `id`, so many of them share a single request. Returns
+    ({range: total}, number of requests used); ranges whose probe failed are
+    left out.
+    """
+    queries = {
+        date_range_query(start, end, 'probe', cache_family='window_totals'): (start, end)
+        for start, end in ranges
+    }
+    items = [(query, 1) for query in queries]
+    totals = {}
+    requests_used = 0
+
+    for i in range(0, len(items), PROBES_PER_REQUEST):
+        batch = items[i:i + PROBES_PER_REQUEST]
+        data = fetch_batch(batch, 'id', 1, request)
+        requests_used += 1
+        if data and data.get('service_unavailable'):
+            raise ScanAborted("AniList is temporarily unavailable")
+        if not data or not data.get('data'):
+            continue
+        for query, page in batch:
+            page_data = data['data'].get(query.alias(page))
+            if page_data:
+                totals[queries[query]] = page_data['pageInfo'].get('total') or 0
+
+    return totals, requests_used
+
+
+def split_range(start, end):
+    """Bisect an inclusive FuzzyDateInt range by calendar date, or None if it is one day."""
+    first, last = fuzzy_to_date(start), fuzzy_to_date(end)
+    if first >= last:
+        return None
+    middle = first + (last - first) // 2
+    middle_int = fuzzy_date(middle.year, middle.month, middle.day)
+    if middle_int < start:
+        middle_int = start
+    return (start, middle_int), (middle_int + 1, end)
 
-            new_in_page = [process_anime(a) for a in media]
-            window_results.extend(new_in_page)
-            print(f"  page {page} — {len(window_results)} fetched this window")
 
-            if not page_data['pageInfo']['hasNextPage'] or page >= 50:
-                break
+def plan_scan_windows(today, request, first_year=FULL_SCAN_FIRST_YEAR):
+    """
+    Plan date windows for a full scan so none exceeds the page cap.
 
-            page += 1
-            time.sleep(1)
+    Every year is probed for its total; years that would need more than
+    MAX_PAGES_PER_WINDOW pages are bisected (and re-probed) until they fit, and
+    adjacent sparse ranges are merged while the combined total stays under the
+    cap. Returns ([(start, end, total)], probe request count), oldest first.
+    """
+    window_capacity = MAX_PAGES_PER_WINDOW * PER_PAGE
+    merge_capacity = int(window_capacity * MERGE_FILL_RATIO)
+    ranges = [(year * 10000, year * 10000 + 1231) for year in range(first_year, today.year + 1)]
+    totals, probe_requests = probe_range_totals(ranges, request)
+    missing = [r for r in ranges if r not in totals]
+    if missing:
+        raise ScanAborted(f"Could not probe {len(missing)} date ranges")
 
-        if window_results:
-            catalog = merge_into_catalog(catalog, window_results)
-            save_catalog(catalog)
-            print(f"  Checkpoint: {len(catalog)} total anime in catalog")
+    while True:
+        oversized = [r for r in ranges if totals[r] > window_capacity and split_range(*r)]
+        if not oversized:
+            break
+        halves = []
+        for r in oversized:
+            left, right = split_range(*r)
+            index = ranges.index(r)
+            ranges[index:index + 1] = [left, right]
+            halves.extend([left, right])
+            print(f"  {describe_range(*r)} has {totals[r]} anime, splitting")
+        half_totals, used = probe_range_totals(halves, request)
+        probe_requests += used
+        if len(half_totals) != len(halves):
+            raise ScanAborted("Could not probe split date ranges")
+        totals.update(half_totals)
+
+    windows = []
+    for start, end in ranges:
+        total = totals[(start, end)]
+        if windows and windows[-1][2] + total <= merge_capacity:
+            previous_start, _, previous_total = windows[-1]
+            windows[-1] = (previous_start, end, previous_total + total)
+        else:
+            windows.append((start, end, total))
+
+    for start, end, total in windows:
+        if total > window_capacity:
+            print(f"  Warning: {describe_range(start, end)} still has {total} anime; "
+                  f"only the first {window_capacity} can be fetched")
+    return windows, probe_requests
+
+
+def probe_window_fingerprints(windows, request):
+    """
+    Fingerprint each (start, end) window with a one-item probe.
+
+    The probe is sorted by most recent edit, so it returns the window's
+    pageInfo.total and the id/updatedAt of its latest edited title. Returns
+    ({range: {'total', 'latest'}}, number of requests used); failed probes are
+    left out.
+    """
+    queries = {
+        date_range_query(start, end, 'latest', WINDOW_PROBE_ARGS, 'window_fingerprint'): (start, end)
+        for start, end in windows
+    }
+    items = [(query, 1) for query in queries]
+    fingerprints = {}
+    requests_used = 0
+
+    for i in range(0, len(items), PROBES_PER_REQUEST):
+        batch = items[i:i + PROBES_PER_REQUEST]
+        data = fetch_batch(batch, 'id updatedAt', 1, request)
+        requests_used += 1
+        if data and data.get('service_unavailable'):
+            raise ScanAborted("AniList is temporarily unavailable")
+        if not data or not data.get('data'):
+            continue
+        for query, page in batch:
+            page_data = data['data'].get(query.alias(page))
+            if page_data:
+                media = page_data.get('media') or [{}]
+                fingerprints[queries[query]] = {
+                    'total': page_data['pageInfo'].get('total') or 0,
+                    'latest': [media[0].get('id'), media[0].get('updatedAt')],
+                }
+
+    return fingerprints, requests_used
+
+
+def start_date_int(start_date):
+    """FuzzyDateInt for a catalog start_date ('YYYY', 'YYYY-MM' or 'YYYY-MM-DD')."""
+    parts = [int(part) for part in start_date.split('-')] + [0, 0]
+    return parts[0] * 10000 + parts[1] * 100 + parts[2]
+
+
+def window_catalog_ids(catalog, windows):
+    """
+    {(start, end): set of catalog ids starting in that window} for disjoint windows.
+
+    One pass over the catalog, each start date placed by bisecting the window starts.
+    """
+    bounds = sorted(windows)
+    starts = [start for start, _ in bounds]
+    index = {window: set() for window in bounds}
+    for anime in catalog:
+        if not anime.get('start_date'):
+            continue
+        value = start_date_int(anime['start_date'])
+        position = bisect_right(starts, value) - 1
+        if position >= 0 and value <= bounds[position][1]:
+            index[bounds[position]].add(anime['id'])
+    return index
+
+
+def window_id_hash(ids):
+    """sha256 over the sorted catalog ids of one window (see window_catalog_ids)."""
+    return hashlib.sha256(','.join(map(str, sorted(ids))).encode('utf-8')).hexdigest()
+
+
+def load_scan_manifest():
+    """
+    Load {window name: {'total', 'latest', 'id_hash', 'fetched_at'}}.
+
+    `id_hash` covers the ids the local catalog holds for the window, not
+    AniList's: it catches titles lost locally, while titles added or removed on
+    AniList show up in `total` and `latest`.
+    """
+    if not os.path.exists(SCAN_MANIFEST_FILE):
+        return {}
+    try:
+        with open(SCAN_MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Warning: Failed to load {SCAN_MANIFEST_FILE}: {e}")
+        return {}
+
+
+def save_scan_manifest(manifest):
+    """Atomically replace the window manifest file."""
+    os.makedirs(os.path.dirname(SCAN_MANIFEST_FILE), exist_ok=True)
+    tmp_path = f"{SCAN_MANIFEST_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, SCAN_MANIFEST_FILE)
+
+
+def unchanged_windows(planned, fingerprints, manifest, window_ids, today, refresh_days=WINDOW_REFRESH_DAYS):
+    """
+    Names of planned windows that can be skipped.
+
+    A window is unchanged when its manifest entry is younger than
+    `refresh_days`, the probe still reports the same total and latest edit, and
+    the catalog still holds the same id set for it (`window_ids`, from
+    window_catalog_ids).
+    """
+    unchanged = set()
+    for start, end, _ in planned:
+        name = date_range_query(start, end).name
+        entry = manifest.get(name)
+        fingerprint = fingerprints.get((start, end))
+        if not entry or not fingerprint:
+            continue
+        try:
+            age = (today - date.fromisoformat(entry['fetched_at'])).days
+        except (KeyError, TypeError, ValueError):
+            continue
+        if (age < refresh_days
+                and entry.get('total') == fingerprint['total']
+                and entry.get('latest') == fingerprint['latest']
+                and entry.get('id_hash') == window_id_hash(window_ids[(start, end)])):
+            unchanged.add(name)
+    return unchanged
+
+
+def load_scan_state(max_age_days=SCAN_STATE_MAX_AGE_DAYS):
+    """Load the state of an interrupted full scan, or None when there is nothing to resume."""
+    if not os.path.exists(SCAN_STATE_FILE):
+        return None
+    try:
+        with open(SCAN_STATE_FILE, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        started = date.fromisoformat(state['started_at'])
+    except (OSError, json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+        print(f"Warning: Failed to load {SCAN_STATE_FILE}: {e}")
+        return None
+    if (date.today() - started).days > max_age_days:
+        print(f"Discarding scan state from {started.isoformat()} (older than {max_age_days} days)")
+        return None
+    return state
 
-        year += 2
-        time.sleep(2)
 
-    print(f"\n=== COMPLETE: {len(catalog)} anime in catalog ===")
-    save_catalog(catalog)
+def save_scan_state(state):
+    """Atomically replace the full-scan state file."""
+    os.makedirs(os.path.dirname(SCAN_STATE_FILE), exist_ok=True)
+    tmp_path = f"{SCAN_STATE_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, SCAN_STATE_FILE)
 
 
-def run_incremental():
-    """Incremental mode: fetch previous + current month and merge."""
+def clear_scan_state():
+    if os.path.exists(SCAN_STATE_FILE):
+        os.remove(SCAN_STATE_FILE)
+
+
+def scan_request(query, variables):
+    """AniList request used by the full scan (longer timeout, more retries)."""
+    return anilist_request(query, variables, retry_count=5, timeout=20)
+
+
+def run_full_scan(workers=SCAN_WORKERS, restart=False):
+    """
+    Full historical scan from 1990 to today (for local initial build).
+
+    Cheap probes size every year first, then the date ranges are bisected or
+    merged so each window fits under the page cap in as few pages as possible.
+    All (window, page) items are planned up front and run across a bounded
+    worker pool paced by the shared AniList rate limiter. Every fetched page is
+    appended to CATALOG_LOG_FILE, which is folded into the catalog snapshot when
+    it grows past CATALOG_LOG_COMPACT_BYTES and when the scan stops.
+
+    The plan, the finished windows and the pages fetched for unfinished windows
+    are kept in SCAN_STATE_FILE, so a re-run skips finished windows and fetches
+    only the pages that are still missing. `restart` discards it.
+
+    Each fully fetched window is fingerprinted in SCAN_MANIFEST_FILE; a new
+    scan skips windows whose fingerprint still matches (see unchanged_windows).
+
+    Returns the process exit status: EXIT_INTERRUPTED after Ctrl+C, else 0.
+    """
+    print("=== FULL HISTORICAL SCAN ===")
+    print("Fetches all TV/ONA anime from 1990 to present in adaptive date windows.")
+    print("Progress is saved after every page — re-run to resume if interrupted.\n")
+
+    catalog = load_catalog()
+    manifest = load_scan_manifest()
+    state = None if restart else load_scan_state()
+    if state:
+        planned = [tuple(window) for window in state['windows']]
+        window_ids = window_catalog_ids(catalog, [(start, end) for start, end, _ in planned])
+        fetched_pages = sum(len(pages) for pages in state['pages'].values())
+        print(f"Resuming scan started {state['started_at']}: {len(state['completed'])}/{len(planned)} "
+              f"windows complete, {fetched_pages} pages of unfinished windows already fetched")
+    else:
+        try:
+            planned, probe_requests = plan_scan_windows(date.today(), scan_request)
+        except (KeyboardInterrupt, ScanAborted) as e:
+            print(f"{str(e) or 'Interrupted'}. Catalog left unchanged.")
+            return EXIT_INTERRUPTED if isinstance(e, KeyboardInterrupt) else 0
+        print(f"Planned {len(planned)} windows using {probe_requests} probe requests")
+        try:
+            fingerprints, fingerprint_requests = probe_window_fingerprints(
+                [(start, end) for start, end, _ in planned], scan_request
+            )
+        except (KeyboardInterrupt, ScanAborted) as e:
+            print(f"{str(e) or 'Interrupted'}. Catalog left unchanged.")
+            return EXIT_INTERRUPTED if isinstance(e, KeyboardInterrupt) else 0
+        window_ids = window_catalog_ids(catalog, [(start, end) for start, end, _ in planned])
+        unchanged = unchanged_windows(planned, fingerprints, manifest, window_ids, date.today())
+        print(f"Fingerprinted windows using {fingerprint_requests} requests; "
+              f"{len(unchanged)}/{len(planned)} unchanged since their last fetch and skipped")
+        state = {
+            'started_at': date.today().isoformat(),
+            'windows': [list(window) for window in planned],
+            'fingerprints': {
+                date_range_query(start, end).name: fingerprint
+                for (start, end), fingerprint in fingerprints.items()
+            },
+            'planned_pages': {},
+            'completed': sorted(unchanged),
+            'pages': {},
+        }
+        save_scan_state(state)
+
+    completed = set(state['completed'])
+    windows = [
+        window for window in (date_range_query(start, end) for start, end, _ in planned)
+        if window.name not in completed
+    ]
+    bounds = {date_range_query(start, end).name: (start, end, total) for start, end, total in planned}
+    planned_pages = {
+        window.name: state['planned_pages'].get(window.name)
+        or min(MAX_PAGES_PER_WINDOW, max(1, math.ceil(bounds[window.name][2] / PER_PAGE)))
+        for window in windows
+    }
+    # Pages fetched before a restart are already in the catalog (via the log)
+    window_pages = {window.name: set(state['pages'].get(window.name, [])) for window in windows}
+    window_fetched = {window.name: 0 for window in windows}
+    window_requests = {window.name: set() for window in windows}
+    outstanding = {window.name: 0 for window in windows}
+    futures = {}
+    committed = 0
+    incomplete = 0
+    executor = ThreadPoolExecutor(max_workers=workers)
+
+    def submit(items):
+        for i in range(0, len(items), ALIASES_PER_REQUEST):
+            batch = items[i:i + ALIASES_PER_REQUEST]
+            future = executor.submit(fetch_batch, batch, CATALOG_FIELDS, PER_PAGE, scan_request)
+            futures[future] = batch
+            for window, _ in batch:
+                outstanding[window.name] += 1
+                window_requests[window.name].add(future)
+
+    def handle_page(window, page, page_data):
+        media = page_data.get('media') or []
+        results = [process_anime(a) for a in media]
+        append_to_catalog_log(results)
+        catalog.upsert_many(results)
+        window_pages[window.name].add(page)
+        window_fetched[window.name] += len(results)
+        # A title whose start date moved stays listed under its old window too,
+        # which only makes that window look changed on the next scan
+        start, end, _ = bounds[window.name]
+        window_ids[(start, end)].update(
+            anime['id'] for anime in results
+            if anime['start_date'] and start <= start_date_int(anime['start_date']) <= end
+        )
+        state['pages'].setdefault(window.name, []).append(page)
+        print(f"  [{window.label}] page {page} — {len(media)} anime")
+
+        # The total can drift between probe and fetch; follow hasNextPage past the plan.
+        if (page == planned_pages[window.name] and page < MAX_PAGES_PER_WINDOW
+                and media and page_data['pageInfo']['hasNextPage']):
+            planned_pages[window.name] = page + 1
+            state['planned_pages'][window.name] = page + 1
+            submit([(window, page + 1)])
+
+    def commit_ready_windows():
+        # Record finished windows in chronological order
+        nonlocal committed, incomplete
+        while committed < len(windows) and outstanding[windows[committed].name] == 0:
+            window = windows[committed]
+            pages = window_pages.pop(window.name)
+            print(f"\n[{window.label}] complete: {window_fetched.pop(window.name)} anime fetched this window "
+                  f"({len(pages)} pages, {len(window_requests.pop(window.name))} requests)")
+
+            missing = set(range(1, planned_pages[window.name] + 1)) - set(pages)
+            if missing:
+                # Keep the fetched pages so the next run only requests the failed ones
+                print(f"  {len(missing)} pages failed; they will be retried on the next run")
+                incomplete += 1
+            else:
+                state['completed'].append(window.name)
+                state['pages'].pop(window.name, None)
+                state['planned_pages'].pop(window.name, None)
+                fingerprint = state.get('fingerprints', {}).get(window.name)
+                if fingerprint:
+                    start, end, _ = bounds[window.name]
+                    manifest[window.name] = {
+                        **fingerprint,
+                        'id_hash': window_id_hash(window_ids[(start, end)]),
+                        'fetched_at': date.today().isoformat(),
+                    }
+                    save_scan_manifest(manifest)
+            committed += 1
+
+    try:
+        submit([
+            (window, page)
+            for window in windows
+            for page in range(1, planned_pages[window.name] + 1)
+            if page not in window_pages[window.name]
+        ])
+        commit_ready_windows()
+        save_scan_state(state)
+
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch = futures.pop(future)
+                data = future.result()
+
+                if data and data.get('service_unavailable'):
+                    raise ScanAborted("AniList is temporarily unavailable")
+                if not data or not data.get('data'):
+                    pages = ', '.join(f"{window.label} p{page}" for window, page in batch)
+                    print(f"  Request failed for {pages}, continuing without them...")
+                else:
+                    for window, page in batch:
+                        page_data = data['data'].get(window.alias(page))
+                        if page_data:
+                            handle_page(window, page, page_data)
+
+                for window, _ in batch:
+                    outstanding[window.name] -= 1
+
+            commit_ready_windows()
+            save_scan_state(state)
+            if catalog_log_size() > CATALOG_LOG_COMPACT_BYTES:
+                save_catalog(catalog)
+
+    except (KeyboardInterrupt, ScanAborted) as e:
+        reason = str(e) or "Interrupted"
+        print(f"\n{reason}. Cancelling pending pages; every fetched page is saved "
+              f"and {SCAN_STATE_FILE} records where to resume.")
+        executor.shutdown(wait=False, cancel_futures=True)
+        save_scan_state(state)
+        if catalog_needs_save(catalog):
+            save_catalog(catalog)
+        else:
+            print(f"No new anime fetched; {CATALOG_FILE} left unchanged.")
+        return EXIT_INTERRUPTED if isinstance(e, KeyboardInterrupt) else 0
+
+    executor.shutdown(wait=True)
+    if incomplete:
+        print(f"\n=== {incomplete} windows still have missing pages; re-run --full to fetch them ===")
+    else:
+        clear_scan_state()
+        print(f"\n=== COMPLETE: {len(catalog)} anime in catalog ===")
+    if catalog_needs_save(catalog):
+        save_catalog(catalog)
+    return 0
+
+
+def run_incremental(refresh_budget=REFRESH_BUDGET):
+    """Incremental mode: fetch previous + current month, refresh stale entries and merge."""
     print("=== INCREMENTAL UPDATE ===")
     today = date.today()
     catalog = load_catalog()
@@ -301,19 +845,173 @@ def run_incremental():
     print(f"\nFetching {prev_year}-{prev_month:02d}...")
     prev_anime = fetch_by_date_range(prev_start, prev_end, label=f"{prev_year}-{prev_month:02d}")
     if prev_anime:
-        catalog = merge_into_catalog(catalog, prev_anime)
-
-    time.sleep(1)
+        merge_into_catalog(catalog, prev_anime)
 
     print(f"\nFetching {today.year}-{today.month:02d}...")
     curr_anime = fetch_by_date_range(current_start, current_end, label=f"{today.year}-{today.month:02d}")
     if curr_anime:
-        catalog = merge_into_catalog(catalog, curr_anime)
+        merge_into_catalog(catalog, curr_anime)
+
+    refresh_stale_entries(catalog, refresh_budget)
 
-    save_catalog(catalog)
+    if catalog.dirty:
+        save_catalog(catalog)
+    else:
+        print("Catalog unchanged, not rewriting it.")
     print("=== INCREMENTAL UPDATE COMPLETE ===")
 
 
+def load_sync_state():
+    """Load the persisted delta-sync state (high-water mark etc.)."""
+    if not os.path.exists(SYNC_STATE_FILE):
+        return {}
+    try:
+        with open(SYNC_STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Warning: Failed to load {SYNC_STATE_FILE}: {e}")
+        return {}
+
+
+def save_sync_state(state):
+    os.makedirs('data', exist_ok=True)
+    with open(SYNC_STATE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+
+
+def delta_scope(today, first_year=FULL_SCAN_FIRST_YEAR):
+    """startDate bounds (exclusive) matching the full scan: first_year through the end of this year."""
+    return {'startDate': first_year * 10000 - 1, 'endDate': fuzzy_date(today.year, 12, 31) + 1}
+
+
+def collect_delta_changes(high_water, scope, request=make_request):
+    """
+    Page edits newest first until one is older than `high_water`.
+
+    Returns (changed, newest updatedAt, complete, pages). `complete` is False
+    when a request failed or the page cap was hit before reaching the
+    high-water mark, so the caller must keep the previous mark: moving it to
+    `newest` would skip the edits that were never paged.
+    """
+    changed = []
+    newest = high_water
+    page = 1
+
+    while True:
+        data = request(QUERY_BY_UPDATED, {'page': page, 'perPage': PER_PAGE, **scope})
+        if not data or 'data' not in data:
+            print(f"  Request failed on page {page}; keeping the previous high-water mark.")
+            return changed, newest, False, page
+
+        page_data = data['data']['Page']
+        reached_high_water = False
+        for raw in page_data['media']:
+            updated_at = raw.get('updatedAt') or 0
+            if updated_at < high_water:
+                reached_high_water = True
+                break
+            newest = max(newest, updated_at)
+            changed.append(process_anime(raw))
+
+        print(f"  page {page} — {len(changed)} changed so far")
+        if reached_high_water or not page_data['pageInfo']['hasNextPage']:
+            return changed, newest, True, page
+        if page >= MAX_PAGES_PER_WINDOW:
+            print(f"  Stopped after {page} pages without reaching the high-water mark; keeping the "
+                  "previous mark (consider running --full).")
+            return changed, newest, False, page
+        page += 1
+
+
+def run_delta():
+    """
+    Delta mode: upsert every catalog title AniList has edited since the last run.
+
+    Pages media sorted by UPDATED_AT_DESC and stops at the first record older
+    than the persisted high-water mark. updatedAt tracks edits (status, episode
+    counts, dates, titles, images); popularity and score drift does not bump it.
+    The date scope is the full scan's, so future-year titles are left out too.
+    """
+    print("=== DELTA SYNC ===")
+    state = load_sync_state()
+    high_water = state.get('updated_at_high_water')
+    if high_water is None:
+        high_water = int((datetime.now() - timedelta(days=DELTA_DEFAULT_LOOKBACK_DAYS)).timestamp())
+        print(f"No high-water mark yet, syncing edits from the last {DELTA_DEFAULT_LOOKBACK_DAYS} days.")
+    else:
+        print(f"Syncing edits since {datetime.fromtimestamp(high_water).isoformat()}")
+
+    catalog = load_catalog()
+    changed, newest, complete, pages = collect_delta_changes(high_water, delta_scope(date.today()))
+
+    if changed:
+        merge_into_catalog(catalog, changed)
+    if catalog_needs_save(catalog):
+        save_catalog(catalog)
+
+    if complete:
+        state['updated_at_high_water'] = newest
+        state['last_delta_sync'] = datetime.now().isoformat()
+        save_sync_state(state)
+    print(f"=== DELTA SYNC COMPLETE: {len(changed)} titles in {pages} pages ===")
+
+
+def refresh_priority(anime, today):
+    """Rank an entry by how stale it is and how fast its popularity/score move."""
+    volatility = STATUS_VOLATILITY.get(anime.get('status'), 0.05)
+    fetched_at = anime.get('fetched_at')
+    try:
+        staleness = (today - date.fromisoformat(fetched_at)).days
+    except (TypeError, ValueError):
+        staleness = UNKNOWN_STALENESS_DAYS
+    if staleness <= 0:
+        return 0.0
+    return volatility * staleness * math.log10((anime.get('popularity') or 0) + 10)
+
+
+def select_refresh_candidates(catalog, today, limit):
+    """Ids of the `limit` highest-priority entries that are not already fresh."""
+    ranked = sorted(
+        ((refresh_priority(anime, today), anime['id']) for anime in catalog),
+        reverse=True
+    )
+    return [media_id for priority, media_id in ranked[:limit] if priority > 0]
+
+
+def refresh_stale_entries(catalog, budget=REFRESH_BUDGET):
+    """
+    Spend up to `budget` requests re-fetching the stalest volatile entries,
+    upserting them into the CatalogStore in place.
+
+    Each request carries ALIASES_PER_REQUEST id_in batches of 50 ids, so
+    freshness scales with the budget rather than with the catalog size. The
+    budget caps the batched requests actually sent, split-retries of failed
+    batches included; the HTTP layer's own 429/5xx retries of one request are
+    not counted separately.
+    """
+    if budget <= 0 or not catalog:
+        return
+
+    ids = select_refresh_candidates(catalog, date.today(), budget * ALIASES_PER_REQUEST * ID_BATCH_SIZE)
+    if not ids:
+        print("\nRefresh: every catalog entry is already fresh.")
+        return
+
+    print(f"\nRefreshing {len(ids)} stale catalog entries (budget {budget} requests)...")
+    media_by_id = fetch_media_by_ids(
+        ids,
+        CATALOG_FIELDS,
+        max_aliases=ALIASES_PER_REQUEST,
+        request=scan_request,
+        name_prefix='refresh',
+        max_requests=budget
+    )
+    refreshed = [process_anime(raw) for raw in (media_by_id or {}).values()]
+    print(f"  Refreshed {len(refreshed)} entries")
+    if refreshed:
+        merge_into_catalog(catalog, refreshed)
+
+
 def main():
     parser = argparse.ArgumentParser(description='Fetch all anime catalog from AniList')
     parser.add_argument(
@@ -321,12 +1019,53 @@ def main():
         action='store_true',
         help='Run full historical scan (use locally to build initial catalog)'
     )
+    parser.add_argument(
+        '--restart',
+        action='store_true',
+        help='With --full, discard the progress of an interrupted scan and plan it again'
+    )
+    parser.add_argument(
+        '--delta',
+        action='store_true',
+        help='Upsert titles AniList edited since the last --delta run'
+    )
+    parser.add_argument(
+        '--refresh-budget',
+        type=int,
+        default=REFRESH_BUDGET,
+        help='Requests the incremental run may spend refreshing stale RELEASING/upcoming entries (0 disables)'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=SCAN_WORKERS,
+        help='Concurrent request workers for --full (the rate limiter still sets the pace)'
+    )
+    parser.add_argument(
+        '--cache',
+        choices=response_cache.CACHE_MODES,
+        default='off',
+        help='Reuse AniList responses cached on disk (read), re-fetch and overwrite them (refresh), or skip the cache (off)'
+    )
     args = parser.parse_args()
+    response_cache.set_mode(args.cache)
 
+    status = 0
     if args.full:
-        run_full_scan()
+        status = run_full_scan(workers=args.workers, restart=args.restart)
+    elif args.delta:
+        run_delta()
     else:
-        run_incremental()
+        run_incremental(refresh_budget=args.refresh_budget)
+
+    print(anilist_limiter.summary())
+    if active_cassette is not None:
+        print(active_cassette.summary())
+    if args.cache != 'off':
+        response_cache.evict()
+        print(response_cache.summary())
+    if status:
+        sys.exit(status)
 
 
 if __name__ == '__main__':
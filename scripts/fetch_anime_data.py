@@ -1,16 +1,125 @@
 #!/usr/bin/env python3
+import argparse
 import json
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import os
-import time
+import threading
 from zoneinfo import ZoneInfo
 
+from anilist_batch import MediaStore, MediaStream, PagedQuery, fetch_media_by_ids
+import anime_db
+from api_client import active_cassette, anilist_limiter, anilist_request
+from change_probe import fetch_with_change_probe
+from fetch_mal_scores import (
+    enrich_with_mal_scores,
+    fetch_seasonal_scores,
+    load_score_cache,
+    needs_bulk_refresh,
+    saved_mal_ids,
+)
+import response_cache
+import run_archive
+
 # Configuration
-ANILIST_API_URL = "https://graphql.anilist.co"
-CALENDAR_HISTORY_FILE = "data/calendar_history.json"
+DATA_DIR = "data"
+CALENDAR_HISTORY_FILE = os.path.join(DATA_DIR, "calendar_history.json")
+# Where --reprocess writes unless --overwrite is given
+REPROCESS_DIR = os.path.join(".cache", "reprocessed")
 CALENDAR_HISTORY_DAYS = 30
 
+# Media fields requested for the airing/finished/upcoming home page queries
+CURRENT_MEDIA_FIELDS = '''
+        id
+        idMal
+        title { romaji english }
+        averageScore
+        episodes
+        nextAiringEpisode { episode airingAt }
+        coverImage { extraLarge large medium }
+        trailer { id site thumbnail }
+        siteUrl
+        startDate { year month day }
+        endDate { year month day }
+        externalLinks { site url icon }
+        genres
+        isAdult
+        duration
+        format
+        popularity
+        status
+'''
+
+# Media fields requested for the next-season preview query
+UPCOMING_MEDIA_FIELDS = '''
+        id
+        idMal
+        title { romaji english }
+        averageScore
+        episodes
+        coverImage { extraLarge large medium }
+        trailer { id site thumbnail }
+        siteUrl
+        startDate { year month day }
+        season
+        seasonYear
+        genres
+        isAdult
+        duration
+        format
+        popularity
+        favourites
+        studios { nodes { name } }
+'''
+
+# Fields that change without bumping AniList's updatedAt. They are re-read on
+# every run by the change probe, while the rest comes from the last snapshot
+# unless updatedAt moved.
+CURRENT_VOLATILE_FIELDS = 'popularity averageScore nextAiringEpisode { episode airingAt }'
+UPCOMING_VOLATILE_FIELDS = 'popularity averageScore favourites'
+
+# Worker threads per fetch; the shared rate limiter still caps the request rate
+FETCH_WORKERS = 3
+
+# Relevance rules. process_anime_data/process_upcoming_anime_data apply them to
+# every record, and media_filter_args() pushes the parts AniList can express
+# into the queries so we stop paging through titles we would discard anyway.
+DEFAULT_POPULARITY_THRESHOLD = 3000
+# Chinese web anime have smaller global counts
+FORMAT_POPULARITY_THRESHOLDS = {'ONA': 2000}
+UPCOMING_POPULARITY_THRESHOLD = 1000
+MIN_EPISODE_DURATION = 10
+START_DATE_CUTOFF_DAYS = 365
+
+# Kids anime blacklist - titles that are typically for children
+KIDS_ANIME_KEYWORDS = [
+    'Maebashi Witches',
+    'Shirobuta Kizoku',
+    'Mashin Souzouden Wataru',
+    'Crayon Shin-chan',
+    'Doraemon',
+    'Pokemon',
+    'Pocket Monsters',
+    'Beyblade',
+    'Yu-Gi-Oh',
+    'Digimon',
+    'PreCure',
+    'Pretty Cure',
+    'Aikatsu',
+    'PriPara',
+    'Yokai Watch',
+    'Hamtaro',
+    'Anpanman'
+]
+
+# Exception list for long-running anime we want to keep
+LONG_RUNNING_EXCEPTIONS = [
+    'ONE PIECE',
+    'Naruto',
+    'Detective Conan',
+    'Boruto'
+]
+
 
 def load_json_file(path, default):
     """Load a JSON file if it exists, otherwise return the provided default."""
@@ -73,6 +182,42 @@ def parse_date(date_str):
         return None
 
 
+def popularity_threshold(anime_format):
+    """Minimum AniList popularity for a title of the given format."""
+    return FORMAT_POPULARITY_THRESHOLDS.get(anime_format, DEFAULT_POPULARITY_THRESHOLD)
+
+
+def start_year_cutoff(now=None):
+    """Titles that started before this year are skipped unless they are exceptions."""
+    return ((now or datetime.now()) - timedelta(days=START_DATE_CUTOFF_DAYS)).year
+
+
+def media_filter_args(min_popularity):
+    """
+    Compile the relevance rules into AniList media() filter arguments.
+
+    Only rules AniList can apply losslessly are pushed down: the popularity floor
+    (the lowest one across formats) and isAdult. Episode duration stays
+    client-side, because duration_greater would also drop shows whose duration
+    AniList has not filled in yet. The start-year cutoff stays client-side too:
+    startDate_greater drops RELEASING titles with no start year, which
+    process_anime_entry keeps, and the long-running exceptions to the cutoff are
+    matched by title substring, which AniList's fuzzy `search` cannot reproduce.
+    """
+    return f'popularity_greater: {min_popularity - 1}, isAdult: false'
+
+
+def title_matches(anime, keywords):
+    """True when the romaji or English title contains any keyword (case-insensitive)."""
+    titles = [anime['title']['romaji'], anime['title'].get('english') or '']
+    return any(keyword.lower() in title.lower() for keyword in keywords for title in titles if title)
+
+
+def to_fuzzy_date_int(value):
+    """Convert a date/datetime to AniList's FuzzyDateInt format (YYYYMMDD)."""
+    return int(f"{value.year}{value.month:02d}{value.day:02d}")
+
+
 def format_fuzzy_date(fuzzy_date):
     """Convert an AniList fuzzy date object to YYYY-MM-DD when possible."""
     if not fuzzy_date or not fuzzy_date.get('year'):
@@ -104,7 +249,7 @@ def manual_entry_is_expired(entry, today_date, recent_days=14):
     return max(dated_fields) < today - timedelta(days=recent_days)
 
 
-def fetch_manual_anime_data(manual_entries):
+def fetch_manual_anime_data(manual_entries, archive=None):
     """Fetch current AniList records for manual entries so stale overrides age out."""
     ids = sorted({
         entry.get('id')
@@ -114,43 +259,18 @@ def fetch_manual_anime_data(manual_entries):
     if not ids:
         return None
 
-    query = '''
-    query ($ids: [Int]) {
-        Page(page: 1, perPage: 50) {
-            media(id_in: $ids, type: ANIME) {
-                id
-                idMal
-                title { romaji english }
-                averageScore
-                episodes
-                nextAiringEpisode { episode airingAt }
-                coverImage { extraLarge large medium }
-                trailer { id site thumbnail }
-                siteUrl
-                startDate { year month day }
-                endDate { year month day }
-                externalLinks { site url icon }
-                genres
-                isAdult
-                duration
-                format
-                popularity
-                status
-            }
-        }
-    }
-    '''
-
-    data = make_anilist_request(query, {'ids': ids})
-    if data and data.get('service_unavailable'):
-        return None
-    if not data or 'data' not in data:
+    media_by_id = fetch_media_by_ids(ids, CURRENT_MEDIA_FIELDS, name_prefix='manual')
+    if media_by_id is None:
         return None
 
-    return {'data': {'Page': {'media': data['data']['Page']['media']}}}
+    media = [media_by_id[media_id] for media_id in ids if media_id in media_by_id]
+    if archive is not None:
+        for anime in media:
+            archive.record('manual', anime)
+    return {'data': {'Page': {'media': media}}}
 
 
-def refreshed_manual_entries(manual_entries, existing_ids, today_date):
+def refreshed_manual_entries(manual_entries, existing_ids, today_date, fetch_live=fetch_manual_anime_data, now=None):
     """Refresh manual entries from AniList and return only entries still relevant."""
     pending_entries = [
         normalize_anime_entry(entry)
@@ -160,7 +280,7 @@ def refreshed_manual_entries(manual_entries, existing_ids, today_date):
     if not pending_entries:
         return []
 
-    live_data = fetch_manual_anime_data(pending_entries)
+    live_data = fetch_live(pending_entries)
     if not live_data:
         return [
             entry for entry in pending_entries
@@ -173,7 +293,7 @@ def refreshed_manual_entries(manual_entries, existing_ids, today_date):
     }
     processed_by_id = {
         anime.get('id'): anime
-        for anime in process_anime_data(live_data)
+        for anime in process_anime_data(live_data, now)
     }
 
     refreshed_entries = []
@@ -201,41 +321,11 @@ def refreshed_manual_entries(manual_entries, existing_ids, today_date):
 
 def make_anilist_request(query, variables, retry_count=3):
     """Makes a request to the AniList API with retries for transient errors."""
-    for attempt in range(retry_count):
-        try:
-            response = requests.post(ANILIST_API_URL, json={'query': query, 'variables': variables}, timeout=15)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as e:
-            response = e.response
-            if response is not None and response.status_code == 403:
-                try:
-                    error_payload = response.json()
-                except ValueError:
-                    error_payload = {'errors': [{'message': response.text}]}
-
-                errors = error_payload.get('errors') or []
-                if any('temporarily disabled' in (err.get('message') or '').lower() for err in errors):
-                    print("AniList API is temporarily unavailable. Preserving the existing dataset.")
-                    return {'service_unavailable': True, 'errors': errors}
-
-            # Retry on 500-level errors or rate limiting
-            if response.status_code >= 500 or response.status_code == 429:
-                print(f"API Error ({response.status_code}). Retrying in {2**attempt}s...")
-                time.sleep(2**attempt)
-            else:
-                print(f"HTTP Error: {e}")
-                return None
-        except requests.RequestException as e:
-            print(f"Request Error: {e}. Retrying in {2**attempt}s...")
-            time.sleep(2**attempt)
-    
-    print(f"Failed to fetch from AniList after {retry_count} attempts.")
-    return None
+    return anilist_request(query, variables, retry_count=retry_count)
 
-def get_current_season():
+def get_current_season(now=None):
     """Get current season based on current date"""
-    current_month = datetime.now().month
+    current_month = (now or datetime.now()).month
     if current_month in [1, 2, 3]:
         return "WINTER"
     elif current_month in [4, 5, 6]:
@@ -245,10 +335,10 @@ def get_current_season():
     else:  # 10, 11, 12
         return "FALL"
 
-def get_next_season():
+def get_next_season(now=None):
     """Get next season and year"""
-    current_season = get_current_season()
-    current_year = datetime.now().year
+    current_season = get_current_season(now)
+    current_year = (now or datetime.now()).year
     
     season_map = {
         "WINTER": ("SPRING", current_year),
@@ -290,721 +380,535 @@ def is_within_season_threshold():
     days_until_next_season = (next_season_start - datetime.now()).days
     return days_until_next_season <= 21
 
-def fetch_current_anime():
-    """Fetch currently airing, recently finished, and upcoming current-season anime from AniList API"""
-    # Query for RELEASING anime
-    query_releasing = '''
-    query ($page: Int, $perPage: Int) {
-        Page(page: $page, perPage: $perPage) {
-            pageInfo {
-                hasNextPage
-                currentPage
-            }
-            media(status: RELEASING, type: ANIME, format_in: [TV, ONA, TV_SHORT], sort: [POPULARITY_DESC]) {
-                id
-                idMal
-                title { romaji english }
-                averageScore
-                episodes
-                nextAiringEpisode { episode airingAt }
-                coverImage { extraLarge large medium }
-                trailer { id site thumbnail }
-                siteUrl
-                startDate { year month day }
-                endDate { year month day }
-                externalLinks { site url icon }
-                genres
-                isAdult
-                duration
-                format
-                popularity
-                status
-            }
-        }
-    }
-    '''
-    
-    # Query for recently FINISHED anime (within last 14 days)
-    query_finished = '''
-    query ($page: Int, $perPage: Int, $startDate: FuzzyDateInt, $endDate: FuzzyDateInt) {
-        Page(page: $page, perPage: $perPage) {
-            pageInfo { hasNextPage currentPage }
-            media(status: FINISHED, type: ANIME, format_in: [TV, ONA, TV_SHORT], sort: [POPULARITY_DESC], endDate_greater: $startDate, endDate_lesser: $endDate) {
-                id
-                idMal
-                title { romaji english }
-                averageScore
-                episodes
-                nextAiringEpisode { episode airingAt }
-                coverImage { extraLarge large medium }
-                trailer { id site thumbnail }
-                siteUrl
-                startDate { year month day }
-                endDate { year month day }
-                externalLinks { site url icon }
-                genres
-                isAdult
-                duration
-                format
-                popularity
-                status
-            }
-        }
-    }
-    '''
-    
-    # Query for NOT_YET_RELEASED anime in the CURRENT season
-    query_upcoming_current_season = '''
-    query ($page: Int, $perPage: Int, $season: MediaSeason, $seasonYear: Int) {
-        Page(page: $page, perPage: $perPage) {
-            pageInfo { hasNextPage currentPage }
-            media(status: NOT_YET_RELEASED, type: ANIME, format_in: [TV, ONA, TV_SHORT], sort: [POPULARITY_DESC], season: $season, seasonYear: $seasonYear) {
-                id
-                idMal
-                title { romaji english }
-                averageScore
-                episodes
-                nextAiringEpisode { episode airingAt }
-                coverImage { extraLarge large medium }
-                trailer { id site thumbnail }
-                siteUrl
-                startDate { year month day }
-                endDate { year month day }
-                externalLinks { site url icon }
-                genres
-                isAdult
-                duration
-                format
-                popularity
-                status
-            }
-        }
-    }
-    '''
-    
-    all_anime = []
-    any_successful_request = False
-    
+def fetch_current_anime(stop_event=None, max_workers=FETCH_WORKERS, archive=None, now=None):
+    """
+    Fetch and process currently airing, recently finished, and upcoming
+    current-season anime from AniList API. Returns the processed list, or None
+    when AniList live data is unavailable.
+    """
+    today = now or datetime.now()
+    week_ago = today - timedelta(days=14)
+    future_date = today + timedelta(days=3)  # Extend to 3 days in the future to handle timezone issues
+    yesterday = today - timedelta(days=1)  # Also check yesterday to handle timezone edge cases
+    min_popularity = min([DEFAULT_POPULARITY_THRESHOLD, *FORMAT_POPULARITY_THRESHOLDS.values()])
+    type_args = 'type: ANIME, format_in: [TV, ONA, TV_SHORT], sort: [POPULARITY_DESC]'
+    base_args = f'{type_args}, {media_filter_args(min_popularity)}'
+    finished_args = f'status: FINISHED, {base_args}, endDate_greater: $startDate, endDate_lesser: $endDate'
+    date_types = {'startDate': 'FuzzyDateInt', 'endDate': 'FuzzyDateInt'}
+
+    queries = [
+        # 1. All RELEASING anime; the start-year cutoff and its long-running
+        #    exceptions are applied by process_anime_entry
+        PagedQuery('releasing', f'status: RELEASING, {base_args}', label='airing anime', cache_family='current'),
+        # 2. Recently FINISHED anime (within last 14 days)
+        PagedQuery(
+            'finished',
+            finished_args,
+            variables={'startDate': to_fuzzy_date_int(week_ago), 'endDate': to_fuzzy_date_int(today)},
+            variable_types=date_types,
+            label='finished anime',
+            cache_family='current'
+        ),
+        # 3. FINISHED anime that end today or in the near future
+        #    (to handle AniList's premature FINISHED status and timezone issues)
+        PagedQuery(
+            'future_finished',
+            finished_args,
+            variables={'startDate': to_fuzzy_date_int(yesterday), 'endDate': to_fuzzy_date_int(future_date)},
+            variable_types=date_types,
+            label='future-finished anime',
+            cache_family='current'
+        ),
+        # 4. NOT_YET_RELEASED anime in the CURRENT season
+        PagedQuery(
+            'upcoming_current',
+            f'status: NOT_YET_RELEASED, {base_args}, season: $season, seasonYear: $seasonYear',
+            variables={'season': get_current_season(now), 'seasonYear': today.year},
+            variable_types={'season': 'MediaSeason', 'seasonYear': 'Int'},
+            label='upcoming current-season anime',
+            cache_family='current'
+        ),
+    ]
+
     try:
-        # 1. Fetch all RELEASING anime
-        print("Fetching currently airing anime...")
-        page = 1
-        per_page = 50
-        
-        while True:
-            variables = {'page': page, 'perPage': per_page}
-            data = make_anilist_request(query_releasing, variables)
-            if data and data.get('service_unavailable'):
-                return None
-            if not data or 'data' not in data: break
-            any_successful_request = True
-            page_data = data['data']['Page']
-            all_anime.extend(page_data['media'])
-            if not page_data['pageInfo']['hasNextPage']: break
-            page += 1
-            print(f"Fetched page {page-1}, total airing anime so far: {len(all_anime)}")
-        
-        # 2. Fetch recently FINISHED anime
-        print("Fetching recently finished anime...")
-        today = datetime.now()
-        week_ago = today - timedelta(days=14)
-        page = 1
-        start_fuzzy = int(f"{week_ago.year}{week_ago.month:02d}{week_ago.day:02d}")
-        end_fuzzy = int(f"{today.year}{today.month:02d}{today.day:02d}")
-        
-        while True:
-            variables = {'page': page, 'perPage': per_page, 'startDate': start_fuzzy, 'endDate': end_fuzzy}
-            data = make_anilist_request(query_finished, variables)
-            if data and data.get('service_unavailable'):
-                return None
-            if not data or 'data' not in data: break
-            any_successful_request = True
-            page_data = data['data']['Page']
-            finished_anime = page_data['media']
-            all_anime.extend(finished_anime)
-            if not page_data['pageInfo']['hasNextPage']: break
-            page += 1
-            print(f"Fetched page {page-1} of finished anime, added {len(finished_anime)} anime")
-
-        # 3. Fetch FINISHED anime that end today or in the near future (to handle AniList's premature FINISHED status and timezone issues)
-        print("Fetching FINISHED anime with end dates today or in the future...")
-        page = 1
-        future_date = today + timedelta(days=3)  # Extend to 3 days in the future to handle timezone issues
-        future_end_fuzzy = int(f"{future_date.year}{future_date.month:02d}{future_date.day:02d}")
-        yesterday = today - timedelta(days=1)  # Also check yesterday to handle timezone edge cases
-        yesterday_fuzzy = int(f"{yesterday.year}{yesterday.month:02d}{yesterday.day:02d}")
-
-        while True:
-            variables = {'page': page, 'perPage': per_page, 'startDate': yesterday_fuzzy, 'endDate': future_end_fuzzy}
-            data = make_anilist_request(query_finished, variables)
-            if data and data.get('service_unavailable'):
-                return None
-            if not data or 'data' not in data: break
-            any_successful_request = True
-            page_data = data['data']['Page']
-            future_finished_anime = page_data['media']
-            all_anime.extend(future_finished_anime)
-            if not page_data['pageInfo']['hasNextPage']: break
-            page += 1
-            print(f"Fetched page {page-1} of future-finished anime, added {len(future_finished_anime)} anime")
-
-        # 4. Fetch upcoming anime for the CURRENT season
-        print("Fetching upcoming anime for the current season...")
-        page = 1
-        current_season = get_current_season()
-        current_year = today.year
-
-        while True:
-            variables = {'page': page, 'perPage': per_page, 'season': current_season, 'seasonYear': current_year}
-            data = make_anilist_request(query_upcoming_current_season, variables)
-            if data and data.get('service_unavailable'):
-                return None
-            if not data or 'data' not in data: break
-            any_successful_request = True
-            page_data = data['data']['Page']
-            upcoming_current_anime = page_data['media']
-            all_anime.extend(upcoming_current_anime)
-            if not page_data['pageInfo']['hasNextPage']: break
-            page += 1
-            print(f"Fetched page {page-1} of upcoming current-season anime, added {len(upcoming_current_anime)} anime")
-
-        if not any_successful_request:
+        print("Fetching airing, finished, and upcoming current-season anime...")
+        # Titles are processed as soon as they are complete, overlapping with the
+        # remaining network waits. The finished windows overlap the other
+        # queries, so repeated ids are skipped.
+        store = MediaStore(keep_media=False)
+        stream = MediaStream(lambda on_media: fetch_with_change_probe(
+            queries,
+            CURRENT_MEDIA_FIELDS,
+            CURRENT_VOLATILE_FIELDS,
+            'current',
+            max_workers=max_workers,
+            stop_event=stop_event,
+            on_media=on_media
+        ))
+
+        def unique_media():
+            for media, source in stream:
+                if archive is not None:
+                    archive.record('current', media, source)
+                if store.add(media, source):
+                    yield media
+
+        try:
+            processed_anime = process_anime_stream(unique_media(), now)
+        finally:
+            # Release the fetch thread if processing failed part-way
+            stream.cancel()
+        result = stream.result
+        if result['service_unavailable']:
+            return None
+
+        if not result['succeeded']:
             print("No AniList requests succeeded. Preserving the existing dataset.")
             return None
 
-        print(f"Total anime fetched (airing, finished, upcoming): {len(all_anime)}")
-        
-        return {'data': {'Page': {'media': all_anime}}}
-        
+        print(f"Total anime fetched (airing, finished, upcoming): {len(store)} unique titles "
+              f"({store.duplicates()} duplicate results) in {result['requests']} requests")
+
+        return processed_anime
+
     except Exception as e:
         print(f"An unexpected error occurred in fetch_current_anime: {e}")
         return None
 
-def fetch_upcoming_seasonal_anime():
+def fetch_upcoming_seasonal_anime(stop_event=None, max_workers=FETCH_WORKERS, archive=None, now=None):
     """Fetch upcoming seasonal anime from AniList API for the NEXT season"""
-    next_season, next_year = get_next_season()
-    
-    query = '''
-    query ($page: Int, $perPage: Int, $season: MediaSeason, $year: Int) {
-        Page(page: $page, perPage: $perPage) {
-            pageInfo {
-                hasNextPage
-                currentPage
-            }
-            media(status: NOT_YET_RELEASED, type: ANIME, format_in: [TV, ONA, TV_SHORT], season: $season, seasonYear: $year, sort: [POPULARITY_DESC]) {
-                id
-                idMal
-                title {
-                    romaji
-                    english
-                }
-                averageScore
-                episodes
-                coverImage {
-                    extraLarge
-                    large
-                    medium
-                }
-                trailer {
-                    id
-                    site
-                    thumbnail
-                }
-                siteUrl
-                startDate {
-                    year
-                    month
-                    day
-                }
-                season
-                seasonYear
-                genres
-                isAdult
-                duration
-                format
-                popularity
-                favourites
-                studios {
-                    nodes {
-                        name
-                    }
-                }
-            }
-        }
-    }
-    '''
-    
-    all_anime = []
-    any_successful_request = False
-    page = 1
-    per_page = 50
-    
+    next_season, next_year = get_next_season(now)
+
+    query = PagedQuery(
+        'upcoming_next',
+        'status: NOT_YET_RELEASED, type: ANIME, format_in: [TV, ONA, TV_SHORT], '
+        'season: $season, seasonYear: $year, sort: [POPULARITY_DESC], '
+        f'{media_filter_args(UPCOMING_POPULARITY_THRESHOLD)}',
+        variables={'season': next_season, 'year': next_year},
+        variable_types={'season': 'MediaSeason', 'year': 'Int'},
+        label='upcoming next-season anime',
+        cache_family='upcoming'
+    )
+
     try:
-        while True:
-            variables = {
-                'page': page,
-                'perPage': per_page,
-                'season': next_season,
-                'year': next_year
-            }
-            
-            data = make_anilist_request(query, variables)
-            if data and data.get('service_unavailable'):
-                return None
-            
-            if not data or 'data' not in data:
-                break
-                
-            any_successful_request = True
-            page_data = data['data']['Page']
-            all_anime.extend(page_data['media'])
-            
-            # Check if there are more pages
-            if not page_data['pageInfo']['hasNextPage']:
-                break
-                
-            page += 1
-            print(f"Fetched upcoming page {page-1}, total anime so far: {len(all_anime)}")
-        
-        if not any_successful_request:
+        result = fetch_with_change_probe(
+            [query],
+            UPCOMING_MEDIA_FIELDS,
+            UPCOMING_VOLATILE_FIELDS,
+            'upcoming',
+            max_workers=max_workers,
+            stop_event=stop_event
+        )
+        if result['service_unavailable'] or not result['succeeded']:
             return None
 
+        all_anime = result['media'][query.name]
+        if archive is not None:
+            for anime in all_anime:
+                archive.record('upcoming', anime, query.name)
+        print(f"Total upcoming anime fetched: {len(all_anime)} in {result['requests']} requests")
         return {'data': {'Page': {'media': all_anime}}}
-        
+
     except Exception as e:
         print(f"An unexpected error occurred in fetch_upcoming_seasonal_anime: {e}")
         return None
 
-def process_anime_data(api_data):
-    """Process API data into our format"""
-    if not api_data or 'data' not in api_data:
-        return []
-    
-    processed_anime = []
-    
-    # Filter cutoff - only include anime from recent seasons
-    cutoff_date = datetime.now() - timedelta(days=365)  # 1 year cutoff
+def process_anime_entry(anime, cutoff_year, now=None):
+    """
+    Filter and normalise one AniList media object; None when it is not listed.
+
+    Date rules are evaluated as of `now` (local time, default: the current time).
+    """
+    now = now or datetime.now()
+    # Skip anime that started too long ago (unless it's in our exception list)
+    start_year = anime.get('startDate', {}).get('year')
     
-    # Kids anime blacklist - titles that are typically for children
-    kids_anime_keywords = [
-        'Maebashi Witches',
-        'Shirobuta Kizoku',
-        'Mashin Souzouden Wataru',
-        'Crayon Shin-chan',
-        'Doraemon',
-        'Pokemon',
-        'Pocket Monsters',
-        'Beyblade',
-        'Yu-Gi-Oh',
-        'Digimon',
-        'PreCure',
-        'Pretty Cure',
-        'Aikatsu',
-        'PriPara',
-        'Yokai Watch',
-        'Hamtaro',
-        'Anpanman'
-    ]
+    # Extract end date for various logic checks
+    end_date = None
+    if anime.get('endDate') and anime['endDate'].get('year'):
+        month = anime['endDate'].get('month') or 1
+        day = anime['endDate'].get('day') or 1
+        end_date = f"{anime['endDate']['year']}-{month:02d}-{day:02d}"
     
-    # Exception list for long-running anime we want to keep
-    long_running_exceptions = [
-        'ONE PIECE',
-        'Naruto',
-        'Detective Conan',
-        'Boruto'
-    ]
+    # Check if this is an exception anime
+    is_exception = title_matches(anime, LONG_RUNNING_EXCEPTIONS)
     
-    for anime in api_data['data']['Page']['media']:
-        # Skip anime that started too long ago (unless it's in our exception list)
-        start_year = anime.get('startDate', {}).get('year')
-        anime_title = anime['title']['romaji']
-        anime_title_english = anime['title'].get('english') or ''
-        
-        
-        # Extract end date for various logic checks
-        end_date = None
-        if anime.get('endDate') and anime['endDate'].get('year'):
-            month = anime['endDate'].get('month') or 1
-            day = anime['endDate'].get('day') or 1
-            end_date = f"{anime['endDate']['year']}-{month:02d}-{day:02d}"
-        
-        # Check if this is an exception anime
-        is_exception = False
-        for exception in long_running_exceptions:
-            if (exception.lower() in anime_title.lower() or 
-                (anime_title_english and exception.lower() in anime_title_english.lower())):
-                is_exception = True
-                break
+    if start_year and start_year < cutoff_year and not is_exception:
+        return None  # Skip this anime entirely
+
+    # Skip adult titles (also filtered server-side)
+    if anime.get('isAdult'):
+        return None
         
-        if start_year and start_year < cutoff_date.year and not is_exception:
-            continue  # Skip this anime entirely
-            
-        # Skip kids anime
+    # Skip kids anime
+    if title_matches(anime, KIDS_ANIME_KEYWORDS):
+        return None
         
-        # Check if title contains any kids anime keywords
-        is_kids_anime = False
-        for keyword in kids_anime_keywords:
-            if (keyword.lower() in anime_title.lower() or 
-                (anime_title_english and keyword.lower() in anime_title_english.lower())):
-                is_kids_anime = True
-                break
+    # Skip low popularity anime (ONA threshold is lower since Chinese web anime have smaller global counts)
+    popularity = anime.get('popularity', 0)
+    anime_format = anime.get('format', '')
+    if popularity < popularity_threshold(anime_format):
+        return None  # Skip unpopular anime
         
-        if is_kids_anime:
-            continue  # Skip kids anime
-            
-        # Skip low popularity anime (ONA threshold is lower since Chinese web anime have smaller global counts)
-        popularity = anime.get('popularity', 0)
-        anime_format = anime.get('format', '')
-        pop_threshold = 2000 if anime_format == 'ONA' else 3000
-        if popularity < pop_threshold:
-            continue  # Skip unpopular anime
-            
-        # Skip short anime (less than 10 minutes per episode)
-        episode_duration = anime.get('duration')
-        anime_format = anime.get('format')
+    # Skip short anime (less than 10 minutes per episode)
+    episode_duration = anime.get('duration')
+    anime_format = anime.get('format')
+    
+    if episode_duration and episode_duration < MIN_EPISODE_DURATION:
+        return None  # Skip short format anime
+    elif anime_format == 'TV_SHORT' and (not episode_duration or episode_duration < MIN_EPISODE_DURATION):
+        return None  # Skip TV Short with unknown/short duration
         
-        if episode_duration and episode_duration < 10:
-            continue  # Skip short format anime
-        elif anime_format == 'TV_SHORT' and (not episode_duration or episode_duration < 10):
-            continue  # Skip TV Short with unknown/short duration
-            
-        # Check if anime has a next airing episode or has aired recently
-        has_next_episode = anime.get('nextAiringEpisode') is not None
+    # Check if anime has a next airing episode or has aired recently
+    has_next_episode = anime.get('nextAiringEpisode') is not None
+    
+    
+    # If no next episode, check if it might be a final episode or finished series
+    if not has_next_episode:
+        # Check if this could be a final episode airing today/recently
+        could_be_finale_today = False
         
+        if start_year:
+            start_month = anime.get('startDate', {}).get('month', 1)
+            start_day = anime.get('startDate', {}).get('day', 1)
+            try:
+                start_date_obj = datetime(start_year, start_month, start_day)
+                today_date = now.date()
+                start_date_only = start_date_obj.date()
+                
+                # Calculate days since start
+                days_since_start = (today_date - start_date_only).days
+                weeks_since_start = days_since_start // 7
+                days_remainder = days_since_start % 7
+                
+                # If today is the same weekday as start date and it's been 7+ days
+                if days_remainder == 0 and days_since_start >= 7:
+                    could_be_finale_today = True
+                
+                # Also check if it's within the last week (might have aired yesterday/recently)
+                if 0 <= days_since_start <= 7:
+                    could_be_finale_today = True
+                    
+            except (ValueError, TypeError):
+                pass
         
-        # If no next episode, check if it might be a final episode or finished series
-        if not has_next_episode:
-            # Check if this could be a final episode airing today/recently
-            could_be_finale_today = False
+        # For anime without next episodes, check if they're still relevant
+        if not could_be_finale_today:
+            # Check if anime is ending soon (within 7 days) - if so, keep it
+            ending_soon = False
+            if end_date:
+                try:
+                    today_date = now.date()
+                    end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
+                    days_until_end = (end_date_obj - today_date).days
+                    # If ending within a week, consider it relevant
+                    if -3 <= days_until_end <= 7:  # Include anime that ended up to 3 days ago
+                        ending_soon = True
+                except (ValueError, TypeError):
+                    pass
             
-            if start_year:
-                start_month = anime.get('startDate', {}).get('month', 1)
-                start_day = anime.get('startDate', {}).get('day', 1)
+            # Check if anime finished recently (within last 7 days)
+            recently_finished = False
+            recently_finished_2weeks = False
+            if end_date:
                 try:
-                    start_date_obj = datetime(start_year, start_month, start_day)
-                    today_date = datetime.now().date()
-                    start_date_only = start_date_obj.date()
-                    
-                    # Calculate days since start
-                    days_since_start = (today_date - start_date_only).days
-                    weeks_since_start = days_since_start // 7
-                    days_remainder = days_since_start % 7
-                    
-                    # If today is the same weekday as start date and it's been 7+ days
-                    if days_remainder == 0 and days_since_start >= 7:
-                        could_be_finale_today = True
-                    
-                    # Also check if it's within the last week (might have aired yesterday/recently)
-                    if 0 <= days_since_start <= 7:
-                        could_be_finale_today = True
-                        
+                    today_date = now.date()
+                    end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
+                    days_since_end = (today_date - end_date_obj).days
+                    if 0 <= days_since_end <= 7:  # Finished within last week
+                        recently_finished = True
+                    elif 0 <= days_since_end <= 14:  # Finished within last 2 weeks
+                        recently_finished_2weeks = True
                 except (ValueError, TypeError):
                     pass
             
-            # For anime without next episodes, check if they're still relevant
-            if not could_be_finale_today:
-                # Check if anime is ending soon (within 7 days) - if so, keep it
-                ending_soon = False
-                if end_date:
-                    try:
-                        today_date = datetime.now().date()
-                        end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-                        days_until_end = (end_date_obj - today_date).days
-                        # If ending within a week, consider it relevant
-                        if -3 <= days_until_end <= 7:  # Include anime that ended up to 3 days ago
-                            ending_soon = True
-                    except (ValueError, TypeError):
-                        pass
-                
-                # Check if anime finished recently (within last 7 days)
-                recently_finished = False
-                recently_finished_2weeks = False
-                if end_date:
-                    try:
-                        today_date = datetime.now().date()
-                        end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-                        days_since_end = (today_date - end_date_obj).days
-                        if 0 <= days_since_end <= 7:  # Finished within last week
-                            recently_finished = True
-                        elif 0 <= days_since_end <= 14:  # Finished within last 2 weeks
-                            recently_finished_2weeks = True
-                    except (ValueError, TypeError):
-                        pass
-                
-                # If anime is neither ending soon nor recently finished, skip it
-                if not ending_soon and not recently_finished and not recently_finished_2weeks:
-                    continue
+            # If anime is neither ending soon nor recently finished, skip it
+            if not ending_soon and not recently_finished and not recently_finished_2weeks:
+                return None
 
-        # Get episode info - use nextAiringEpisode if available, otherwise estimate
-        episode_number = 1
-        release_date = None
-        next_airing_date = None
-        # Initialize next airing preservation variables
-        original_next_episode = None
-        original_next_date = None
+    # Get episode info - use nextAiringEpisode if available, otherwise estimate
+    episode_number = 1
+    release_date = None
+    next_airing_date = None
+    # Initialize next airing preservation variables
+    original_next_episode = None
+    original_next_date = None
+    
+    # Get start date first, as it's needed for the logic below
+    start_date = None
+    if anime.get('startDate') and anime['startDate'].get('year'):
+        month = anime.get('startDate').get('month') or 1
+        day = anime.get('startDate').get('day') or 1
+        start_date = f"{anime['startDate']['year']}-{month:02d}-{day:02d}"
         
-        # Get start date first, as it's needed for the logic below
-        start_date = None
-        if anime.get('startDate') and anime['startDate'].get('year'):
-            month = anime.get('startDate').get('month') or 1
-            day = anime.get('startDate').get('day') or 1
-            start_date = f"{anime['startDate']['year']}-{month:02d}-{day:02d}"
-            
-        if anime.get('nextAiringEpisode'):
-            # Has confirmed next episode
-            next_episode = anime['nextAiringEpisode']
-            airing_timestamp = next_episode['airingAt']
-            next_episode_number = next_episode['episode']
-            
-            # Convert timestamp to date objects/strings
-            airing_date = datetime.fromtimestamp(airing_timestamp)
-            next_airing_date_from_ts = airing_date.strftime('%Y-%m-%d')
+    if anime.get('nextAiringEpisode'):
+        # Has confirmed next episode
+        next_episode = anime['nextAiringEpisode']
+        airing_timestamp = next_episode['airingAt']
+        next_episode_number = next_episode['episode']
+        
+        # Convert timestamp to date objects/strings
+        airing_date = datetime.fromtimestamp(airing_timestamp)
+        next_airing_date_from_ts = airing_date.strftime('%Y-%m-%d')
+        
+        # Store the original next airing info separately (never modified)
+        original_next_episode = next_episode_number
+        original_next_date = next_airing_date_from_ts
+
+        # Get today and tomorrow for date checks (using Eastern Time)
+        eastern = ZoneInfo("America/New_York")
+        today_str = now.astimezone(eastern).strftime('%Y-%m-%d')
+        tomorrow_str = (now.astimezone(eastern) + timedelta(days=1)).strftime('%Y-%m-%d')
+        
+        # *** NEW LOGIC START ***
+        # Handles the edge case at the start of a season where an anime's official start date
+        # is tomorrow, but the next airing episode (#2) is in less than a week, implying
+        # that episode #1 must have aired today.
+        if start_date == tomorrow_str and next_episode_number == 2 and (airing_date - now) < timedelta(days=6, hours=23):
+            episode_number = 1
+            release_date = today_str
+            # The next airing date is still correct for episode 2
+            next_airing_date = next_airing_date_from_ts
+        # *** NEW LOGIC END ***
+
+        # NEW LOGIC: Prioritize airingAt for premieres, as it's more precise than startDate.
+        # This handles cases where the first episode airs a day before the official site's listed start date.
+        elif next_episode_number == 1:
+            episode_number = 1
+            release_date = next_airing_date_from_ts
+            next_airing_date = next_airing_date_from_ts
+        else:
+            # ORIGINAL LOGIC for subsequent episodes (Ep 2+)
+            episode_number = next_episode_number
+            release_date = next_airing_date_from_ts
+            next_airing_date = next_airing_date_from_ts
             
-            # Store the original next airing info separately (never modified)
-            original_next_episode = next_episode_number
-            original_next_date = next_airing_date_from_ts
-
-            # Get today and tomorrow for date checks (using Eastern Time)
-            eastern = ZoneInfo("America/New_York")
-            today_str = datetime.now(eastern).strftime('%Y-%m-%d')
-            tomorrow_str = (datetime.now(eastern) + timedelta(days=1)).strftime('%Y-%m-%d')
+            # Try to back-calculate for weekly shows first
+            today_date = now.date()
+            days_until_next = (airing_date.date() - today_date).days
             
-            # *** NEW LOGIC START ***
-            # Handles the edge case at the start of a season where an anime's official start date
-            # is tomorrow, but the next airing episode (#2) is in less than a week, implying
-            # that episode #1 must have aired today.
-            if start_date == tomorrow_str and next_episode_number == 2 and (airing_date - datetime.now()) < timedelta(days=6, hours=23):
-                episode_number = 1
-                release_date = today_str
-                # The next airing date is still correct for episode 2
-                next_airing_date = next_airing_date_from_ts
-            # *** NEW LOGIC END ***
-
-            # NEW LOGIC: Prioritize airingAt for premieres, as it's more precise than startDate.
-            # This handles cases where the first episode airs a day before the official site's listed start date.
-            elif next_episode_number == 1:
-                episode_number = 1
-                release_date = next_airing_date_from_ts
-                next_airing_date = next_airing_date_from_ts
-            else:
-                # ORIGINAL LOGIC for subsequent episodes (Ep 2+)
-                episode_number = next_episode_number
-                release_date = next_airing_date_from_ts
-                next_airing_date = next_airing_date_from_ts
-                
-                # Try to back-calculate for weekly shows first
-                today_date = datetime.now().date()
-                days_until_next = (airing_date.date() - today_date).days
-                
-                calculated_release_date = False
-                if 0 < days_until_next <= 14:
-                    today_weekday = today_date.weekday()
-                    next_episode_weekday = airing_date.weekday()
-
-                    if today_weekday == next_episode_weekday:
+            calculated_release_date = False
+            if 0 < days_until_next <= 14:
+                today_weekday = today_date.weekday()
+                next_episode_weekday = airing_date.weekday()
+
+                if today_weekday == next_episode_weekday:
+                    episode_number = episode_number - 1
+                    release_date = today_date.strftime('%Y-%m-%d')
+                    calculated_release_date = True
+                else:
+                    # Try 1-week gap first
+                    previous_ep_date = airing_date.date() - timedelta(days=7)
+                    days_since_prev = (today_date - previous_ep_date).days
+                    if 0 < days_since_prev <= 2:
                         episode_number = episode_number - 1
-                        release_date = today_date.strftime('%Y-%m-%d')
+                        release_date = previous_ep_date.strftime('%Y-%m-%d')
                         calculated_release_date = True
-                    else:
-                        # Try 1-week gap first
-                        previous_ep_date = airing_date.date() - timedelta(days=7)
-                        days_since_prev = (today_date - previous_ep_date).days
-                        if 0 < days_since_prev <= 2:
+                    # Try 2-week gap if 1-week didn't work
+                    elif not calculated_release_date:
+                        previous_ep_date_2w = airing_date.date() - timedelta(days=14)
+                        days_since_prev_2w = (today_date - previous_ep_date_2w).days
+                        if 0 < days_since_prev_2w <= 2:
                             episode_number = episode_number - 1
-                            release_date = previous_ep_date.strftime('%Y-%m-%d')
+                            release_date = previous_ep_date_2w.strftime('%Y-%m-%d')
                             calculated_release_date = True
-                        # Try 2-week gap if 1-week didn't work
-                        elif not calculated_release_date:
-                            previous_ep_date_2w = airing_date.date() - timedelta(days=14)
-                            days_since_prev_2w = (today_date - previous_ep_date_2w).days
-                            if 0 < days_since_prev_2w <= 2:
-                                episode_number = episode_number - 1
-                                release_date = previous_ep_date_2w.strftime('%Y-%m-%d')
-                                calculated_release_date = True
-                
-                # If we couldn't determine a weekly release, check if it's a long-running show
-                if not calculated_release_date:
-                    start_year = anime.get('startDate', {}).get('year')
-                    start_month = anime.get('startDate', {}).get('month', 1)
-                    
-                    started_long_ago = False
-                    if start_year:
-                        try:
-                            start_date_obj = datetime(start_year, start_month, 1)
-                            three_months_ago = datetime.now() - timedelta(days=90)
-                            started_long_ago = start_date_obj < three_months_ago
-                        except (ValueError, TypeError):
-                            started_long_ago = False
-                    
-                    is_long_running = episode_number > 50
-                    
-                    is_exception_anime = False
-                    for exception in long_running_exceptions:
-                        if (exception.lower() in anime_title.lower() or 
-                            (anime_title_english and exception.lower() in anime_title_english.lower())):
-                            is_exception_anime = True
-                            break
-                    
-                    if (started_long_ago or is_long_running) and not is_exception_anime:
-                        release_date = None
-        else:
-            # No next episode data
-            if anime['status'] == 'NOT_YET_RELEASED' and start_date:
-                 episode_number = 1
-                 release_date = start_date
-                 next_airing_date = start_date
-            else:
-                episode_count = anime.get('episodes', 1) or 1
-                today_date = datetime.now().date()
+            
+            # If we couldn't determine a weekly release, check if it's a long-running show
+            if not calculated_release_date:
+                start_year = anime.get('startDate', {}).get('year')
+                start_month = anime.get('startDate', {}).get('month', 1)
                 
-                recently_finished = False
-                if end_date:
+                started_long_ago = False
+                if start_year:
                     try:
-                        end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-                        days_until_end = (end_date_obj - today_date).days
-                        
-                        if 1 <= days_until_end <= 2:
-                            episode_number = episode_count
-                            release_date = today_date.strftime('%Y-%m-%d')
-                            recently_finished = True
+                        start_date_obj = datetime(start_year, start_month, 1)
+                        three_months_ago = now - timedelta(days=90)
+                        started_long_ago = start_date_obj < three_months_ago
                     except (ValueError, TypeError):
-                        pass
+                        started_long_ago = False
                 
-                if not recently_finished:
-                    start_year = anime.get('startDate', {}).get('year')
-                    start_month = anime.get('startDate', {}).get('month', 1)
-                    
-                    is_long_running = episode_count > 50
+                is_long_running = episode_number > 50
+                
+                if (started_long_ago or is_long_running) and not is_exception:
+                    release_date = None
+    else:
+        # No next episode data
+        if anime['status'] == 'NOT_YET_RELEASED' and start_date:
+             episode_number = 1
+             release_date = start_date
+             next_airing_date = start_date
+        else:
+            episode_count = anime.get('episodes', 1) or 1
+            today_date = now.date()
+            
+            recently_finished = False
+            if end_date:
+                try:
+                    end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
+                    days_until_end = (end_date_obj - today_date).days
                     
-                    if is_long_running:
-                        episode_number = episode_count
-                        release_date = None
-                    else:
+                    if 1 <= days_until_end <= 2:
                         episode_number = episode_count
-                        
-                        if start_year and start_month:
-                            try:
-                                start_day = anime.get('startDate', {}).get('day') or 1
-                                start_date_obj = datetime(start_year, start_month, start_day)
-                                start_date_only = start_date_obj.date()
-                                
-                                days_since_start = (today_date - start_date_only).days
-                                weeks_since_start = days_since_start // 7
-                                days_remainder = days_since_start % 7
-                                
-                                if (days_remainder == 0 and days_since_start >= 7):
-                                    expected_episode = weeks_since_start + 1
-                                    if expected_episode <= episode_count:
-                                        episode_number = expected_episode
-                                        # Don't set release_date for today if the anime has already finished
-                                        if not (end_date and end_date <= today_date.strftime('%Y-%m-%d')):
-                                            release_date = today_date.strftime('%Y-%m-%d')
-                                        else:
-                                            release_date = None
+                        release_date = today_date.strftime('%Y-%m-%d')
+                        recently_finished = True
+                except (ValueError, TypeError):
+                    pass
+            
+            if not recently_finished:
+                start_year = anime.get('startDate', {}).get('year')
+                start_month = anime.get('startDate', {}).get('month', 1)
+                
+                is_long_running = episode_count > 50
+                
+                if is_long_running:
+                    episode_number = episode_count
+                    release_date = None
+                else:
+                    episode_number = episode_count
+                    
+                    if start_year and start_month:
+                        try:
+                            start_day = anime.get('startDate', {}).get('day') or 1
+                            start_date_obj = datetime(start_year, start_month, start_day)
+                            start_date_only = start_date_obj.date()
+                            
+                            days_since_start = (today_date - start_date_only).days
+                            weeks_since_start = days_since_start // 7
+                            days_remainder = days_since_start % 7
+                            
+                            if (days_remainder == 0 and days_since_start >= 7):
+                                expected_episode = weeks_since_start + 1
+                                if expected_episode <= episode_count:
+                                    episode_number = expected_episode
+                                    # Don't set release_date for today if the anime has already finished
+                                    if not (end_date and end_date <= today_date.strftime('%Y-%m-%d')):
+                                        release_date = today_date.strftime('%Y-%m-%d')
                                     else:
                                         release_date = None
                                 else:
                                     release_date = None
-                            except (ValueError, TypeError):
+                            else:
                                 release_date = None
-                        else:
+                        except (ValueError, TypeError):
                             release_date = None
+                    else:
+                        release_date = None
 
-        # Process streaming links
-        streaming_links = []
-        streaming_sites = {
-            'Crunchyroll', 'Funimation', 'Netflix', 'Hulu', 'Amazon Prime Video',
-            'Prime Video', 'Amazon Video',
-            'Disney Plus', 'HBO Max', 'VRV', 'Hidive', 'HIDIVE', 'AnimeLab', 'Wakanim',
-            'Bilibili', 'iQiyi', 'Tencent Video', 'YouTube', 'Niconico',
-            'AbemaTV', 'dAnime Store', 'U-NEXT', 'Muse Asia', 'Oceanveil', 'Crave',
-            'Apple TV+', 'Apple TV Plus', 'Peacock'
-        }
-        
-        site_domains = {
-            'Crunchyroll': 'crunchyroll.com', 'Netflix': 'netflix.com', 'Hulu': 'hulu.com',
-            'Amazon Prime Video': 'primevideo.com', 'Prime Video': 'primevideo.com',
-            'Amazon Video': 'primevideo.com', 'Disney Plus': 'disneyplus.com',
-            'HBO Max': 'hbomax.com', 'YouTube': 'youtube.com', 'Funimation': 'funimation.com',
-            'VRV': 'vrv.co', 'Hidive': 'www.hidive.com', 'HIDIVE': 'www.hidive.com',
-            'Bilibili': 'bilibili.com', 'AnimeLab': 'animelab.com', 'Wakanim': 'wakanim.tv',
-            'Oceanveil': 'oceanveil.org', 'Crave': 'crave.ca', 'Apple TV+': 'tv.apple.com',
-            'Apple TV Plus': 'tv.apple.com', 'Peacock': 'peacocktv.com'
-        }
-        
-        if anime.get('externalLinks'):
-            for link in anime['externalLinks']:
-                site_name = link.get('site', '')
-                if site_name in streaming_sites and link.get('url'):
-                    domain = site_domains.get(site_name)
-                    if not domain:
-                        try:
-                            from urllib.parse import urlparse
-                            domain = urlparse(link['url']).netloc
-                            if domain.startswith('www.'):
-                                domain = domain[4:]
-                        except:
-                            domain = link['url']
-                    icon_url = f"https://www.google.com/s2/favicons?domain={domain}&sz=32"
-                    streaming_links.append({'site': site_name, 'url': link['url'], 'icon': icon_url})
-        
-        # Check if anime is ending today or tomorrow and set release_date accordingly
-        # Only do this if there's actually a next episode (indicating a finale airing today/tomorrow)
-        today_str = datetime.now().strftime('%Y-%m-%d')
-        tomorrow_str = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
-
-        if end_date and (end_date == today_str or end_date == tomorrow_str) and has_next_episode:
-            if not release_date or release_date != end_date:
-                release_date = end_date
-                if anime.get('episodes'):
-                    episode_number = anime['episodes']
-        
-        # Always prioritize original next airing data when available
-        final_next_airing_date = original_next_date if original_next_date is not None else next_airing_date
-        final_next_episode = original_next_episode if original_next_episode is not None else episode_number
-        
-        # Check if recently finished (within 2 weeks)
-        is_recently_finished = False
-        if end_date:
-            try:
-                today_date = datetime.now().date()
-                end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-                days_since_end = (today_date - end_date_obj).days
-                # Mark as recently finished if ended within last 2 weeks (regardless of next episode status)
-                if 0 <= days_since_end <= 14:
-                    is_recently_finished = True
-            except (ValueError, TypeError):
-                pass
-        
-        processed_anime.append({
-            'id': anime['id'],
-            'mal_id': anime.get('idMal'),
-            'name': anime['title']['romaji'],
-            'english_title': anime['title'].get('english'),
-            'episode': episode_number,
-            'release_date': release_date,
-            'next_airing_date': final_next_airing_date,
-            'next_episode_number': final_next_episode,
-            'poster_url': anime['coverImage'].get('extraLarge') or anime['coverImage'].get('large') or anime['coverImage']['medium'],
-            'trailer': normalize_media_trailer(anime.get('trailer')),
-            'site_url': anime['siteUrl'],
-            'start_date': start_date,
-            'end_date': end_date,
-            'streaming_links': streaming_links,
-            'popularity': anime.get('popularity', 0),
-            'anilist_score': anime.get('averageScore'),
-            'recently_finished': is_recently_finished
-        })
+    # Process streaming links
+    streaming_links = []
+    streaming_sites = {
+        'Crunchyroll', 'Funimation', 'Netflix', 'Hulu', 'Amazon Prime Video',
+        'Prime Video', 'Amazon Video',
+        'Disney Plus', 'HBO Max', 'VRV', 'Hidive', 'HIDIVE', 'AnimeLab', 'Wakanim',
+        'Bilibili', 'iQiyi', 'Tencent Video', 'YouTube', 'Niconico',
+        'AbemaTV', 'dAnime Store', 'U-NEXT', 'Muse Asia', 'Oceanveil', 'Crave',
+        'Apple TV+', 'Apple TV Plus', 'Peacock'
+    }
     
-    # Sort by popularity (highest first) to calculate rankings
-    processed_anime.sort(key=lambda x: x['popularity'], reverse=True)
+    site_domains = {
+        'Crunchyroll': 'crunchyroll.com', 'Netflix': 'netflix.com', 'Hulu': 'hulu.com',
+        'Amazon Prime Video': 'primevideo.com', 'Prime Video': 'primevideo.com',
+        'Amazon Video': 'primevideo.com', 'Disney Plus': 'disneyplus.com',
+        'HBO Max': 'hbomax.com', 'YouTube': 'youtube.com', 'Funimation': 'funimation.com',
+        'VRV': 'vrv.co', 'Hidive': 'www.hidive.com', 'HIDIVE': 'www.hidive.com',
+        'Bilibili': 'bilibili.com', 'AnimeLab': 'animelab.com', 'Wakanim': 'wakanim.tv',
+        'Oceanveil': 'oceanveil.org', 'Crave': 'crave.ca', 'Apple TV+': 'tv.apple.com',
+        'Apple TV Plus': 'tv.apple.com', 'Peacock': 'peacocktv.com'
+    }
+    
+    if anime.get('externalLinks'):
+        for link in anime['externalLinks']:
+            site_name = link.get('site', '')
+            if site_name in streaming_sites and link.get('url'):
+                domain = site_domains.get(site_name)
+                if not domain:
+                    try:
+                        from urllib.parse import urlparse
+                        domain = urlparse(link['url']).netloc
+                        if domain.startswith('www.'):
+                            domain = domain[4:]
+                    except:
+                        domain = link['url']
+                icon_url = f"https://www.google.com/s2/favicons?domain={domain}&sz=32"
+                streaming_links.append({'site': site_name, 'url': link['url'], 'icon': icon_url})
     
-    # Add popularity ranking to each anime
+    # Check if anime is ending today or tomorrow and set release_date accordingly
+    # Only do this if there's actually a next episode (indicating a finale airing today/tomorrow)
+    today_str = now.strftime('%Y-%m-%d')
+    tomorrow_str = (now + timedelta(days=1)).strftime('%Y-%m-%d')
+
+    if end_date and (end_date == today_str or end_date == tomorrow_str) and has_next_episode:
+        if not release_date or release_date != end_date:
+            release_date = end_date
+            if anime.get('episodes'):
+                episode_number = anime['episodes']
+    
+    # Always prioritize original next airing data when available
+    final_next_airing_date = original_next_date if original_next_date is not None else next_airing_date
+    final_next_episode = original_next_episode if original_next_episode is not None else episode_number
+    
+    # Check if recently finished (within 2 weeks)
+    is_recently_finished = False
+    if end_date:
+        try:
+            today_date = now.date()
+            end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
+            days_since_end = (today_date - end_date_obj).days
+            # Mark as recently finished if ended within last 2 weeks (regardless of next episode status)
+            if 0 <= days_since_end <= 14:
+                is_recently_finished = True
+        except (ValueError, TypeError):
+            pass
+    
+    return {
+        'id': anime['id'],
+        'mal_id': anime.get('idMal'),
+        'name': anime['title']['romaji'],
+        'english_title': anime['title'].get('english'),
+        'episode': episode_number,
+        'release_date': release_date,
+        'next_airing_date': final_next_airing_date,
+        'next_episode_number': final_next_episode,
+        'poster_url': anime['coverImage'].get('extraLarge') or anime['coverImage'].get('large') or anime['coverImage']['medium'],
+        'trailer': normalize_media_trailer(anime.get('trailer')),
+        'site_url': anime['siteUrl'],
+        'start_date': start_date,
+        'end_date': end_date,
+        'streaming_links': streaming_links,
+        'popularity': anime.get('popularity', 0),
+        'anilist_score': anime.get('averageScore'),
+        'recently_finished': is_recently_finished
+    }
+
+def rank_by_popularity(processed_anime):
+    """Sort by popularity (highest first) and store each title's rank"""
+    processed_anime.sort(key=lambda x: x['popularity'], reverse=True)
     for rank, anime in enumerate(processed_anime, 1):
         anime['popularity_rank'] = rank
-    
     return processed_anime
 
+def process_anime_stream(media_iter, now=None):
+    """
+    Process media objects one at a time as they arrive.
+
+    Only the compact processed records are kept; ranking needs the complete
+    set, so it runs once the stream is exhausted. `now` is passed on to
+    process_anime_entry.
+    """
+    cutoff_year = start_year_cutoff(now)
+    processed_anime = []
+    for anime in media_iter:
+        entry = process_anime_entry(anime, cutoff_year, now)
+        if entry is not None:
+            processed_anime.append(entry)
+    return rank_by_popularity(processed_anime)
+
+def process_anime_data(api_data, now=None):
+    """Process API data into our format"""
+    if not api_data or 'data' not in api_data:
+        return []
+    return process_anime_stream(api_data['data']['Page']['media'], now)
+
 def process_upcoming_anime_data(api_data):
     """Process upcoming seasonal anime API data"""
     if not api_data or 'data' not in api_data:
@@ -1012,41 +916,27 @@ def process_upcoming_anime_data(api_data):
     
     processed_anime = []
     
-    # Kids anime blacklist - same as main function
-    kids_anime_keywords = [
-        'Maebashi Witches', 'Shirobuta Kizoku', 'Mashin Souzouden Wataru',
-        'Crayon Shin-chan', 'Doraemon', 'Pokemon', 'Pocket Monsters',
-        'Beyblade', 'Yu-Gi-Oh', 'Digimon', 'PreCure', 'Pretty Cure',
-        'Aikatsu', 'PriPara', 'Yokai Watch', 'Hamtaro', 'Anpanman'
-    ]
-    
     for anime in api_data['data']['Page']['media']:
-        anime_title = anime['title']['romaji']
-        anime_title_english = anime['title'].get('english') or ''
-        
+        # Skip adult titles (also filtered server-side)
+        if anime.get('isAdult'):
+            continue
+
         # Skip kids anime
-        is_kids_anime = False
-        for keyword in kids_anime_keywords:
-            if (keyword.lower() in anime_title.lower() or 
-                (anime_title_english and keyword.lower() in anime_title_english.lower())):
-                is_kids_anime = True
-                break
-        
-        if is_kids_anime:
+        if title_matches(anime, KIDS_ANIME_KEYWORDS):
             continue
             
-        # Skip low popularity anime (less than 1000 for upcoming anime - lower threshold)
+        # Skip low popularity anime (lower threshold for upcoming anime)
         popularity = anime.get('popularity', 0)
-        if popularity < 1000:
+        if popularity < UPCOMING_POPULARITY_THRESHOLD:
             continue
             
         # Skip short anime (less than 10 minutes per episode)
         episode_duration = anime.get('duration')
         anime_format = anime.get('format')
         
-        if episode_duration and episode_duration < 10:
+        if episode_duration and episode_duration < MIN_EPISODE_DURATION:
             continue
-        elif anime_format == 'TV_SHORT' and (not episode_duration or episode_duration < 10):
+        elif anime_format == 'TV_SHORT' and (not episode_duration or episode_duration < MIN_EPISODE_DURATION):
             continue
         
         # Get start date
@@ -1157,8 +1047,14 @@ def load_calendar_history():
         print(f"Warning: Failed to load calendar history: {e}")
         return []
 
-def update_calendar_history(anime_list, today_date, history_days=CALENDAR_HISTORY_DAYS):
-    """Persist a rolling window of calendar entries for past release dates."""
+def update_calendar_history(anime_list, today_date, history_days=CALENDAR_HISTORY_DAYS,
+                            output_path=CALENDAR_HISTORY_FILE):
+    """
+    Persist a rolling window of calendar entries for past release dates.
+
+    The saved history in CALENDAR_HISTORY_FILE is merged in and the result is
+    written to `output_path`.
+    """
     today = datetime.strptime(today_date, '%Y-%m-%d').date()
     window_start = today - timedelta(days=history_days)
     history_by_key = {}
@@ -1240,27 +1136,108 @@ def update_calendar_history(anime_list, today_date, history_days=CALENDAR_HISTOR
         key=lambda entry: (entry.get('release_date', ''), entry.get('name', ''))
     )
 
-    with open(CALENDAR_HISTORY_FILE, 'w', encoding='utf-8') as f:
+    with open(output_path, 'w', encoding='utf-8') as f:
         json.dump(calendar_history, f, ensure_ascii=False, indent=2)
 
     print(f"Saved {len(calendar_history)} calendar history entries")
     return calendar_history
 
-def main():
-    """Main function to fetch and process anime data"""
+def run_local_time(run_id):
+    """Local wall-clock time an archived run started, the `now` its rules were evaluated at"""
+    return run_archive.run_started_at(run_id).astimezone().replace(tzinfo=None)
+
+def update_anime_data(mal_scores=False, archive=None):
+    """Fetch and process anime data, optionally enriched with MAL scores"""
     print("Fetching anime data from AniList API...")
-    
-    # Create data directory if it doesn't exist
-    os.makedirs('data', exist_ok=True)
-    
-    # Fetch data from API
-    api_data = fetch_current_anime()
-    if not api_data:
+    # One timestamp for the whole run, so --reprocess of its archive reproduces it
+    now = run_local_time(archive.run_id) if archive is not None else datetime.now()
+
+    # Fetch the current and next-season query families side by side. A shared
+    # stop event lets either one abandon the other if AniList goes into maintenance.
+    next_season, next_year = get_next_season(now)
+    print(f"Fetching upcoming {next_season.lower()} {next_year} anime alongside current anime...")
+    # The Jikan seasonal listings do not depend on AniList's results, so when
+    # the previous run's ids show enough stale scores to page them at all, they
+    # are paged at the same time and joined on mal_id once both are in memory.
+    # Otherwise refresh_score_cache decides on this run's ids afterwards.
+    seasons = [(get_current_season(now), now.year), (next_season, next_year)]
+    prefetch_scores = mal_scores and needs_bulk_refresh(saved_mal_ids(), load_score_cache())
+    stop_event = threading.Event()
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        current_future = executor.submit(fetch_current_anime, stop_event, archive=archive, now=now)
+        upcoming_future = executor.submit(fetch_upcoming_seasonal_anime, stop_event, archive=archive, now=now)
+        seasonal_scores_future = None
+        if prefetch_scores:
+            seasonal_scores_future = executor.submit(fetch_seasonal_scores, seasons)
+        processed_data = current_future.result()
+        upcoming_api_data = upcoming_future.result()
+        seasonal_scores = seasonal_scores_future.result() if seasonal_scores_future else None
+
+    save_anime_data(
+        processed_data,
+        upcoming_api_data,
+        lambda entries: fetch_manual_anime_data(entries, archive=archive),
+        mal_scores=mal_scores,
+        seasonal_scores=seasonal_scores,
+        seasons=seasons,
+        now=now
+    )
+
+def reprocess_anime_data(run_id, overwrite=False):
+    """
+    Rebuild the data files from an archived run without touching the network.
+
+    The rules are evaluated as of the time the run started. Output goes to
+    REPROCESS_DIR/<run-id>/ unless `overwrite` asks for data/ itself.
+    """
+    resolved = run_archive.resolve_run(run_id)
+    if resolved is None:
+        print(f"No archived run {run_id!r} in {run_archive.ARCHIVE_DIR}")
+        return
+
+    now = run_local_time(resolved)
+    output_dir = DATA_DIR if overwrite else os.path.join(REPROCESS_DIR, resolved)
+    print(f"Reprocessing archived run {resolved} as of {now.isoformat(timespec='seconds')} into {output_dir}/...")
+    families = run_archive.load_run(resolved)
+    store = MediaStore(keep_media=False)
+    processed_data = process_anime_stream(
+        (media for media, source in families.get('current', []) if store.add(media, source)),
+        now
+    )
+    upcoming_media = [media for media, _ in families.get('upcoming', [])]
+    manual_media = [media for media, _ in families.get('manual', [])]
+    save_anime_data(
+        processed_data,
+        {'data': {'Page': {'media': upcoming_media}}} if upcoming_media else None,
+        lambda entries: {'data': {'Page': {'media': manual_media}}},
+        now=now,
+        output_dir=output_dir
+    )
+
+def save_anime_data(processed_data, upcoming_api_data, fetch_manual, mal_scores=False, seasonal_scores=None,
+                    seasons=None, now=None, output_dir=DATA_DIR):
+    """
+    Merge manual entries, sort and write every data/*.json file.
+
+    `fetch_manual(entries)` returns live AniList data for manual entries, so the
+    same path serves live runs and archive reprocessing. `now` is the time the
+    dates are computed for (default: the current time). Inputs such as
+    manual_anime.json are always read from data/; the outputs go to
+    `output_dir`, and only output written to data/ is mirrored into ANIME_DB.
+    With `mal_scores`, `seasonal_scores` are Jikan listings already paged and
+    `seasons` the listings to page if enough scores turn out to be stale.
+    """
+    now = now or datetime.now()
+    os.makedirs(output_dir, exist_ok=True)
+    next_season, next_year = get_next_season(now)
+
+    def output_path(name):
+        return os.path.join(output_dir, name)
+
+    if processed_data is None:
         print("Skipped updating anime data because AniList live data is unavailable.")
         return
-    
-    # Process the data
-    processed_data = process_anime_data(api_data)
+
     if not processed_data:
         print("Processed dataset is empty. Preserving the existing anime data files.")
         return
@@ -1269,15 +1246,15 @@ def main():
     
     # Get today's and tomorrow's dates (using Eastern Time)
     eastern = ZoneInfo("America/New_York")
-    today = datetime.now(eastern).strftime('%Y-%m-%d')
-    tomorrow = (datetime.now(eastern) + timedelta(days=1)).strftime('%Y-%m-%d')
+    today = now.astimezone(eastern).strftime('%Y-%m-%d')
+    tomorrow = (now.astimezone(eastern) + timedelta(days=1)).strftime('%Y-%m-%d')
     
     # Merge manual_anime.json entries (anime too obscure to be auto-fetched)
     manual_path = 'data/manual_anime.json'
     if os.path.exists(manual_path):
         manual_entries = load_json_file(manual_path, [])
         existing_ids = {a.get('id') for a in processed_data}
-        added_entries = refreshed_manual_entries(manual_entries, existing_ids, today)
+        added_entries = refreshed_manual_entries(manual_entries, existing_ids, today, fetch_manual, now)
         added = len(added_entries)
         processed_data.extend(added_entries)
         if added:
@@ -1285,57 +1262,118 @@ def main():
 
     rerank_anime(processed_data)
 
+    upcoming_anime = None
+    if upcoming_api_data:
+        upcoming_anime = process_upcoming_anime_data(upcoming_api_data)
+        print(f"Processed {len(upcoming_anime)} upcoming anime")
+
+    if mal_scores:
+        enriched = enrich_with_mal_scores(
+            [processed_data, upcoming_anime or []], seasonal_scores=seasonal_scores, seasons=seasons
+        )
+        print(f"Added MAL scores to {enriched} anime")
+
     # Sort other anime with custom logic after manual entries have been merged
     other_anime_sorted, recently_finished_sorted = sort_other_anime(processed_data, today, tomorrow)
 
-    update_calendar_history(processed_data, today)
+    calendar_history = update_calendar_history(
+        processed_data, today, output_path=output_path('calendar_history.json')
+    )
 
     # Save processed data
-    with open('data/anime_data.json', 'w', encoding='utf-8') as f:
+    with open(output_path('anime_data.json'), 'w', encoding='utf-8') as f:
         json.dump(processed_data, f, ensure_ascii=False, indent=2)
     
     # Save other anime sorted data
-    with open('data/other_anime_sorted.json', 'w', encoding='utf-8') as f:
+    with open(output_path('other_anime_sorted.json'), 'w', encoding='utf-8') as f:
         json.dump(other_anime_sorted, f, ensure_ascii=False, indent=2)
     
     # Save recently finished anime data
-    with open('data/recently_finished_anime.json', 'w', encoding='utf-8') as f:
+    with open(output_path('recently_finished_anime.json'), 'w', encoding='utf-8') as f:
         json.dump(recently_finished_sorted, f, ensure_ascii=False, indent=2)
     
-    # Fetch upcoming seasonal anime
-    next_season, next_year = get_next_season()
-    print(f"Fetching upcoming {next_season.lower()} {next_year} anime...")
-    
-    upcoming_api_data = fetch_upcoming_seasonal_anime()
-    upcoming_anime = load_json_file('data/upcoming_seasonal_anime.json', [])
-    if upcoming_api_data:
-        upcoming_anime = process_upcoming_anime_data(upcoming_api_data)
-        print(f"Processed {len(upcoming_anime)} upcoming anime")
-        
+    if upcoming_anime is not None:
         # Save upcoming anime data
-        with open('data/upcoming_seasonal_anime.json', 'w', encoding='utf-8') as f:
+        with open(output_path('upcoming_seasonal_anime.json'), 'w', encoding='utf-8') as f:
             json.dump(upcoming_anime, f, ensure_ascii=False, indent=2)
     else:
         print("Upcoming seasonal anime fetch failed. Preserving the existing upcoming dataset.")
+        upcoming_anime = load_json_file('data/upcoming_seasonal_anime.json', [])
     
     # Save metadata
     metadata = {
-        'last_updated': datetime.now(eastern).isoformat(),
+        'last_updated': now.astimezone(eastern).isoformat(),
         'total_anime': len(processed_data),
         'total_upcoming_anime': len(upcoming_anime),
-        'current_season': get_current_season(),
+        'current_season': get_current_season(now),
         'next_season': next_season,
         'next_season_year': next_year,
         'today_date': today,
         'tomorrow_date': tomorrow
     }
     
-    with open('data/metadata.json', 'w', encoding='utf-8') as f:
+    with open(output_path('metadata.json'), 'w', encoding='utf-8') as f:
         json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+    # Mirror everything into the optional SQLite store
+    db = anime_db.from_environment() if output_dir == DATA_DIR else None
+    if db is not None:
+        with db:
+            db.replace_list('anime_data', processed_data)
+            db.replace_list('other_anime_sorted', other_anime_sorted)
+            db.replace_list('recently_finished_anime', recently_finished_sorted)
+            db.replace_list('upcoming_seasonal_anime', upcoming_anime)
+            db.replace_list('calendar_history', calendar_history)
+            db.put_document('metadata', metadata)
+        print(f"Upserted data into {db.path}")
     
-    print(f"Data saved to data/ directory")
+    print(f"Data saved to {output_dir}/ directory")
     print(f"Last updated: {metadata['last_updated']}")
     print(f"Next season: {next_season.title()} {next_year}")
 
+def main():
+    """Main function to fetch and process anime data"""
+    parser = argparse.ArgumentParser(description='Fetch airing and upcoming anime from AniList')
+    parser.add_argument(
+        '--cache',
+        choices=response_cache.CACHE_MODES,
+        default='off',
+        help='Reuse AniList responses cached on disk (read), re-fetch and overwrite them (refresh), or skip the cache (off)'
+    )
+    parser.add_argument(
+        '--mal-scores',
+        action='store_true',
+        help='Fetch MAL scores from Jikan alongside AniList and store them with the data'
+    )
+    parser.add_argument(
+        '--reprocess',
+        metavar='RUN_ID',
+        help="Rebuild the data files from an archived run (or 'latest') without network access"
+    )
+    parser.add_argument(
+        '--overwrite',
+        action='store_true',
+        help=f'With --reprocess, write into {DATA_DIR}/ instead of {REPROCESS_DIR}/<run-id>/'
+    )
+    args = parser.parse_args()
+    response_cache.set_mode(args.cache)
+
+    if args.reprocess:
+        reprocess_anime_data(args.reprocess, overwrite=args.overwrite)
+        return
+
+    run_archive.prune_archive()
+    archive = run_archive.RunArchive()
+    try:
+        update_anime_data(mal_scores=args.mal_scores, archive=archive)
+    finally:
+        archive.close()
+        print(anilist_limiter.summary())
+        if active_cassette is not None:
+            print(active_cassette.summary())
+        if args.cache != 'off':
+            response_cache.evict()
+            print(response_cache.summary())
+
 if __name__ == '__main__':
     main()
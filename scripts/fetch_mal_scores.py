@@ -1,101 +1,253 @@
 #!/usr/bin/env python3
 import json
-import requests
-import time
 import os
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
-# MAL Jikan API (unofficial but reliable)
-JIKAN_API_URL = "https://api.jikan.moe/v4"
+import anime_db
+from api_client import active_cassette, jikan_limiter, jikan_request
+
+# Shared mal_id -> scores cache, so ids that appear in several data files are
+# fetched once and scores are refreshed once they are older than the TTL
+MAL_SCORE_CACHE_FILE = ".cache/mal_scores.json"
+MAL_SCORE_TTL_DAYS = 7
+# Concurrent Jikan requests; jikan_limiter keeps them under 3 req/s and 60 req/min
+JIKAN_WORKERS = 3
+# Below this many ids to fetch, per-id lookups are cheaper than paging whole seasons
+BULK_MIN_IDS = 25
+
+MAL_DATA_FILES = [
+    'data/anime_data.json',
+    'data/other_anime_sorted.json',
+    'data/upcoming_seasonal_anime.json'
+]
 
 def fetch_mal_score(mal_id, retry_count=3):
     """Fetch MAL score for a specific anime by MAL ID"""
     if not mal_id:
         return None
-    
-    for attempt in range(retry_count):
-        try:
-            response = requests.get(
-                f"{JIKAN_API_URL}/anime/{mal_id}",
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                anime_data = data.get('data', {})
-                return {
-                    'mal_score': anime_data.get('score'),
-                    'mal_scored_by': anime_data.get('scored_by'),
-                    'mal_rank': anime_data.get('rank'),
-                    'mal_popularity': anime_data.get('popularity'),
-                    'mal_members': anime_data.get('members')
-                }
-            elif response.status_code == 429:  # Rate limited
-                print(f"Rate limited, waiting before retry...")
-                time.sleep(2 ** attempt)  # Exponential backoff
+
+    data = jikan_request(f"anime/{mal_id}", retry_count=retry_count)
+    if not data:
+        return None
+
+    return mal_scores_from_entry(data.get('data', {}))
+
+def mal_scores_from_entry(anime_data):
+    """Pick the score fields out of a Jikan anime object"""
+    return {
+        'mal_score': anime_data.get('score'),
+        'mal_scored_by': anime_data.get('scored_by'),
+        'mal_rank': anime_data.get('rank'),
+        'mal_popularity': anime_data.get('popularity'),
+        'mal_members': anime_data.get('members')
+    }
+
+def fetch_season_page(path, page):
+    """One page (25 entries) of a Jikan seasonal listing"""
+    return jikan_request(f"{path}?page={page}")
+
+def fetch_season_scores(path, executor):
+    """
+    Page through a Jikan seasonal listing and return {mal_id: scores}.
+
+    Page 1 reports the last page, so the remaining pages are fetched concurrently.
+    """
+    first = fetch_season_page(path, 1)
+    if not first:
+        return {}
+
+    pages = [first]
+    last_page = (first.get('pagination') or {}).get('last_visible_page') or 1
+    if last_page > 1:
+        pages.extend(executor.map(lambda page: fetch_season_page(path, page), range(2, last_page + 1)))
+
+    scores = {}
+    for data in pages:
+        for anime_data in (data or {}).get('data') or []:
+            if anime_data.get('mal_id'):
+                scores[anime_data['mal_id']] = mal_scores_from_entry(anime_data)
+    print(f"Jikan {path}: {len(scores)} anime in {last_page} pages")
+    return scores
+
+def fetch_seasonal_scores(seasons, workers=JIKAN_WORKERS):
+    """{mal_id: scores} from the Jikan listings of the given (season, year) pairs"""
+    scores = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for season, year in seasons:
+            scores.update(fetch_season_scores(f"seasons/{year}/{season.lower()}", executor))
+    return scores
+
+def load_score_cache():
+    """Load {mal_id: {'fetched_at': iso, 'scores': {...}}} from the cache file"""
+    if not os.path.exists(MAL_SCORE_CACHE_FILE):
+        return {}
+    try:
+        with open(MAL_SCORE_CACHE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Warning: Failed to load {MAL_SCORE_CACHE_FILE}: {e}")
+        return {}
+
+def save_score_cache(cache):
+    """Atomically replace the score cache file"""
+    os.makedirs(os.path.dirname(MAL_SCORE_CACHE_FILE), exist_ok=True)
+    tmp_path = f"{MAL_SCORE_CACHE_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp_path, MAL_SCORE_CACHE_FILE)
+
+def is_fresh(entry, now, ttl_days=MAL_SCORE_TTL_DAYS):
+    """True when a cache entry was fetched within the TTL"""
+    try:
+        fetched_at = datetime.fromisoformat(entry['fetched_at'])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return now - fetched_at < timedelta(days=ttl_days)
+
+def stale_score_ids(mal_ids, cache, now=None):
+    """Sorted ids that are missing from the score cache or past its TTL"""
+    now = now or datetime.now()
+    return sorted({mal_id for mal_id in mal_ids if not is_fresh(cache.get(str(mal_id)), now)})
+
+def saved_mal_ids():
+    """Every mal_id in the data files the previous run saved"""
+    mal_ids = set()
+    for file_path in MAL_DATA_FILES:
+        if os.path.exists(file_path):
+            with open(file_path, 'r', encoding='utf-8') as f:
+                mal_ids.update(a['mal_id'] for a in json.load(f) if a.get('mal_id'))
+    return mal_ids
+
+def needs_bulk_refresh(mal_ids, cache):
+    """True when enough ids are stale for the seasonal listings to beat per-id lookups"""
+    return len(stale_score_ids(mal_ids, cache)) >= BULK_MIN_IDS
+
+def refresh_score_cache(mal_ids, cache, workers=JIKAN_WORKERS, seasons=None, seasonal_scores=None):
+    """
+    Fetch scores for every id that is missing from the cache or past its TTL.
+
+    With `seasons` ((season, year) pairs), those Jikan seasonal listings are
+    paged first (25 titles per request) and only ids they do not cover fall
+    back to per-id lookups; `seasonal_scores` supplies listings that were
+    already fetched. Requests run on a small thread pool; the shared Jikan
+    limiter sets the pace. The per-id lookups need the final id list, so they
+    start only after the listings are in. Failed lookups are left out of the
+    cache so they are retried next run.
+    """
+    now = datetime.now()
+    stale_ids = stale_score_ids(mal_ids, cache, now)
+    print(f"MAL score cache: {len(set(mal_ids)) - len(stale_ids)} fresh, {len(stale_ids)} to fetch")
+    if not stale_ids:
+        return 0
+
+    fetched = 0
+    if seasonal_scores is None and seasons and len(stale_ids) >= BULK_MIN_IDS:
+        seasonal_scores = fetch_seasonal_scores(seasons, workers=workers)
+    if seasonal_scores:
+        remaining = []
+        for mal_id in stale_ids:
+            if mal_id in seasonal_scores:
+                cache[str(mal_id)] = {'fetched_at': now.isoformat(), 'scores': seasonal_scores[mal_id]}
+                fetched += 1
             else:
-                print(f"Error fetching MAL data for ID {mal_id}: {response.status_code}")
-                return None
-                
-        except requests.RequestException as e:
-            print(f"Request error for MAL ID {mal_id}: {e}")
-            if attempt < retry_count - 1:
-                time.sleep(1)
-    
-    return None
-
-def update_anime_with_mal_scores(anime_data_file):
+                remaining.append(mal_id)
+        stale_ids = remaining
+        print(f"Seasonal listings covered {fetched} ids, {len(stale_ids)} left for per-id lookups")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i, (mal_id, mal_data) in enumerate(
+            zip(stale_ids, executor.map(fetch_mal_score, stale_ids)), start=1
+        ):
+            if mal_data:
+                cache[str(mal_id)] = {'fetched_at': now.isoformat(), 'scores': mal_data}
+                fetched += 1
+            if i % 50 == 0 or i == len(stale_ids):
+                print(f"Fetched MAL data for {i}/{len(stale_ids)} ids ({fetched} scores cached this run)")
+    return fetched
+
+def apply_cached_scores(anime_data, cache):
+    """Copy cached scores onto every entry with a mal_id; returns (updated, skipped)"""
+    updated_count = 0
+    skipped_count = 0
+    for anime in anime_data:
+        entry = cache.get(str(anime.get('mal_id')))
+        if not anime.get('mal_id') or not entry:
+            skipped_count += 1
+            continue
+        anime.update(entry['scores'])
+        updated_count += 1
+    return updated_count, skipped_count
+
+def enrich_with_mal_scores(anime_lists, seasonal_scores=None, seasons=None):
+    """
+    Add MAL scores in memory to every entry of `anime_lists` that has a mal_id.
+
+    Shared ids are looked up once; the score cache is saved, the lists are not.
+    `seasons` and `seasonal_scores` are passed on to refresh_score_cache.
+    """
+    score_cache = load_score_cache()
+    mal_ids = {a['mal_id'] for anime_list in anime_lists for a in anime_list if a.get('mal_id')}
+    refresh_score_cache(mal_ids, score_cache, seasons=seasons, seasonal_scores=seasonal_scores)
+    save_score_cache(score_cache)
+
+    updated_count = 0
+    for anime_list in anime_lists:
+        updated_count += apply_cached_scores(anime_list, score_cache)[0]
+    return updated_count
+
+def update_anime_with_mal_scores(anime_data_file, score_cache=None, seasons=None):
     """Update existing anime data with MAL scores"""
     # Load existing anime data
     with open(anime_data_file, 'r', encoding='utf-8') as f:
         anime_data = json.load(f)
-    
-    updated_count = 0
-    skipped_count = 0
-    
+
     print(f"Updating {len(anime_data)} anime with MAL scores...")
-    
-    for i, anime in enumerate(anime_data):
-        mal_id = anime.get('mal_id')
-        
-        # Skip if no MAL ID or already has MAL score
-        if not mal_id or anime.get('mal_score') is not None:
-            skipped_count += 1
-            continue
-        
-        print(f"Fetching MAL data for {anime['name']} (MAL ID: {mal_id}) [{i+1}/{len(anime_data)}]")
-        
-        mal_data = fetch_mal_score(mal_id)
-        if mal_data:
-            anime.update(mal_data)
-            updated_count += 1
-        
-        # Rate limit: Jikan API allows 3 requests per second
-        time.sleep(0.35)  # ~2.8 requests per second to be safe
-    
+
+    if score_cache is None:
+        score_cache = load_score_cache()
+        refresh_score_cache([a['mal_id'] for a in anime_data if a.get('mal_id')], score_cache, seasons=seasons)
+        save_score_cache(score_cache)
+
+    updated_count, skipped_count = apply_cached_scores(anime_data, score_cache)
+
     print(f"\nUpdated {updated_count} anime with MAL scores")
-    print(f"Skipped {skipped_count} anime (no MAL ID or already has score)")
-    
+    print(f"Skipped {skipped_count} anime (no MAL ID or no score available)")
+
     # Save updated data
     with open(anime_data_file, 'w', encoding='utf-8') as f:
         json.dump(anime_data, f, ensure_ascii=False, indent=2)
-    
+    anime_db.mirror_list_file(anime_data_file, anime_data)
+
     return anime_data
 
-def update_all_anime_files():
-    """Update all anime data files with MAL scores"""
-    data_files = [
-        'data/anime_data.json',
-        'data/other_anime_sorted.json',
-        'data/upcoming_seasonal_anime.json'
-    ]
-    
-    for file_path in data_files:
-        if os.path.exists(file_path):
-            print(f"\nUpdating {file_path}...")
-            update_anime_with_mal_scores(file_path)
-        else:
+def update_all_anime_files(seasons=None):
+    """
+    Update all anime data files with MAL scores, fetching each mal_id at most once.
+
+    `seasons` are the (season, year) listings to page before per-id lookups.
+    """
+    existing_files = []
+    for file_path in MAL_DATA_FILES:
+        if not os.path.exists(file_path):
             print(f"File not found: {file_path}")
+            continue
+        existing_files.append(file_path)
+
+    score_cache = load_score_cache()
+    refresh_score_cache(saved_mal_ids(), score_cache, seasons=seasons)
+    save_score_cache(score_cache)
+
+    for file_path in existing_files:
+        print(f"\nUpdating {file_path}...")
+        update_anime_with_mal_scores(file_path, score_cache)
+
+    print(jikan_limiter.summary())
 
 if __name__ == "__main__":
-    update_all_anime_files()
\ No newline at end of file
+    # Only the command line needs the season calendar; fetch_anime_data imports
+    # this module and passes its own seasons in.
+    from fetch_anime_data import get_current_season, get_next_season
+    update_all_anime_files(seasons=[(get_current_season(), datetime.now().year), get_next_season()])
+    if active_cassette is not None:
+        print(active_cassette.summary())
@@ -10,9 +10,13 @@ import os
 from datetime import datetime
 from urllib.parse import quote
 
+import anime_db
+
 CATALOG_FILE = "data/all_anime_catalog.json"
 OUTPUT_FILE = "all-anime.html"
 ICON_BASE = "assets/icons"
+# Bookkeeping fields kept in the catalog file but not shipped to the page
+INTERNAL_FIELDS = {"fetched_at"}
 
 
 def get_current_season():
@@ -81,7 +85,11 @@ def generate_html(catalog):
 
     # Embed catalog as JSON (sorted by popularity descending)
     catalog_sorted = sorted(catalog, key=lambda x: x.get("popularity", 0), reverse=True)
-    catalog_json = json.dumps(catalog_sorted, ensure_ascii=False)
+    catalog_public = [
+        {key: value for key, value in anime.items() if key not in INTERNAL_FIELDS}
+        for anime in catalog_sorted
+    ]
+    catalog_json = json.dumps(catalog_public, ensure_ascii=False)
 
     html = f"""<!DOCTYPE html>
 <html lang="en">
@@ -860,7 +868,25 @@ def generate_html(catalog):
     return html
 
 
+def write_page(catalog):
+    html = generate_html(catalog)
+
+    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
+        f.write(html)
+
+    print(f"Generated {OUTPUT_FILE} ({os.path.getsize(OUTPUT_FILE) // 1024} KB)")
+
+
 def main():
+    db = anime_db.from_environment()
+    if db is not None:
+        # Indexed popularity order straight from the SQLite store
+        with db:
+            catalog = db.catalog_by_popularity()
+        print(f"Loaded {len(catalog)} anime from {db.path}")
+        write_page(catalog)
+        return
+
     if not os.path.exists(CATALOG_FILE):
         print(f"ERROR: {CATALOG_FILE} not found.")
         print("Run 'python scripts/fetch_all_anime.py --full' to build the initial catalog.")
@@ -874,13 +900,7 @@ def main():
         catalog = json.load(f)
 
     print(f"Loaded {len(catalog)} anime from catalog")
-
-    html = generate_html(catalog)
-
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        f.write(html)
-
-    print(f"Generated {OUTPUT_FILE} ({os.path.getsize(OUTPUT_FILE) // 1024} KB)")
+    write_page(catalog)
 
 
 if __name__ == '__main__':
@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 import html as html_lib
 import json
+from contextlib import nullcontext
 from datetime import datetime, timedelta
 import os
 import re
 
+import anime_db
+
 NINE_ANIME_SEARCH_BASE = "https://9anime.me.uk/"
 PRIME_VIDEO_SEARCH_BASE = "https://www.primevideo.com/region/na/search/ref=atv_nb_sug"
 PRIME_VIDEO_ICON = "https://www.google.com/s2/favicons?domain=primevideo.com&sz=32"
@@ -238,24 +241,40 @@ def find_9anime_link(anime_name, english_title, nine_anime_links):
 
     return ""
 
-def load_data():
-    """Load anime data and metadata"""
+def read_anime_list(path, db=None):
+    """Load a fetched anime list from its JSON file, or from the SQLite store when `db` is given"""
+    if db is not None:
+        return normalize_anime_list(db.load_list(os.path.splitext(os.path.basename(path))[0]))
+    with open(path, 'r', encoding='utf-8') as f:
+        return normalize_anime_list(json.load(f))
+
+def releases_on(anime_data, date, db=None):
+    """Anime releasing an episode on `date`, including final episodes (end_date), in list order"""
+    if db is not None:
+        return normalize_anime_list(db.releases_on('anime_data', date))
+    return [
+        anime for anime in anime_data
+        if anime.get('release_date') == date or anime.get('end_date') == date
+    ]
+
+def load_data(db=None):
+    """Load anime data and metadata (fetched lists come from the SQLite store when `db` is given)"""
     try:
-        with open('data/anime_data.json', 'r', encoding='utf-8') as f:
-            anime_data = normalize_anime_list(json.load(f))
+        anime_data = read_anime_list('data/anime_data.json', db)
         
-        with open('data/other_anime_sorted.json', 'r', encoding='utf-8') as f:
-            other_anime_sorted = normalize_anime_list(json.load(f))
+        other_anime_sorted = read_anime_list('data/other_anime_sorted.json', db)
         
-        with open('data/metadata.json', 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
+        if db is not None:
+            metadata = db.get_document('metadata', {})
+        else:
+            with open('data/metadata.json', 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
         
         # Load upcoming seasonal anime
         upcoming_anime = []
         upcoming_path = 'data/upcoming_seasonal_anime.json'
-        if os.path.exists(upcoming_path):
-            with open(upcoming_path, 'r', encoding='utf-8') as f:
-                upcoming_anime = normalize_anime_list(json.load(f))
+        if db is not None or os.path.exists(upcoming_path):
+            upcoming_anime = read_anime_list(upcoming_path, db)
         
         # Load manual streaming links
         manual_streaming_links = {}
@@ -267,16 +286,14 @@ def load_data():
         # Load recently finished anime
         recently_finished_anime = []
         recently_finished_path = 'data/recently_finished_anime.json'
-        if os.path.exists(recently_finished_path):
-            with open(recently_finished_path, 'r', encoding='utf-8') as f:
-                recently_finished_anime = normalize_anime_list(json.load(f))
+        if db is not None or os.path.exists(recently_finished_path):
+            recently_finished_anime = read_anime_list(recently_finished_path, db)
 
         # Load calendar history
         calendar_history = []
         calendar_history_path = 'data/calendar_history.json'
-        if os.path.exists(calendar_history_path):
-            with open(calendar_history_path, 'r', encoding='utf-8') as f:
-                calendar_history = normalize_anime_list(json.load(f))
+        if db is not None or os.path.exists(calendar_history_path):
+            calendar_history = read_anime_list(calendar_history_path, db)
 
         # Load 9anime links
         nine_anime_links = {}
@@ -328,8 +345,13 @@ def filter_recently_finished(anime_list, today_date, days=14):
 
 def generate_html():
     """Generate static HTML file"""
-    anime_data, other_anime_sorted, metadata, upcoming_anime, manual_streaming_links, recently_finished_anime, calendar_history, nine_anime_links = load_data()
-    
+    db = anime_db.from_environment()
+    with db or nullcontext():
+        anime_data, other_anime_sorted, metadata, upcoming_anime, manual_streaming_links, recently_finished_anime, calendar_history, nine_anime_links = load_data(db)
+        today_date = metadata.get('today_date', datetime.now().strftime('%Y-%m-%d'))
+        tomorrow_date = metadata.get('tomorrow_date', (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d'))
+        todays_releases = releases_on(anime_data, today_date, db)
+        tomorrows_releases = releases_on(anime_data, tomorrow_date, db)
     
     if not anime_data:
         print("No anime data found")
@@ -344,8 +366,6 @@ def generate_html():
             if url:
                 nine_anime_by_id[str(aid)] = url
 
-    today_date = metadata.get('today_date', datetime.now().strftime('%Y-%m-%d'))
-    tomorrow_date = metadata.get('tomorrow_date', (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d'))
     last_updated = metadata.get('last_updated', datetime.now().isoformat())
     recently_finished_anime = filter_recently_finished(recently_finished_anime, today_date)
     
@@ -404,38 +424,36 @@ def generate_html():
                     <div class="anime-grid today-grid">
 """
     
-    # Add today's releases
-    for anime in anime_data:
-        # Include anime if release_date is today OR if end_date is today (for final episodes)
-        if anime.get('release_date') == today_date or anime.get('end_date') == today_date:
-            custom_link = custom_links.get(anime['name'], anime['site_url'])
-            link_domain = custom_link.split('//')[1].split('/')[0] if '//' in custom_link else 'anilist.co'
-
-            # Get manual streaming links if they exist
-            manual_links = normalize_streaming_links(
-                manual_streaming_links.get(anime['name'], []),
-                anime.get('name', ''),
-                anime.get('english_title', ''),
-            )
-            all_streaming_links = anime.get('streaming_links', []) + manual_links
-
-            # Remove duplicates based on site name
-            seen_sites = set()
-            unique_links = []
-            for link in all_streaming_links:
-                if link['site'] not in seen_sites:
-                    seen_sites.add(link['site'])
-                    unique_links.append(link)
-
-            # Build streaming links HTML
-            streaming_links_html = ""
-            if unique_links:
-                streaming_links_html = '<div class="streaming-links-overlay">'
-                for link in unique_links:
-                    streaming_links_html += f'<a href="{link["url"]}" target="_blank" data-tooltip="{link["site"]}" class="streaming-link"><img src="{link["icon"]}" alt="{link["site"]}"></a>'
-                streaming_links_html += '</div>'
-
-            html_content += f"""                        <div class="anime-card today-card" data-name="{escape_attr(anime['name'])}" data-link="{escape_attr(custom_link)}" data-anime-id="{anime['id']}" data-release="{escape_attr(anime.get('release_date', ''))}" data-site-url="{escape_attr(anime['site_url'])}" data-poster="{escape_attr(anime['poster_url'])}"{trailer_data_attrs(anime)}>
+    # Add today's releases (and final episodes)
+    for anime in todays_releases:
+        custom_link = custom_links.get(anime['name'], anime['site_url'])
+        link_domain = custom_link.split('//')[1].split('/')[0] if '//' in custom_link else 'anilist.co'
+
+        # Get manual streaming links if they exist
+        manual_links = normalize_streaming_links(
+            manual_streaming_links.get(anime['name'], []),
+            anime.get('name', ''),
+            anime.get('english_title', ''),
+        )
+        all_streaming_links = anime.get('streaming_links', []) + manual_links
+
+        # Remove duplicates based on site name
+        seen_sites = set()
+        unique_links = []
+        for link in all_streaming_links:
+            if link['site'] not in seen_sites:
+                seen_sites.add(link['site'])
+                unique_links.append(link)
+
+        # Build streaming links HTML
+        streaming_links_html = ""
+        if unique_links:
+            streaming_links_html = '<div class="streaming-links-overlay">'
+            for link in unique_links:
+                streaming_links_html += f'<a href="{link["url"]}" target="_blank" data-tooltip="{link["site"]}" class="streaming-link"><img src="{link["icon"]}" alt="{link["site"]}"></a>'
+            streaming_links_html += '</div>'
+
+        html_content += f"""                        <div class="anime-card today-card" data-name="{escape_attr(anime['name'])}" data-link="{escape_attr(custom_link)}" data-anime-id="{anime['id']}" data-release="{escape_attr(anime.get('release_date', ''))}" data-site-url="{escape_attr(anime['site_url'])}" data-poster="{escape_attr(anime['poster_url'])}"{trailer_data_attrs(anime)}>
                             <div class="card-image-wrapper">
                                 <img class="anime-poster" src="{escape_attr(anime['poster_url'])}" alt="{escape_attr(anime['name'])} poster">
                                 {build_trailer_overlay(anime)}
@@ -454,19 +472,19 @@ def generate_html():
                             </div>
                             <div class="card-info">"""
 
-            if anime.get('english_title'):
-                html_content += f"""                                <div class="anime-english-title">{anime['english_title']}</div>"""
+        if anime.get('english_title'):
+            html_content += f"""                                <div class="anime-english-title">{anime['english_title']}</div>"""
 
-            # Check if 9anime link exists for Today's section
-            nine_anime_url = find_9anime_link(anime['name'], anime.get('english_title'), nine_anime_links)
-            nine_anime_button = ''
-            if nine_anime_url:
-                nine_anime_button = f"""
+        # Check if 9anime link exists for Today's section
+        nine_anime_url = find_9anime_link(anime['name'], anime.get('english_title'), nine_anime_links)
+        nine_anime_button = ''
+        if nine_anime_url:
+            nine_anime_button = f"""
                                     <a href="{nine_anime_url}" target="_blank" class="nine-anime-btn">
                                         9anime
                                     </a>"""
 
-            html_content += f"""                                <h3 class="anime-title">{anime['name']}</h3>
+        html_content += f"""                                <h3 class="anime-title">{anime['name']}</h3>
                                 <div class="episode-info">
                                     <span class="episode-badge">Episode {anime['episode']}</span>
                                     <a href="{custom_link}" target="_blank" class="main-link-btn">
@@ -487,41 +505,39 @@ def generate_html():
                     <div class="anime-grid tomorrow-grid">
 """
     
-    # Add tomorrow's releases
-    for anime in anime_data:
-        # Include anime if release_date is tomorrow OR if end_date is tomorrow (for final episodes)
-        if anime.get('release_date') == tomorrow_date or anime.get('end_date') == tomorrow_date:
-            custom_link = custom_links.get(anime['name'], anime['site_url'])
-            link_domain = custom_link.split('//')[1].split('/')[0] if '//' in custom_link else 'anilist.co'
-
-            # Get manual streaming links if they exist
-            manual_links = normalize_streaming_links(
-                manual_streaming_links.get(anime['name'], []),
-                anime.get('name', ''),
-                anime.get('english_title', ''),
-            )
-            all_streaming_links = anime.get('streaming_links', []) + manual_links
-
-            # Remove duplicates based on site name
-            seen_sites = set()
-            unique_links = []
-            for link in all_streaming_links:
-                if link['site'] not in seen_sites:
-                    seen_sites.add(link['site'])
-                    unique_links.append(link)
-
-            # Build streaming links HTML
-            streaming_links_html = ""
-            if unique_links:
-                streaming_links_html = '<div class="streaming-links-overlay">'
-                for link in unique_links:
-                    streaming_links_html += f'<a href="{link["url"]}" target="_blank" data-tooltip="{link["site"]}" class="streaming-link"><img src="{link["icon"]}" alt="{link["site"]}"></a>'
-                streaming_links_html += '</div>'
-
-            # Add special class if 4+ streaming links
-            many_links_class = " many-streaming-links" if len(unique_links) >= 4 else ""
-
-            html_content += f"""                        <div class="anime-card tomorrow-card{many_links_class}" data-name="{escape_attr(anime['name'])}" data-link="{escape_attr(custom_link)}" data-anime-id="{anime['id']}" data-release="{escape_attr(anime.get('release_date', ''))}" data-site-url="{escape_attr(anime['site_url'])}" data-poster="{escape_attr(anime['poster_url'])}"{trailer_data_attrs(anime)}>
+    # Add tomorrow's releases (and final episodes)
+    for anime in tomorrows_releases:
+        custom_link = custom_links.get(anime['name'], anime['site_url'])
+        link_domain = custom_link.split('//')[1].split('/')[0] if '//' in custom_link else 'anilist.co'
+
+        # Get manual streaming links if they exist
+        manual_links = normalize_streaming_links(
+            manual_streaming_links.get(anime['name'], []),
+            anime.get('name', ''),
+            anime.get('english_title', ''),
+        )
+        all_streaming_links = anime.get('streaming_links', []) + manual_links
+
+        # Remove duplicates based on site name
+        seen_sites = set()
+        unique_links = []
+        for link in all_streaming_links:
+            if link['site'] not in seen_sites:
+                seen_sites.add(link['site'])
+                unique_links.append(link)
+
+        # Build streaming links HTML
+        streaming_links_html = ""
+        if unique_links:
+            streaming_links_html = '<div class="streaming-links-overlay">'
+            for link in unique_links:
+                streaming_links_html += f'<a href="{link["url"]}" target="_blank" data-tooltip="{link["site"]}" class="streaming-link"><img src="{link["icon"]}" alt="{link["site"]}"></a>'
+            streaming_links_html += '</div>'
+
+        # Add special class if 4+ streaming links
+        many_links_class = " many-streaming-links" if len(unique_links) >= 4 else ""
+
+        html_content += f"""                        <div class="anime-card tomorrow-card{many_links_class}" data-name="{escape_attr(anime['name'])}" data-link="{escape_attr(custom_link)}" data-anime-id="{anime['id']}" data-release="{escape_attr(anime.get('release_date', ''))}" data-site-url="{escape_attr(anime['site_url'])}" data-poster="{escape_attr(anime['poster_url'])}"{trailer_data_attrs(anime)}>
                             <div class="card-image-wrapper">
                                 <img class="anime-poster" src="{escape_attr(anime['poster_url'])}" alt="{escape_attr(anime['name'])} poster">
                                 {build_trailer_overlay(anime)}
@@ -540,19 +556,19 @@ def generate_html():
                             </div>
                             <div class="card-info">"""
 
-            if anime.get('english_title'):
-                html_content += f"""                                <div class="anime-english-title">{anime['english_title']}</div>"""
+        if anime.get('english_title'):
+            html_content += f"""                                <div class="anime-english-title">{anime['english_title']}</div>"""
 
-            # Check if 9anime link exists for Tomorrow's section
-            nine_anime_url = find_9anime_link(anime['name'], anime.get('english_title'), nine_anime_links)
-            nine_anime_button = ''
-            if nine_anime_url:
-                nine_anime_button = f"""
+        # Check if 9anime link exists for Tomorrow's section
+        nine_anime_url = find_9anime_link(anime['name'], anime.get('english_title'), nine_anime_links)
+        nine_anime_button = ''
+        if nine_anime_url:
+            nine_anime_button = f"""
                                     <a href="{nine_anime_url}" target="_blank" class="nine-anime-btn">
                                         9anime
                                     </a>"""
 
-            html_content += f"""                                <h3 class="anime-title">{anime['name']}</h3>
+        html_content += f"""                                <h3 class="anime-title">{anime['name']}</h3>
                                 <div class="episode-info">
                                     <span class="episode-badge">Episode {anime['episode']}</span>
                                     <a href="{custom_link}" target="_blank" class="main-link-btn">
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Process-wide token-bucket rate limiting for API clients.
+
+The bucket refills at a steady rate derived from the server's advertised
+per-minute limit, so requests are spread evenly across the window instead of
+bursting until the server starts answering 429.
+"""
+import threading
+import time
+
+from collections import defaultdict
+
+WINDOW_SECONDS = 60
+SAFETY_MARGIN = 0.95
+
+
+class RateLimiter:
+    """Thread-safe token bucket seeded from X-RateLimit-* response headers."""
+
+    def __init__(self, name, requests_per_minute, burst=2):
+        self.name = name
+        self.burst = burst
+        self.limit = None
+        self.rate = 0.0
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._pause_reason = None
+        self._requests = 0
+        self._wait_seconds = defaultdict(float)
+        self._wait_counts = defaultdict(int)
+        self.set_limit(requests_per_minute)
+
+    def set_limit(self, requests_per_minute):
+        """Change the sustained rate, e.g. when the server reports a different limit."""
+        with self._lock:
+            if requests_per_minute == self.limit or requests_per_minute <= 0:
+                return
+            self._refill(time.monotonic())
+            self.limit = requests_per_minute
+            self.rate = requests_per_minute * SAFETY_MARGIN / WINDOW_SECONDS
+
+    def _refill(self, now):
+        if now > self._updated_at:
+            elapsed = now - self._updated_at
+            self._tokens = min(float(self.burst), self._tokens + elapsed * self.rate)
+            self._updated_at = now
+
+    def _record_wait(self, reason, seconds):
+        self._wait_seconds[reason] += seconds
+        self._wait_counts[reason] += 1
+
+    def acquire(self):
+        """Block until a request may be sent, then consume one token."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            self._requests += 1
+
+            ready_at = max(now, self._updated_at)
+            if self._tokens < 0:
+                ready_at += -self._tokens / self.rate
+            reason = self._pause_reason if self._paused_until > now else 'pacing'
+            wait = ready_at - now
+            if wait > 0:
+                self._record_wait(reason, wait)
+
+        if wait > 0:
+            time.sleep(wait)
+
+        # A 429 seen by another thread while we slept pushes everyone back.
+        while True:
+            with self._lock:
+                remaining_pause = self._paused_until - time.monotonic()
+                if remaining_pause <= 0:
+                    return
+                self._record_wait(self._pause_reason, remaining_pause)
+            time.sleep(remaining_pause)
+
+    def pause(self, seconds, reason='retry_after'):
+        """Hold every caller for `seconds`, e.g. after a 429 with Retry-After."""
+        if seconds <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            until = now + seconds
+            if until <= self._paused_until:
+                return
+            self._refill(now)
+            self._paused_until = until
+            self._pause_reason = reason
+            self._tokens = min(self._tokens, 1.0)
+            self._updated_at = max(self._updated_at, until)
+            print(f"{self.name} rate limiter pausing {seconds:.1f}s ({reason})")
+
+    def update_from_headers(self, limit, remaining, reset_in):
+        """
+        Re-seed the bucket from the server's view of the current window.
+
+        `limit` is the per-minute budget, `remaining` the requests left in this
+        window and `reset_in` the seconds until it resets (any may be None).
+        """
+        if limit:
+            self.set_limit(limit)
+        if remaining is None:
+            return
+
+        if remaining <= 0:
+            wait = reset_in if reset_in is not None else WINDOW_SECONDS / max(self.limit, 1)
+            self.pause(wait, reason='reset')
+            return
+
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, float(remaining))
+
+    def stats(self):
+        """Return counters describing how much time was spent waiting and why."""
+        with self._lock:
+            return {
+                'name': self.name,
+                'limit_per_minute': self.limit,
+                'requests': self._requests,
+                'total_wait_seconds': round(sum(self._wait_seconds.values()), 2),
+                'wait_seconds': {k: round(v, 2) for k, v in self._wait_seconds.items()},
+                'wait_counts': dict(self._wait_counts),
+            }
+
+    def summary(self):
+        """One-line human readable version of stats() for script logs."""
+        stats = self.stats()
+        reasons = ', '.join(
+            f"{reason} {seconds:.1f}s/{stats['wait_counts'][reason]}x"
+            for reason, seconds in sorted(stats['wait_seconds'].items())
+        ) or 'none'
+        return (
+            f"{stats['name']} rate limiter: {stats['requests']} requests at "
+            f"{stats['limit_per_minute']}/min, waited {stats['total_wait_seconds']:.1f}s ({reasons})"
+        )
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Content-addressed on-disk cache for AniList GraphQL responses.
+
+Responses are gzip-compressed under CACHE_DIR, keyed by a hash of the
+endpoint, the query text and its variables. Each entry lives for the TTL of
+the query families it belongs to; callers name them explicitly with
+`with request_families(...)` (fetch_batch does so from each PagedQuery's
+cache_family), and untagged requests use DEFAULT_TTL. The directory is
+trimmed back under MAX_CACHE_BYTES by evicting the least recently used entries.
+
+Modes:
+  off      never read or write the cache (default)
+  read     serve fresh entries, fetch and store everything else
+  refresh  ignore existing entries, fetch and store everything
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+CACHE_DIR = os.path.join(".cache", "responses")
+CACHE_MODES = ('off', 'read', 'refresh')
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+
+HOUR = 60 * 60
+# Seconds an entry stays fresh per query family; a batch mixing several
+# families uses the shortest of their TTLs.
+FAMILY_TTLS = {
+    # Airing, recently finished and current-season lists
+    'current': HOUR,
+    # Lookups by id (changed titles, stale catalog entries, manual additions)
+    'ids': HOUR,
+    # Next season's announcements
+    'upcoming': 6 * HOUR,
+    # Full-scan window sizes and pages; historical ranges rarely move
+    'window_totals': 24 * HOUR,
+    'window': 24 * HOUR,
+    # Full-scan change fingerprints must see recent edits
+    'window_fingerprint': HOUR,
+}
+DEFAULT_FAMILY = 'default'
+DEFAULT_TTL = HOUR
+
+_mode = 'off'
+_lock = threading.Lock()
+_context = threading.local()
+_stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+
+def set_mode(mode):
+    """Select how anilist_request uses the cache for the rest of the process."""
+    global _mode
+    if mode not in CACHE_MODES:
+        raise ValueError(f"Unknown cache mode {mode!r}; expected one of {', '.join(CACHE_MODES)}")
+    _mode = mode
+
+
+def get_mode():
+    return _mode
+
+
+def cache_key(endpoint, query, variables):
+    """Hash of the endpoint, the whitespace-normalised query text and the sorted variables."""
+    payload = json.dumps(
+        {'endpoint': endpoint, 'query': ' '.join(query.split()), 'variables': variables or {}},
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def entry_path(key):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.json.gz")
+
+
+@contextmanager
+def request_families(families):
+    """Tag the requests this thread sends inside the block with their query families."""
+    previous = getattr(_context, 'families', None)
+    _context.families = set(families)
+    try:
+        yield
+    finally:
+        _context.families = previous
+
+
+def current_families():
+    return getattr(_context, 'families', None) or {DEFAULT_FAMILY}
+
+
+def families_ttl(families):
+    """TTL of a request covering `families`: the shortest of theirs."""
+    return min(FAMILY_TTLS.get(family, DEFAULT_TTL) for family in families)
+
+
+def lookup(endpoint, query, variables):
+    """Return the cached payload for a query, or None on a miss or stale entry."""
+    if _mode != 'read':
+        return None
+
+    path = entry_path(cache_key(endpoint, query, variables))
+    try:
+        age = time.time() - os.path.getmtime(path)
+        if age > families_ttl(current_families()):
+            payload = None
+        else:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                payload = json.load(f)['response']
+    except (OSError, ValueError, KeyError):
+        payload = None
+
+    with _lock:
+        _stats['hits' if payload is not None else 'misses'] += 1
+    if payload is not None:
+        # atime drives LRU eviction; mtime stays the store time the TTL is measured from.
+        try:
+            os.utime(path, (time.time(), os.path.getmtime(path)))
+        except OSError:
+            pass
+    return payload
+
+
+def store(endpoint, query, variables, payload):
+    """Persist a successful response; error and partial responses are not cached."""
+    if _mode == 'off' or not payload or not payload.get('data') or payload.get('errors'):
+        return
+
+    path = entry_path(cache_key(endpoint, query, variables))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump({'families': sorted(current_families()), 'response': payload}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    with _lock:
+        _stats['stores'] += 1
+
+
+def _entries():
+    if not os.path.isdir(CACHE_DIR):
+        return []
+    entries = []
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            if not name.endswith('.json.gz'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+    return entries
+
+
+def evict(max_bytes=MAX_CACHE_BYTES):
+    """Delete least recently used entries until the cache fits in max_bytes."""
+    entries = _entries()
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    with _lock:
+        _stats['evictions'] += removed
+    return removed
+
+
+def summary():
+    """One-line description of cache activity for script logs."""
+    with _lock:
+        stats = dict(_stats)
+    return (
+        f"Response cache ({_mode}): {stats['hits']} hits, {stats['misses']} misses, "
+        f"{stats['stores']} stored, {stats['evictions']} evicted"
+    )
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Per-run archive of the AniList media each fetch run processed.
+
+Every run of fetch_anime_data.py writes the complete media objects it fed into
+processing (current, upcoming and manual families) to a gzip-compressed NDJSON
+file partitioned by date, e.g. `.cache/archive/2024-05-01/20240501T080012345678Z.ndjson.gz`.
+`fetch_anime_data.py --reprocess <run-id>` rebuilds the data files from such a
+file without touching the network, as of the time the run started.
+"""
+import glob
+import gzip
+import json
+import os
+import shutil
+import threading
+
+from datetime import datetime, timedelta, timezone
+
+ARCHIVE_DIR = os.path.join(".cache", "archive")
+ARCHIVE_RETENTION_DAYS = 60
+
+
+# Microseconds keep ids of runs started within the same second apart
+RUN_ID_FORMAT = '%Y%m%dT%H%M%S%fZ'
+# Ids of runs archived before microseconds were added
+LEGACY_RUN_ID_FORMAT = '%Y%m%dT%H%M%SZ'
+
+
+def new_run_id():
+    return datetime.now(timezone.utc).strftime(RUN_ID_FORMAT)
+
+
+def run_started_at(run_id):
+    """UTC time encoded in a run id."""
+    # Legacy first: the new format would also match a legacy id, misreading its seconds
+    try:
+        started = datetime.strptime(run_id, LEGACY_RUN_ID_FORMAT)
+    except ValueError:
+        started = datetime.strptime(run_id, RUN_ID_FORMAT)
+    return started.replace(tzinfo=timezone.utc)
+
+
+def run_path(run_id):
+    partition = f"{run_id[0:4]}-{run_id[4:6]}-{run_id[6:8]}"
+    return os.path.join(ARCHIVE_DIR, partition, f"{run_id}.ndjson.gz")
+
+
+def list_runs():
+    """Archived run ids, oldest first."""
+    paths = glob.glob(os.path.join(ARCHIVE_DIR, '*', '*.ndjson.gz'))
+    return sorted(os.path.basename(path)[:-len('.ndjson.gz')] for path in paths)
+
+
+def resolve_run(run_id):
+    """Accept an exact run id or 'latest'; returns the run id or None."""
+    runs = list_runs()
+    if run_id == 'latest':
+        return runs[-1] if runs else None
+    return run_id if run_id in runs else None
+
+
+def prune_archive(retention_days=ARCHIVE_RETENTION_DAYS):
+    """Drop date partitions older than the retention window."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).strftime('%Y-%m-%d')
+    for partition in glob.glob(os.path.join(ARCHIVE_DIR, '*')):
+        if os.path.isdir(partition) and os.path.basename(partition) < cutoff:
+            shutil.rmtree(partition, ignore_errors=True)
+
+
+class RunArchive:
+    """Thread-safe writer for one run's archive file."""
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id or new_run_id()
+        self.path = run_path(self.run_id)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        # Exclusive create: a run never appends to another run's file
+        self._file = gzip.open(self.path, 'xt', encoding='utf-8')
+        self.records = 0
+
+    def record(self, family, media, source=None):
+        """Append one media object returned for `family` (by query `source`)."""
+        line = json.dumps({'family': family, 'source': source, 'media': media}, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self.records += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+        print(f"Archived {self.records} media records to {self.path}")
+
+
+def load_run(run_id):
+    """Return {family: [(media, source), ...]} for an archived run."""
+    families = {}
+    try:
+        with gzip.open(run_path(run_id), 'rt', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                families.setdefault(record['family'], []).append((record['media'], record.get('source')))
+    except (EOFError, json.JSONDecodeError) as e:
+        # A run that was interrupted leaves a truncated file; keep what was written.
+        print(f"Warning: archive {run_id} is truncated ({e}); using the records before it")
+    return families
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for batched AniList paging (split-retry and request budgets)
+"""
+import os
+import re
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from anilist_batch import MediaStore, MediaStream, fetch_batched_pages, fetch_media_by_ids, id_batch_queries
+
+ALIAS_PATTERN = re.compile(r'(\w+)_p(\d+): Page')
+
+
+class FakeAniList:
+    """Answers batched id_in queries; batches with more than `fail_above` aliases fail."""
+
+    def __init__(self, fail_above=None, fail_aliases=()):
+        self.fail_above = fail_above
+        self.fail_aliases = set(fail_aliases)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, query, variables):
+        aliases = ALIAS_PATTERN.findall(query)
+        with self._lock:
+            self.calls.append([f"{name}_p{page}" for name, page in aliases])
+        if self.fail_above is not None and len(aliases) > self.fail_above:
+            return None
+        if any(f"{name}_p{page}" in self.fail_aliases for name, page in aliases):
+            return None
+        data = {}
+        for name, page in aliases:
+            ids = variables[f"{name}_ids"]
+            data[f"{name}_p{page}"] = {
+                'pageInfo': {'hasNextPage': False, 'currentPage': int(page), 'total': len(ids)},
+                'media': [{'id': media_id} for media_id in ids],
+            }
+        return {'data': data}
+
+
+def test_failed_batch_is_split_and_retried_alone():
+    fake = FakeAniList(fail_above=1)
+    result = fetch_batched_pages(id_batch_queries(list(range(1, 151))), 'id', per_page=50, request=fake)
+    assert result['succeeded']
+    assert result['requests'] == 4
+    assert [len(call) for call in fake.calls] == [3, 1, 1, 1]
+    assert sum(len(media) for media in result['media'].values()) == 150
+
+
+def test_split_retry_happens_once_per_item():
+    fake = FakeAniList(fail_aliases={'ids_0_p1'})
+    result = fetch_batched_pages(id_batch_queries(list(range(1, 101))), 'id', per_page=50, request=fake)
+    # The failing item is retried alone once, the other one succeeds on its own
+    assert result['requests'] == 3
+    assert [len(media) for media in result['media'].values()] == [0, 50]
+
+
+def test_request_budget_counts_split_retries():
+    fake = FakeAniList(fail_above=1)
+    media_by_id = fetch_media_by_ids(list(range(1, 401)), 'id', request=fake, max_requests=3)
+    # Two packed batches fail; the budget leaves room for one of the eight retries
+    assert [len(call) for call in fake.calls] == [4, 4, 1]
+    assert len(media_by_id) == 50
+
+
+def test_media_store_merges_duplicates():
+    store = MediaStore()
+    assert store.add({'id': 1, 'title': 'A'}, 'releasing')
+    assert not store.add({'id': 1, 'episodes': 12}, 'finished')
+    assert store.get(1) == {'id': 1, 'title': 'A', 'episodes': 12}
+    assert store.sources(1) == ['releasing', 'finished']
+    assert store.duplicates() == 1
+
+
+def test_streaming_media_store_keeps_only_ids_and_sources():
+    store = MediaStore(keep_media=False)
+    assert store.add({'id': 1, 'title': 'A'}, 'releasing')
+    assert not store.add({'id': 1, 'episodes': 12}, 'finished')
+    assert store.get(1) is None
+    assert store.sources(1) == ['releasing', 'finished']
+    assert 1 in store and len(store) == 1
+
+
+def test_media_stream_yields_in_order_and_returns_result():
+    def fetch(on_media):
+        for media_id in range(5):
+            on_media({'id': media_id}, 'releasing')
+        return 'done'
+
+    stream = MediaStream(fetch, buffer_size=2)
+    assert [media['id'] for media, _ in stream] == [0, 1, 2, 3, 4]
+    assert stream.result == 'done'
+
+
+def test_media_stream_producer_stops_when_consumer_raises():
+    def fetch(on_media):
+        for media_id in range(100):
+            on_media({'id': media_id}, 'releasing')
+
+    stream = MediaStream(fetch, buffer_size=1)
+    try:
+        for media, _ in stream:
+            if media['id'] == 1:
+                raise ValueError('consumer failed')
+    except ValueError:
+        pass
+    stream._thread.join(timeout=2)
+    assert not stream._thread.is_alive()
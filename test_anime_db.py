@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Tests for the optional SQLite store and the generators reading from it
+"""
+import json
+import os
+import shutil
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+import anime_db
+import fetch_all_anime
+import generate_all_anime_html
+import generate_html
+from anime_db import AnimeDB
+from catalog_store import CatalogStore, popularity_key
+
+REPO_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def catalog_entries():
+    """Catalog entries as fetch_all_anime stores them, with popularity ties."""
+    raw = [
+        {'id': media_id, 'idMal': media_id + 100, 'popularity': popularity, 'averageScore': 70,
+         'title': {'romaji': f"Anime {media_id}", 'english': None},
+         'startDate': {'year': 2020, 'month': 1 + media_id % 12, 'day': 1},
+         'season': 'WINTER', 'seasonYear': 2020, 'format': 'TV', 'status': 'FINISHED',
+         'coverImage': {'large': f"poster{media_id}.jpg"}, 'genres': ['Action']}
+        for media_id, popularity in [(1, 500), (2, 900), (3, 500), (4, 20), (5, 900)]
+    ]
+    return [fetch_all_anime.process_anime(media) for media in raw]
+
+
+def use_data_copy(tmp_path, monkeypatch):
+    """Work in a copy of the repo's data files with ANIME_DB unset."""
+    shutil.copytree(REPO_DATA_DIR, tmp_path / 'data')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('ANIME_DB', raising=False)
+
+
+def run_cli(monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', ['anime_db.py', *args])
+    anime_db.main()
+
+
+def read_text(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def test_replace_list_round_trips_in_list_order(tmp_path):
+    items = [{'id': 3, 'name': 'C'}, {'id': 1, 'name': 'A'}, {'id': 2, 'name': 'B'}]
+    with AnimeDB(str(tmp_path / 'anime.db')) as db:
+        db.replace_list('anime_data', [{'id': 9}])
+        db.replace_list('anime_data', items)
+        db.replace_list('other_anime_sorted', [{'id': 4}])
+        assert db.load_list('anime_data') == items
+        assert db.load_list('calendar_history') == []
+
+
+def test_catalog_by_popularity_matches_popularity_key(tmp_path):
+    entries = catalog_entries()
+    with AnimeDB(str(tmp_path / 'anime.db')) as db:
+        assert db.upsert_catalog(entries[:3]) == 3
+        db.upsert_catalog(entries[2:])
+        stored = db.catalog_by_popularity()
+    assert [anime['id'] for anime in stored] == [5, 2, 3, 1, 4]
+    assert stored == sorted(entries, key=popularity_key, reverse=True)
+
+
+def test_releases_on_matches_release_or_end_date(tmp_path):
+    items = [
+        {'id': 1, 'release_date': '2026-08-22', 'end_date': None},
+        {'id': 2, 'release_date': '2026-08-15', 'end_date': '2026-08-22'},
+        {'id': 3, 'release_date': '2026-08-23', 'end_date': None},
+        {'id': 4, 'release_date': '2026-08-22', 'end_date': None},
+    ]
+    with AnimeDB(str(tmp_path / 'anime.db')) as db:
+        db.replace_list('anime_data', items)
+        db.replace_list('other_anime_sorted', [{'id': 5, 'release_date': '2026-08-22'}])
+        assert [anime['id'] for anime in db.releases_on('anime_data', '2026-08-22')] == [1, 2, 4]
+
+
+def test_import_and_export_round_trip(tmp_path, monkeypatch):
+    use_data_copy(tmp_path, monkeypatch)
+    fetch_all_anime.save_catalog(CatalogStore(catalog_entries()))
+    paths = [*anime_db.LIST_FILES.values(), *anime_db.DOCUMENT_FILES.values(), anime_db.CATALOG_FILE]
+    originals = {path: read_text(path) for path in paths}
+
+    run_cli(monkeypatch, 'import', '--db', 'data/anime.db')
+    for path in paths:
+        os.remove(path)
+    run_cli(monkeypatch, 'export', '--db', 'data/anime.db')
+    for path in paths:
+        assert json.loads(read_text(path)) == json.loads(originals[path]), path
+    # Written with the same layout as save_catalog, so the sync marker still holds
+    assert read_text(anime_db.CATALOG_FILE) == originals[anime_db.CATALOG_FILE]
+    with AnimeDB('data/anime.db') as db:
+        assert db.catalog_synced_with() == anime_db.file_digest(anime_db.CATALOG_FILE)
+
+
+def test_save_catalog_resyncs_a_stale_database(tmp_path, monkeypatch):
+    use_data_copy(tmp_path, monkeypatch)
+    monkeypatch.setenv('ANIME_DB', 'data/anime.db')
+    fetch_all_anime.save_catalog(CatalogStore(catalog_entries()))
+
+    # A run without ANIME_DB changes an entry the database still holds
+    monkeypatch.delenv('ANIME_DB')
+    catalog = fetch_all_anime.load_catalog()
+    catalog.upsert_many([{**catalog.get(4), 'popularity': 1000}])
+    fetch_all_anime.save_catalog(catalog)
+
+    monkeypatch.setenv('ANIME_DB', 'data/anime.db')
+    catalog = fetch_all_anime.load_catalog()
+    catalog.upsert_many([{**catalog.get(1), 'popularity': 10}])
+    fetch_all_anime.save_catalog(catalog)
+    with AnimeDB('data/anime.db') as db:
+        assert db.catalog_by_popularity() == json.loads(read_text(anime_db.CATALOG_FILE))
+
+
+def test_generators_render_the_same_pages_from_json_and_database(tmp_path, monkeypatch):
+    use_data_copy(tmp_path, monkeypatch)
+    fetch_all_anime.save_catalog(CatalogStore(catalog_entries()))
+    generate_html.generate_html()
+    generate_all_anime_html.main()
+    from_json = {path: read_text(path) for path in ('index.html', generate_all_anime_html.OUTPUT_FILE)}
+
+    run_cli(monkeypatch, 'import', '--db', 'data/anime.db')
+    # Only hand-edited inputs stay JSON; everything else must come from the database
+    for path in [*anime_db.LIST_FILES.values(), *anime_db.DOCUMENT_FILES.values(), anime_db.CATALOG_FILE]:
+        os.remove(path)
+    monkeypatch.setenv('ANIME_DB', 'data/anime.db')
+    generate_html.generate_html()
+    generate_all_anime_html.main()
+    for path, html in from_json.items():
+        assert read_text(path) == html, path
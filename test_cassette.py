@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for recording and replaying HTTP cassettes
+"""
+import json
+import os
+import sys
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+import api_client
+from cassette import Cassette, CassetteMiss
+
+URL = 'https://graphql.anilist.co'
+
+
+class StubSession:
+    """Answers every request with its JSON body echoed back and a running call count."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        response = requests.Response()
+        response.status_code = 200
+        response.headers = CaseInsensitiveDict({
+            'Content-Type': 'application/json',
+            'X-RateLimit-Remaining': str(90 - self.calls),
+        })
+        response._content = json.dumps({'echo': kwargs.get('json'), 'call': self.calls}).encode('utf-8')
+        response.encoding = 'utf-8'
+        response.url = url
+        return response
+
+
+class OfflineSession:
+    def request(self, method, url, **kwargs):
+        raise AssertionError(f"Replay reached the network for {method} {url}")
+
+
+def test_replay_serves_recorded_responses_in_order(tmp_path):
+    path = str(tmp_path / 'run.ndjson')
+    recorder = Cassette(path, 'record')
+    session = StubSession()
+    bodies = [{'query': 'a'}, {'query': 'b'}, {'query': 'a'}]
+    recorded = [recorder.request(session, 'POST', URL, json=body, timeout=15) for body in bodies]
+    assert session.calls == 3
+
+    player = Cassette(path, 'replay')
+    replayed = [player.request(OfflineSession(), 'POST', URL, json=body, timeout=15) for body in bodies]
+    for original, replay in zip(recorded, replayed):
+        assert replay.status_code == original.status_code
+        assert dict(replay.headers) == dict(original.headers)
+        assert replay.text == original.text
+    # The repeated request gets its own recording, not the first one's
+    assert [response.json()['call'] for response in replayed] == [1, 2, 3]
+    assert player.summary().endswith('3 served, 0 missing, 0 unused')
+
+
+def test_unrecorded_request_fails_without_reaching_the_network(tmp_path, monkeypatch):
+    path = str(tmp_path / 'run.ndjson')
+    Cassette(path, 'record').request(StubSession(), 'POST', URL, json={'query': 'a'})
+    player = Cassette(path, 'replay')
+
+    with pytest.raises(CassetteMiss):
+        player.request(OfflineSession(), 'POST', URL, json={'query': 'b'})
+
+    # Through the shared client too, instead of being retried into a None response
+    monkeypatch.setattr(api_client, 'active_cassette', player)
+    monkeypatch.setattr(api_client, 'get_session', OfflineSession)
+    assert api_client.send_request('POST', URL, json={'query': 'a'}).status_code == 200
+    with pytest.raises(CassetteMiss):
+        api_client.send_request('POST', URL, json={'query': 'a'})
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Tests for the id-indexed catalog store
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from catalog_store import CatalogStore, popularity_key
+
+
+def entry(anime_id, popularity, **fields):
+    return {'id': anime_id, 'popularity': popularity, 'fetched_at': '2024-05-01', **fields}
+
+
+def test_upsert_counts_added_updated_unchanged():
+    catalog = CatalogStore([entry(1, 100), entry(2, 50)])
+    counts = catalog.upsert_many([
+        entry(1, 100),                            # identical
+        entry(2, 60),                             # content changed
+        entry(3, 10),                             # new
+    ])
+    assert counts == {'added': 1, 'updated': 1, 'unchanged': 1}
+    assert catalog.dirty == {2, 3}
+    assert len(catalog) == 3 and catalog.get(2)['popularity'] == 60
+
+
+def test_volatile_only_change_counts_unchanged_but_is_stored():
+    catalog = CatalogStore([entry(1, 100)])
+    counts = catalog.upsert_many([{**entry(1, 100), 'fetched_at': '2024-06-01'}])
+    assert counts == {'added': 0, 'updated': 0, 'unchanged': 1}
+    assert catalog.dirty == {1}
+    assert catalog.get(1)['fetched_at'] == '2024-06-01'
+
+
+def test_mark_clean_forgets_dirty_ids():
+    catalog = CatalogStore()
+    catalog.upsert_many([entry(1, 100)])
+    catalog.mark_clean()
+    assert catalog.dirty == set()
+
+
+def test_iter_sorted_follows_upserts():
+    catalog = CatalogStore([entry(1, 100), entry(2, 50), entry(3, 50)])
+    assert [a['id'] for a in catalog.iter_sorted(popularity_key, reverse=True)] == [1, 3, 2]
+    catalog.upsert_many([entry(2, 200), entry(4, 75)])
+    assert [a['id'] for a in catalog.iter_sorted(popularity_key, reverse=True)] == [2, 1, 4, 3]
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Tests for the updatedAt change probe and its streamed snapshot
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+import change_probe
+from change_probe import SnapshotWriter, fetch_with_change_probe, load_snapshot
+
+FIELDS = 'id updatedAt title { romaji }'
+
+
+def write_snapshot(media_by_id):
+    writer = SnapshotWriter('test', FIELDS)
+    for media_id, media in media_by_id.items():
+        writer.add(media_id, media)
+    writer.commit()
+
+
+def test_snapshot_round_trip(monkeypatch, tmp_path):
+    monkeypatch.setattr(change_probe, 'SNAPSHOT_DIR', str(tmp_path))
+    write_snapshot({1: {'id': 1, 'title': 'A'}, 2: {'id': 2, 'title': 'B'}})
+    assert load_snapshot('test', FIELDS) == {1: {'id': 1, 'title': 'A'}, 2: {'id': 2, 'title': 'B'}}
+    assert load_snapshot('test', 'id') == {}
+
+
+def test_discarded_writer_keeps_previous_snapshot(monkeypatch, tmp_path):
+    monkeypatch.setattr(change_probe, 'SNAPSHOT_DIR', str(tmp_path))
+    write_snapshot({1: {'id': 1}})
+    writer = SnapshotWriter('test', FIELDS)
+    writer.add(2, {'id': 2})
+    writer.discard()
+    assert load_snapshot('test', FIELDS) == {1: {'id': 1}}
+    assert os.listdir(tmp_path) == ['media_snapshot_test.json']
+
+
+def test_only_changed_titles_are_fetched_and_streamed(monkeypatch, tmp_path):
+    monkeypatch.setattr(change_probe, 'SNAPSHOT_DIR', str(tmp_path))
+    write_snapshot({
+        1: {'id': 1, 'updatedAt': 10, 'title': 'A', 'popularity': 1},
+        2: {'id': 2, 'updatedAt': 10, 'title': 'B', 'popularity': 1},
+    })
+    fetched_ids = []
+
+    def fake_fetch(queries, fields, on_page=None, **kwargs):
+        if on_page is None:
+            probed = [{'id': 1, 'updatedAt': 10, 'popularity': 5}, {'id': 2, 'updatedAt': 20, 'popularity': 6}]
+            return {'media': {'releasing': probed}, 'succeeded': True, 'service_unavailable': False, 'requests': 1}
+        ids = [media_id for query in queries for media_id in query.variables['ids']]
+        fetched_ids.extend(ids)
+        on_page(queries[0], 1, [{'id': 2, 'updatedAt': 20, 'title': 'B2', 'popularity': 0}])
+        return {'media': {}, 'succeeded': True, 'service_unavailable': False, 'requests': 1}
+
+    monkeypatch.setattr(change_probe, 'fetch_batched_pages', fake_fetch)
+    streamed = []
+    result = fetch_with_change_probe([], FIELDS, 'popularity', 'test',
+                                     on_media=lambda media, name: streamed.append((media, name)))
+    assert fetched_ids == [2]
+    assert result['requests'] == 2 and result['media'] == {}
+    assert [(media['id'], media['title'], media['popularity'], name) for media, name in streamed] == [
+        (1, 'A', 5, 'releasing'), (2, 'B2', 6, 'releasing')
+    ]
+    assert load_snapshot('test', FIELDS)[2]['title'] == 'B2'
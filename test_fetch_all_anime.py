@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Tests for the all-anime catalog scan, delta and refresh logic
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+import fetch_all_anime
+from catalog_store import CatalogStore
+from fetch_all_anime import (
+    CATALOG_FILE,
+    CATALOG_LOG_FILE,
+    append_to_catalog_log,
+    collect_delta_changes,
+    date_range_query,
+    delta_scope,
+    fuzzy_date,
+    load_catalog,
+    plan_scan_windows,
+    read_catalog_log,
+    save_catalog,
+    split_range,
+    unchanged_windows,
+    window_catalog_ids,
+    window_id_hash,
+)
+
+
+def raw_media(media_id, updated_at):
+    return {'id': media_id, 'updatedAt': updated_at, 'title': {'romaji': f"Anime {media_id}"}}
+
+
+def delta_pages(pages):
+    """Fake request serving `pages` (lists of raw media) for QUERY_BY_UPDATED."""
+    calls = []
+
+    def request(query, variables):
+        calls.append(variables)
+        page = variables['page']
+        return {'data': {'Page': {
+            'pageInfo': {'hasNextPage': page < len(pages), 'currentPage': page},
+            'media': pages[page - 1],
+        }}}
+
+    return request, calls
+
+
+def test_delta_stops_at_high_water_mark():
+    request, calls = delta_pages([
+        [raw_media(1, 300), raw_media(2, 250)],
+        [raw_media(3, 200), raw_media(4, 100), raw_media(5, 90)],
+    ])
+    changed, newest, complete, pages = collect_delta_changes(150, {}, request)
+    assert [anime['id'] for anime in changed] == [1, 2, 3]
+    assert newest == 300
+    assert complete
+    assert pages == 2
+
+
+def test_delta_keeps_mark_when_page_cap_is_hit(monkeypatch):
+    monkeypatch.setattr(fetch_all_anime, 'MAX_PAGES_PER_WINDOW', 2)
+    request, _ = delta_pages([[raw_media(i, 1000 - i)] for i in range(5)])
+    changed, newest, complete, pages = collect_delta_changes(10, {}, request)
+    assert not complete
+    assert pages == 2
+    assert len(changed) == 2
+
+
+def test_delta_keeps_mark_when_request_fails():
+    changed, newest, complete, _ = collect_delta_changes(10, {}, lambda query, variables: None)
+    assert changed == [] and newest == 10 and not complete
+
+
+def test_delta_scope_matches_full_scan():
+    scope = delta_scope(date(2026, 10, 17))
+    assert scope == {'startDate': 19899999, 'endDate': 20261232}
+    request, calls = delta_pages([[]])
+    collect_delta_changes(0, scope, request)
+    assert calls[0]['startDate'] == 19899999 and calls[0]['endDate'] == 20261232
+
+
+def test_delta_without_catalog_changes_does_not_save(monkeypatch):
+    catalog = CatalogStore([{'id': 1, 'title': 'A'}])
+    saved = []
+    monkeypatch.setattr(fetch_all_anime, 'load_sync_state', lambda: {'updated_at_high_water': 10})
+    monkeypatch.setattr(fetch_all_anime, 'save_sync_state', lambda state: None)
+    monkeypatch.setattr(fetch_all_anime, 'load_catalog', lambda: catalog)
+    monkeypatch.setattr(fetch_all_anime, 'catalog_needs_save', lambda catalog: bool(catalog.dirty))
+    monkeypatch.setattr(fetch_all_anime, 'save_catalog', saved.append)
+    monkeypatch.setattr(
+        fetch_all_anime, 'collect_delta_changes',
+        lambda high_water, scope: ([{'id': 1, 'title': 'A'}], 20, True, 1)
+    )
+    fetch_all_anime.run_delta()
+    assert saved == []
+
+
+def test_split_range_bisects_without_gaps():
+    assert split_range(20200000, 20201231) == ((20200000, 20200701), (20200702, 20201231))
+    assert split_range(20200301, 20200301) is None
+    left, right = split_range(20200301, 20200302)
+    assert left == (20200301, 20200301) and right == (20200302, 20200302)
+
+
+def probe_catalog(start_dates):
+    """Fake request answering window probes with the number of start_dates in each range."""
+    alias_pattern = re.compile(r'(\w+)_p1: Page')
+
+    def request(query, variables):
+        data = {}
+        for name in alias_pattern.findall(query):
+            start, end = variables[f"{name}_startDate"] + 1, variables[f"{name}_endDate"] - 1
+            total = sum(1 for value in start_dates if start <= value <= end)
+            data[f"{name}_p1"] = {'pageInfo': {'total': total, 'hasNextPage': False}, 'media': []}
+        return {'data': data}
+
+    return request
+
+
+def test_plan_scan_windows_splits_dense_years_and_merges_sparse_ones():
+    start_dates = []
+    for year in range(2018, 2023):
+        count = 3000 if year == 2020 else 100
+        first = date(year, 1, 1)
+        days = (date(year, 12, 31) - first).days + 1
+        start_dates.extend(
+            fuzzy_date(day.year, day.month, day.day)
+            for day in (first + timedelta(days=i * days // count) for i in range(count))
+        )
+
+    windows, probe_requests = plan_scan_windows(date(2022, 6, 1), probe_catalog(start_dates), first_year=2018)
+    capacity = fetch_all_anime.MAX_PAGES_PER_WINDOW * fetch_all_anime.PER_PAGE
+    assert windows[0][0] == 20180000 and windows[-1][1] == 20221231
+    for (_, end, _), (start, _, _) in zip(windows, windows[1:]):
+        assert start == end + 1
+    assert all(total <= capacity for _, _, total in windows)
+    assert sum(total for _, _, total in windows) == len(start_dates)
+    assert len(windows) == 2
+    assert probe_requests == 2
+
+
+def test_window_catalog_ids_places_each_title_in_its_window():
+    catalog = CatalogStore([
+        {'id': 1, 'start_date': '2019-12-31'},
+        {'id': 2, 'start_date': '2020'},
+        {'id': 3, 'start_date': '2020-06'},
+        {'id': 4, 'start_date': '2021-01-01'},
+        {'id': 5, 'start_date': None},
+        {'id': 6, 'start_date': '1980-01-01'},
+    ])
+    windows = [(20200701, 20201231), (20200000, 20200630)]
+    assert window_catalog_ids(catalog, windows) == {
+        (20200000, 20200630): {2, 3},
+        (20200701, 20201231): set(),
+    }
+
+
+def test_unchanged_windows_needs_matching_fingerprint_ids_and_age():
+    catalog = CatalogStore([{'id': 1, 'start_date': '2020-05-01'}, {'id': 2, 'start_date': '2020-06-01'}])
+    planned = [(20200000, 20201231, 2)]
+    name = date_range_query(20200000, 20201231).name
+    fingerprint = {'total': 2, 'latest': [2, 500]}
+    window_ids = window_catalog_ids(catalog, [(20200000, 20201231)])
+    entry = {**fingerprint, 'id_hash': window_id_hash(window_ids[(20200000, 20201231)]), 'fetched_at': '2024-05-01'}
+    fingerprints = {(20200000, 20201231): fingerprint}
+
+    assert unchanged_windows(planned, fingerprints, {name: entry}, window_ids, date(2024, 6, 1)) == {name}
+    # AniList reports a newer edit
+    moved = {(20200000, 20201231): {'total': 2, 'latest': [1, 600]}}
+    assert unchanged_windows(planned, moved, {name: entry}, window_ids, date(2024, 6, 1)) == set()
+    # The catalog lost a title of the window
+    partial = window_catalog_ids(CatalogStore([{'id': 1, 'start_date': '2020-05-01'}]), [(20200000, 20201231)])
+    assert unchanged_windows(planned, fingerprints, {name: entry}, partial, date(2024, 6, 1)) == set()
+    # Past the refresh interval the window is fetched again
+    assert unchanged_windows(planned, fingerprints, {name: entry}, window_ids, date(2024, 9, 1)) == set()
+
+
+def scan_media(count_by_year):
+    """Raw media spread over the given years, one start date per title."""
+    media = []
+    for year, count in count_by_year.items():
+        for i in range(count):
+            media_id = len(media) + 1
+            media.append({
+                'id': media_id, 'updatedAt': 1000 + media_id, 'popularity': media_id,
+                'title': {'romaji': f"Anime {media_id}"},
+                'startDate': {'year': year, 'month': 1 + i % 12, 'day': 1 + i % 28},
+            })
+    return media
+
+
+class FakeScanAniList:
+    """Answers the scan's batched probes and window pages from `media`."""
+
+    PAGE_PATTERN = re.compile(r'(\w+)_p(\d+): Page\(page: (\d+), perPage: (\d+)\)')
+
+    def __init__(self, media):
+        self.media = media
+        self.fetched = []
+        self._lock = threading.Lock()
+
+    def __call__(self, query, variables):
+        data = {}
+        for name, _, page, per_page in self.PAGE_PATTERN.findall(query):
+            page, per_page = int(page), int(per_page)
+            if name.startswith('w'):
+                with self._lock:
+                    self.fetched.append((name, page))
+            start, end = variables[f"{name}_startDate"], variables[f"{name}_endDate"]
+            matching = [
+                media for media in self.media
+                if start < fuzzy_date(*(media['startDate'][part] for part in ('year', 'month', 'day'))) < end
+            ]
+            if name.startswith('latest'):
+                matching.sort(key=lambda media: media['updatedAt'], reverse=True)
+            data[f"{name}_p{page}"] = {
+                'pageInfo': {'total': len(matching), 'hasNextPage': page * per_page < len(matching),
+                             'currentPage': page},
+                'media': matching[(page - 1) * per_page:page * per_page],
+            }
+        return {'data': data}
+
+
+def use_scan_dir(tmp_path, monkeypatch):
+    """Run the scan in an empty working directory with small pages and no database."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('ANIME_DB', raising=False)
+    monkeypatch.setattr(fetch_all_anime, 'PER_PAGE', 2)
+    monkeypatch.setattr(fetch_all_anime, 'MAX_PAGES_PER_WINDOW', 4)
+    monkeypatch.setattr(fetch_all_anime, 'ALIASES_PER_REQUEST', 1)
+
+
+def write_log_lines(lines):
+    os.makedirs(os.path.dirname(CATALOG_LOG_FILE), exist_ok=True)
+    with open(CATALOG_LOG_FILE, 'w', encoding='utf-8') as f:
+        f.write(lines)
+
+
+def test_catalog_log_appends_and_fsyncs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(fetch_all_anime.os, 'fsync', lambda fd: (synced.append(fd), real_fsync(fd)))
+    append_to_catalog_log([{'id': 1}, {'id': 2}])
+    append_to_catalog_log([{'id': 3}])
+    assert len(synced) == 2
+    with open(CATALOG_LOG_FILE, 'r', encoding='utf-8') as f:
+        assert [json.loads(line)['id'] for line in f] == [1, 2, 3]
+
+
+def test_load_catalog_replays_log_over_snapshot(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data')
+    with open(CATALOG_FILE, 'w', encoding='utf-8') as f:
+        json.dump([{'id': 1, 'name': 'snapshot'}, {'id': 2, 'name': 'kept'}], f)
+    append_to_catalog_log([{'id': 1, 'name': 'first'}, {'id': 3, 'name': 'new'}])
+    append_to_catalog_log([{'id': 1, 'name': 'latest'}])
+    catalog = load_catalog()
+    assert catalog.get(1)['name'] == 'latest'
+    assert catalog.get(2)['name'] == 'kept' and catalog.get(3)['name'] == 'new'
+    assert catalog.dirty == {1, 3}
+
+
+def test_torn_last_log_line_is_skipped(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_log_lines('{"id": 1, "name": "A"}\n{"id": 2, "name": "B"}\n{"id": 3, "na')
+    assert [record['id'] for record in read_catalog_log()] == [1, 2]
+    assert sorted(anime['id'] for anime in load_catalog()) == [1, 2]
+
+
+def test_save_catalog_removes_log_only_after_replace(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('ANIME_DB', raising=False)
+    append_to_catalog_log([{'id': 1, 'popularity': 5}])
+    catalog = load_catalog()
+    real_replace = os.replace
+
+    def failing_replace(src, dst):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(fetch_all_anime.os, 'replace', failing_replace)
+    try:
+        save_catalog(catalog)
+    except OSError:
+        pass
+    assert os.path.exists(CATALOG_LOG_FILE) and not os.path.exists(CATALOG_FILE)
+
+    replaced = []
+
+    def checked_replace(src, dst):
+        replaced.append(os.path.exists(CATALOG_LOG_FILE))
+        real_replace(src, dst)
+
+    monkeypatch.setattr(fetch_all_anime.os, 'replace', checked_replace)
+    save_catalog(catalog)
+    assert replaced == [True]
+    assert not os.path.exists(CATALOG_LOG_FILE)
+    with open(CATALOG_FILE, 'r', encoding='utf-8') as f:
+        assert [anime['id'] for anime in json.load(f)] == [1]
+
+
+def test_full_scan_compacts_log_past_threshold(tmp_path, monkeypatch):
+    use_scan_dir(tmp_path, monkeypatch)
+    fake = FakeScanAniList(scan_media({2020: 6, 2021: 6}))
+    compacted = threading.Event()
+
+    def request(query, variables):
+        # Hold later pages until the first one has been folded into the snapshot
+        if fake.fetched:
+            compacted.wait(timeout=5)
+        return fake(query, variables)
+
+    saves = []
+    real_save = fetch_all_anime.save_catalog
+
+    def recording_save(catalog):
+        saves.append(len(fake.fetched))
+        real_save(catalog)
+        compacted.set()
+
+    monkeypatch.setattr(fetch_all_anime, 'scan_request', request)
+    monkeypatch.setattr(fetch_all_anime, 'save_catalog', recording_save)
+    compacted.set()
+    assert fetch_all_anime.run_full_scan(workers=1) == 0
+    # Under the threshold the log is only folded in once, at the end
+    assert saves == [6]
+
+    saves.clear()
+    fake.fetched.clear()
+    compacted.clear()
+    os.remove(fetch_all_anime.SCAN_MANIFEST_FILE)
+    monkeypatch.setattr(fetch_all_anime, 'CATALOG_LOG_COMPACT_BYTES', 1)
+    assert fetch_all_anime.run_full_scan(workers=1) == 0
+    # Past it, the first page is folded in while the scan goes on
+    assert saves[0] == 1
+    assert not os.path.exists(CATALOG_LOG_FILE)
+    assert len(load_catalog()) == 12
+
+
+def test_full_scan_resumes_from_saved_state(tmp_path, monkeypatch):
+    use_scan_dir(tmp_path, monkeypatch)
+    media = scan_media({2019: 6, 2020: 6, 2021: 6})
+    fake = FakeScanAniList(media)
+
+    def recorded_pages():
+        if not os.path.exists(fetch_all_anime.SCAN_STATE_FILE):
+            return 0
+        with open(fetch_all_anime.SCAN_STATE_FILE, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        return 3 * len(state['completed']) + sum(len(pages) for pages in state['pages'].values())
+
+    def interrupting_request(query, variables):
+        # Ctrl+C once four window pages are fetched and recorded in the scan state
+        if len(fake.fetched) == 4:
+            for _ in range(500):
+                if recorded_pages() == 4:
+                    break
+                time.sleep(0.01)
+            raise KeyboardInterrupt
+        return fake(query, variables)
+
+    monkeypatch.setattr(fetch_all_anime, 'scan_request', interrupting_request)
+    assert fetch_all_anime.run_full_scan(workers=1) == fetch_all_anime.EXIT_INTERRUPTED
+    with open(fetch_all_anime.SCAN_STATE_FILE, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    first, second, third = (date_range_query(start, end).name for start, end, _ in state['windows'])
+    assert fake.fetched == [(first, 1), (first, 2), (first, 3), (second, 1)]
+    assert state['completed'] == [first]
+    assert state['pages'] == {second: [1]}
+
+    calls = []
+    resumed = FakeScanAniList(media)
+
+    def counting_request(query, variables):
+        calls.append(query)
+        return resumed(query, variables)
+
+    monkeypatch.setattr(fetch_all_anime, 'scan_request', counting_request)
+    assert fetch_all_anime.run_full_scan(workers=1) == 0
+    # No re-planning, no completed window and no page fetched before the interrupt
+    assert len(calls) == 5
+    assert sorted(resumed.fetched) == sorted([(second, 2), (second, 3), (third, 1), (third, 2), (third, 3)])
+    assert not os.path.exists(fetch_all_anime.SCAN_STATE_FILE)
+    assert len(load_catalog()) == 18
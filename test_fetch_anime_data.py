@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Tests for the relevance rules of fetch_anime_data and their GraphQL pushdown
+"""
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from fetch_anime_data import (
+    DEFAULT_POPULARITY_THRESHOLD,
+    FORMAT_POPULARITY_THRESHOLDS,
+    media_filter_args,
+    popularity_threshold,
+    process_anime_entry,
+    start_year_cutoff,
+)
+
+
+def test_popularity_threshold_per_format():
+    assert popularity_threshold('TV') == DEFAULT_POPULARITY_THRESHOLD
+    assert popularity_threshold('ONA') == FORMAT_POPULARITY_THRESHOLDS['ONA']
+    assert popularity_threshold(None) == DEFAULT_POPULARITY_THRESHOLD
+
+
+def test_media_filter_args_bounds_are_inclusive():
+    # popularity_greater is exclusive on AniList
+    assert media_filter_args(2000) == 'popularity_greater: 1999, isAdult: false'
+
+
+def airing_media(start, next_airing=None, end=None):
+    """Minimal AniList media object as requested by CURRENT_MEDIA_FIELDS."""
+    return {
+        'id': 1, 'idMal': None, 'title': {'romaji': 'Test Anime', 'english': None},
+        'status': 'RELEASING', 'format': 'TV', 'popularity': 50000, 'duration': 24,
+        'episodes': 12, 'averageScore': 80, 'isAdult': False,
+        'startDate': {'year': start.year, 'month': start.month, 'day': start.day},
+        'endDate': {'year': end.year, 'month': end.month, 'day': end.day} if end else {},
+        'nextAiringEpisode': next_airing,
+        'coverImage': {'large': 'poster.jpg', 'medium': 'poster.jpg'},
+        'trailer': None, 'siteUrl': 'https://anilist.co/anime/1', 'externalLinks': [],
+    }
+
+
+def test_rules_use_the_given_now():
+    now = datetime(2024, 5, 1, 12, 0)
+    anime = airing_media(datetime(2024, 4, 3), end=datetime(2024, 4, 29))
+    # Finished two days before `now`: listed as recently finished
+    entry = process_anime_entry(anime, start_year_cutoff(now), now)
+    assert entry['recently_finished']
+    # A month later the same title has dropped off
+    later = datetime(2024, 6, 1, 12, 0)
+    assert process_anime_entry(anime, start_year_cutoff(later), later) is None
+
+
+def test_start_year_cutoff_follows_now():
+    assert start_year_cutoff(datetime(2024, 5, 1)) == 2023
+    assert start_year_cutoff(datetime(2026, 1, 1)) == 2025
+
+
+def test_start_year_cutoff_keeps_undated_titles_and_exceptions():
+    now = datetime(2024, 5, 1, 12, 0)
+    next_airing = {'airingAt': int(datetime(2024, 5, 5).timestamp()), 'episode': 1100}
+    old = airing_media(datetime(2010, 4, 1), next_airing)
+    assert process_anime_entry(old, start_year_cutoff(now), now) is None
+    # Matched by title substring, as AniList's fuzzy search would not be
+    old['title']['english'] = 'One Piece: Egghead Arc'
+    assert process_anime_entry(old, start_year_cutoff(now), now) is not None
+    undated = airing_media(datetime(2024, 4, 1), next_airing)
+    undated['startDate'] = {'year': None, 'month': None, 'day': None}
+    assert process_anime_entry(undated, start_year_cutoff(now), now) is not None
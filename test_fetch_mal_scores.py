@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Tests for the MAL score cache refresh
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+import fetch_mal_scores
+from fetch_mal_scores import refresh_score_cache
+
+
+def fake_jikan(monkeypatch):
+    calls = {'seasons': [], 'ids': []}
+
+    def fetch_seasonal_scores(seasons, workers=1):
+        calls['seasons'].append(seasons)
+        return {mal_id: {'mal_score': 8.0} for mal_id in range(1, 31)}
+
+    def fetch_mal_score(mal_id):
+        calls['ids'].append(mal_id)
+        return {'mal_score': 7.0}
+
+    monkeypatch.setattr(fetch_mal_scores, 'fetch_seasonal_scores', fetch_seasonal_scores)
+    monkeypatch.setattr(fetch_mal_scores, 'fetch_mal_score', fetch_mal_score)
+    return calls
+
+
+def test_seasons_are_paged_before_per_id_lookups(monkeypatch):
+    calls = fake_jikan(monkeypatch)
+    cache = {}
+    fetched = refresh_score_cache(range(1, 36), cache, workers=1, seasons=[('FALL', 2026)])
+    assert calls['seasons'] == [[('FALL', 2026)]]
+    assert sorted(calls['ids']) == [31, 32, 33, 34, 35]
+    assert fetched == 35
+    assert cache['1']['scores'] == {'mal_score': 8.0}
+
+
+def test_without_seasons_every_id_is_looked_up(monkeypatch):
+    calls = fake_jikan(monkeypatch)
+    refresh_score_cache(range(1, 36), {}, workers=1)
+    assert calls['seasons'] == []
+    assert len(calls['ids']) == 35
+
+
+def test_bulk_refresh_needs_enough_stale_ids():
+    now = fetch_mal_scores.datetime.now().isoformat()
+    cache = {str(mal_id): {'fetched_at': now, 'scores': {}} for mal_id in range(1, 100)}
+    assert not fetch_mal_scores.needs_bulk_refresh(range(1, 100), cache)
+    assert not fetch_mal_scores.needs_bulk_refresh(range(1, 124), cache)
+    assert fetch_mal_scores.needs_bulk_refresh(range(1, 125), cache)
+
+
+def test_fresh_cache_skips_the_seasonal_listings(monkeypatch):
+    calls = fake_jikan(monkeypatch)
+    cache = {}
+    refresh_score_cache(range(1, 11), cache, workers=1, seasons=[('FALL', 2026)])
+    assert calls['seasons'] == []
+    assert len(calls['ids']) == 10
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Tests for the token-bucket rate limiter and its X-RateLimit-* header seeding
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from rate_limiter import SAFETY_MARGIN, WINDOW_SECONDS, RateLimiter
+
+
+def test_headers_set_the_per_minute_limit():
+    limiter = RateLimiter('test', 90)
+    limiter.update_from_headers(30, None, None)
+    assert limiter.limit == 30
+    assert limiter.rate == 30 * SAFETY_MARGIN / WINDOW_SECONDS
+
+
+def test_remaining_caps_the_bucket():
+    limiter = RateLimiter('test', 90, burst=5)
+    limiter.update_from_headers(90, 1, 40)
+    assert limiter._tokens <= 1
+    assert limiter._paused_until == 0.0
+
+
+def test_exhausted_window_pauses_until_reset():
+    limiter = RateLimiter('test', 90)
+    before = time.monotonic()
+    limiter.update_from_headers(90, 0, 12)
+    assert limiter._paused_until >= before + 12
+    assert limiter._pause_reason == 'reset'
+
+
+def test_missing_or_zero_limit_keeps_the_current_one():
+    limiter = RateLimiter('test', 90)
+    limiter.update_from_headers(None, None, None)
+    limiter.update_from_headers(0, None, None)
+    assert limiter.limit == 90
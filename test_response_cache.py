@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Tests for the on-disk AniList response cache
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+import response_cache
+from anilist_batch import PagedQuery, fetch_batch
+from response_cache import HOUR, cache_key, current_families, families_ttl, request_families
+
+QUERY = 'query { releasing_p1: Page(page: 1) { media { id } } }'
+PAYLOAD = {'data': {'releasing_p1': {'media': [{'id': 1}]}}}
+
+
+def use_cache(monkeypatch, tmp_path, mode='read'):
+    monkeypatch.setattr(response_cache, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(response_cache, '_mode', mode)
+
+
+def test_cache_key_includes_endpoint():
+    assert cache_key('https://graphql.anilist.co', QUERY, {}) != cache_key('http://127.0.0.1:5011/', QUERY, {})
+    assert cache_key('https://graphql.anilist.co', QUERY, {}) == cache_key('https://graphql.anilist.co', QUERY, {})
+
+
+def test_families_come_from_the_query_not_its_alias():
+    upcoming_current = PagedQuery('upcoming_current', 'type: ANIME', cache_family='current')
+    seen = []
+    fetch_batch([(upcoming_current, 1)], 'id', 50, lambda query, variables: seen.append(current_families()))
+    assert seen == [{'current'}]
+    assert current_families() == {'default'}
+
+
+def test_mixed_batch_uses_shortest_ttl():
+    assert families_ttl({'upcoming', 'current'}) == HOUR
+    assert families_ttl({'unknown'}) == response_cache.DEFAULT_TTL
+
+
+def test_entry_expires_after_family_ttl(monkeypatch, tmp_path):
+    use_cache(monkeypatch, tmp_path)
+    with request_families(['upcoming']):
+        response_cache.store('endpoint', QUERY, {}, PAYLOAD)
+        assert response_cache.lookup('endpoint', QUERY, {}) == PAYLOAD
+        assert response_cache.lookup('other endpoint', QUERY, {}) is None
+
+    path = response_cache.entry_path(cache_key('endpoint', QUERY, {}))
+    stored_at = time.time() - 2 * HOUR
+    os.utime(path, (stored_at, stored_at))
+    with request_families(['upcoming']):
+        assert response_cache.lookup('endpoint', QUERY, {}) == PAYLOAD
+    with request_families(['current']):
+        assert response_cache.lookup('endpoint', QUERY, {}) is None
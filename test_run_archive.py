@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-run media archive
+"""
+import os
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+import run_archive
+from run_archive import RunArchive, load_run, new_run_id, resolve_run, run_started_at
+
+
+def test_run_ids_are_unique_within_a_second():
+    ids = {new_run_id() for _ in range(50)}
+    assert len(ids) == 50
+
+
+def test_run_started_at_reads_both_id_formats():
+    assert run_started_at('20240501T080012345678Z') == datetime(2024, 5, 1, 8, 0, 12, 345678, tzinfo=timezone.utc)
+    assert run_started_at('20240501T080012Z') == datetime(2024, 5, 1, 8, 0, 12, tzinfo=timezone.utc)
+
+
+def test_archive_round_trip_and_no_append(monkeypatch, tmp_path):
+    monkeypatch.setattr(run_archive, 'ARCHIVE_DIR', str(tmp_path))
+    archive = RunArchive('20240501T080012000001Z')
+    archive.record('current', {'id': 1}, 'releasing')
+    archive.record('upcoming', {'id': 2}, 'upcoming_next')
+    archive.close()
+
+    assert resolve_run('latest') == '20240501T080012000001Z'
+    assert load_run('20240501T080012000001Z') == {
+        'current': [({'id': 1}, 'releasing')],
+        'upcoming': [({'id': 2}, 'upcoming_next')],
+    }
+    with pytest.raises(FileExistsError):
+        RunArchive('20240501T080012000001Z')